@@ -0,0 +1,88 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+Tests for the ground elevation lookup with reports that are missing their position.
+"""
+
+import widgets.Utility.Elevation as Elevation
+import widgets.Utility.Flight_Store as Flight_Store
+import widgets.Utility.Flight_Metrics as Flight_Metrics
+import pandas as pd
+import numpy as np
+import tempfile
+import unittest
+import io
+import os
+
+
+class Elevation_Test(unittest.TestCase):
+
+    def setUp(self):
+        # A flat 3x3 tile 1500 m up covering N45..46 W112..111
+        self.dir = tempfile.TemporaryDirectory()
+        np.full((3,3),1500,dtype='>i2').tofile(os.path.join(self.dir.name,'N45W112.hgt'))
+        self.elevation = Elevation.Elevation_Service(self.dir.name)
+
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+    def test_elevations_skip_missing_position(self):
+        out = self.elevation.elevations([45.5,np.nan,45.5],[-111.5,-111.5,np.nan],remote=False)
+        self.assertEqual(out[0],1500)
+        self.assertTrue(np.isnan(out[1:]).all())
+
+
+    def test_elevation_missing_position(self):
+        self.assertTrue(np.isnan(self.elevation.elevation(np.nan,-111.5)))
+
+
+    def test_metrics_row_with_empty_position(self):
+        # The same rows as read from the server's CSV, one with an empty lat/lon
+        csv = 'uid,latitude,longitude,altitude,vertical_velocity,ground_speed\n' \
+              '1,45.5,-111.5,2000,5,10\n' \
+              '1,,,2100,5,10\n' \
+              '1,45.5,-111.5,2200,5,10\n'
+        rows = pd.read_csv(io.StringIO(csv))
+        store = Flight_Store.Flight_Store()
+        metrics = Flight_Metrics.Flight_Metrics(store,self.elevation)
+        metrics.append(rows)
+
+        self.assertEqual(len(store),3)
+        self.assertEqual(store['agl'][0],500)
+        self.assertTrue(np.isnan(store['agl'][1]))
+        self.assertEqual(store['agl'][2],700)
+
+
+    def test_metrics_launch_after_empty_position(self):
+        rows = {'latitude':[np.nan,45.5],'longitude':[np.nan,-111.5],'altitude':[2000.0,2100.0],'vertical_velocity':[5.0,5.0]}
+        store = Flight_Store.Flight_Store()
+        metrics = Flight_Metrics.Flight_Metrics(store,self.elevation)
+        metrics.append(rows)
+
+        self.assertEqual(metrics.launch,(45.5,-111.5))
+        self.assertTrue(np.isnan(store['distance'][0]))
+        self.assertEqual(store['distance'][1],0)
+
+
+if __name__=='__main__':
+    unittest.main()
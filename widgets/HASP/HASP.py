@@ -28,17 +28,16 @@ except ImportError:
     import Tkinter as tk
 import widgets.Utility.Widget as Widget
 from widgets.Utility.Widget import _create_rounded_rectangle
-import requests
+import widgets.Utility.Http as Http
+import widgets.Utility.Image_Pipeline as Image_Pipeline
 import re
-import io
 import numpy as np
 import threading
 import time
-import matplotlib.pyplot as plt
+import widgets.Utility.Render_Service as Render_Service
 import numpy as np
 import pandas as pd
 from time import strftime
-from PIL import Image,ImageTk
 import traceback
     
 class HASP(Widget.Widget):
@@ -95,6 +94,7 @@ class HASP(Widget.Widget):
         self.window = 500
         self.label = tk.Label(self.img_frame,bg='black',anchor='nw')
         self.label.pack(fill=tk.BOTH)
+        self.pipeline = Image_Pipeline.Image_Pipeline(self.label)
         
         # Set labels
         self.X_temp_block = int(self.w*0.5)+60
@@ -208,7 +208,7 @@ class HASP(Widget.Widget):
         None
         '''
     
-        self.fig,axs = plt.subplots(ncols=2,nrows=2)
+        self.fig,axs = Render_Service.subplots(ncols=2,nrows=2)
         
         for board in set(self.data['brd']):
             axs[1][1].plot([0],[0],label='B{}'.format(int(board)))
@@ -254,7 +254,7 @@ class HASP(Widget.Widget):
     
         #print('Updating HASP...')
         self.today = strftime('%m-%d-%y')
-        req = requests.get(self.list_url)
+        req = Http.get(self.list_url,'hasp')
         webpage = req.text
 
         regex_str = '<a href=Payload_[0-9]{2}\/sp[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}.raw>sp[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}.raw</a>'
@@ -280,7 +280,7 @@ class HASP(Widget.Widget):
         self.url_partial = 'https://laspace.lsu.edu/hasp/groups/2021/data/'
         def thread_func(url,id_num,raw):
             #print('Thread {} starting...'.format(id_num))
-            raw[str(id_num)]=requests.get(url).text
+            raw[str(id_num)]=Http.get(url,'hasp').text
             #print('Thread {} finishing'.format(id_num))
     
             return;
@@ -395,55 +395,11 @@ class HASP(Widget.Widget):
         None
         '''
     
-        buff = io.BytesIO()
-        self.fig.savefig(buff,format='png')
-        plt.close(self.fig)
+        # Drawn straight to the label's size, without a trip through PNG
+        self.image = self.pipeline.render(self.fig,(self.img_w,self.img_h))
         
-        self.image = Image.open(buff)
-        self.image = self.autocrop_image(self.image)
-        self.image = self.image.resize((self.img_w,self.img_h))
-        
-        self.copy_of_image = self.image.copy()
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.configure(image=self.photo)
-        self.label.image = self.photo
-        
-        buff.close()
-        
-        
-    def autocrop_image(self,image,border=0):
-        '''
-        Crop image automatically to its content
-        
-        Parameters:
-        self (Widget): Required for object functions
-        image (Image): The image to be cropped
-        border  (int): The extra border to include with the cropped image
-        
-        Returns:
-        Image: The cropped image
-        '''
-    
-        # Get the bounding box
-        bbox = image.getbbox()
-
-        # Crop the image to the contents of the bounding box
-        image = image.crop(bbox)
-
-        # Determine the width and height of the cropped image
-        (width,height) = image.size
-    
-        # Add border
-        width+=border*2
-        height+=border*2
-    
-        # Create a new image object for the output image
-        cropped_image = Image.new("RGBA",(width,height),(0,0,0,0))
-
-        # Paste the cropped image onto the new image
-        cropped_image.paste(image,(border, border))
-
-        return cropped_image
+        self.copy_of_image = self.image
+        self.pipeline.show(self.image)
         
         
     def redraw(self,w,h):
@@ -453,7 +409,5 @@ class HASP(Widget.Widget):
     
         self.img_w,self.img_h = int(self.img_oW/self.m_W*w), int(self.img_oH/self.m_H*h)
         self.image = self.copy_of_image.resize((self.img_w,self.img_h))
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.config(image = self.photo)
-        self.label.image = self.photo #avoid garbage collection
+        self.pipeline.show(self.image)
 
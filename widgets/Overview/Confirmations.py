@@ -0,0 +1,220 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This keeps the Iridium confirmation emails seen so far, each parsed once, for matching to the commands sent.
+
+Each confirmation is claimed by the first command it is matched to, so a confirmation that comes in late is not taken
+for the next command sent to the same modem.
+"""
+
+from threading import Lock
+from bisect import bisect_left,bisect_right
+import datetime
+import base64
+import re
+
+
+def parse(msg):
+    """
+    Parse an Iridium confirmation email
+
+    The body lists the time of the session on its 4th line, the .sbd file sent on its 6th, and the MTMSN and queue
+    depth on its 9th. The IMEI is taken from the subject, or failing that, the body.
+
+    Parameters:
+    msg (dict): The email, as read by Emailer
+
+    Returns:
+    dict: The id, time (UTC), imei, cmd, mtmsn, and queue of the confirmation; None if the email is not one
+    """
+
+    try:
+        txt = msg['payload']['parts'][0]['body']['data']
+        txt = txt.replace('-','+').replace('_','/')
+        txt = base64.b64decode(txt).decode('utf-8')
+        lines = txt.split('\r\n')
+
+        t = lines[3].split(': ')[-1].strip()
+        t = datetime.datetime.strptime(' '.join(t.split(' ')[1:]),'%b %d %H:%M:%S %Y')
+        cmd = lines[5].split(':')[-1].strip().replace('.sbd','')
+        mtmsn = re.findall('[0-9]+',lines[8].split(',')[0])[0]
+        queue = re.findall('[0-9]+',lines[8].split(',')[-1])[0]
+    except (KeyError,IndexError,ValueError,TypeError):
+        return None
+
+    subject = [header['value'] for header in msg['payload'].get('headers',[]) if header['name'].lower()=='subject']
+    imei = re.search(r'\b[0-9]{15}\b',' '.join(subject)) or re.search(r'\b[0-9]{15}\b',txt)
+    return {'id':msg.get('id'),
+            'time':t,
+            'imei':imei.group(0) if imei else None,
+            'cmd':cmd,
+            'mtmsn':int(mtmsn),
+            'queue':int(queue)}
+
+
+class Confirmations:
+    '''
+    Parsed confirmation records, indexed by IMEI and time, and which of them have been claimed by a command
+    '''
+
+    def __init__(self):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Confirmations): Required for object functions
+
+        Returns:
+        None
+        '''
+
+        self.lock = Lock()
+        self.seen = {}     # email id -> record, or None if the email was not a confirmation
+        self.times = {}    # imei -> session times of its confirmations, in order
+        self.records = {}  # imei -> its confirmations, in the same order
+        self.claimed = set()   # id() of each record matched to a command; records are never dropped, so ids stay unique
+        self.stats = {'parsed':0,'skipped':0,'confirmations':0,'claimed':0}
+
+
+    def add(self,msg):
+        '''
+        Parse an email, unless it has been already
+
+        Parameters:
+        self (Confirmations): Required for object functions
+        msg          (dict): The email, as read by Emailer
+
+        Returns:
+        dict: The confirmation record; None if the email is not a confirmation
+        '''
+
+        msg_id = msg.get('id')
+        with self.lock:
+            if msg_id is not None and msg_id in self.seen:
+                self.stats['skipped'] += 1
+                return self.seen[msg_id]
+
+        record = parse(msg)
+        with self.lock:
+            self.stats['parsed'] += 1
+            if msg_id is not None:
+                self.seen[msg_id] = record
+            if record is not None:
+                # Insert by time; emails can come in out of order
+                times = self.times.setdefault(record['imei'],[])
+                i = bisect_right(times,record['time'])
+                times.insert(i,record['time'])
+                self.records.setdefault(record['imei'],[]).insert(i,record)
+                self.stats['confirmations'] += 1
+        return record
+
+
+    def match(self,imei,after,cmd=None):
+        '''
+        Find and claim the first unclaimed confirmation of a command at or after a time
+
+        Confirmations whose IMEI could not be read are matched to any modem.
+
+        Parameters:
+        self (Confirmations): Required for object functions
+        imei           (str): The IMEI the command was sent to
+        after     (datetime): When the command was sent (UTC)
+        cmd            (str): The command sent (e.g. '010'); None for any
+
+        Returns:
+        dict: The confirmation record; None if there is none yet
+        '''
+
+        with self.lock:
+            found = []
+            for key in [imei,None]:
+                times = self.times.get(key,[])
+                for record in self.records.get(key,[])[bisect_left(times,after):]:
+                    if self._fits(record,imei,after,cmd):
+                        found.append(record)
+                        break
+            if not found:
+                return None
+            record = min(found,key=lambda record: record['time'])
+            self._claim(record)
+            return record
+
+
+    def claim(self,record,imei,after,cmd=None):
+        '''
+        Claim a confirmation for a command if it confirms it and has not been claimed already
+
+        Parameters:
+        self (Confirmations): Required for object functions
+        record        (dict): The confirmation record, as from add
+        imei           (str): The IMEI the command was sent to
+        after     (datetime): When the command was sent (UTC)
+        cmd            (str): The command sent (e.g. '010'); None for any
+
+        Returns:
+        dict: The record if it is now claimed for the command; None otherwise
+        '''
+
+        if record is None:
+            return None
+        with self.lock:
+            if not self._fits(record,imei,after,cmd):
+                return None
+            self._claim(record)
+            return record
+
+
+    def _fits(self,record,imei,after,cmd):
+        '''
+        Whether or not an unclaimed record confirms a command; call with the lock held
+        '''
+
+        return (id(record) not in self.claimed and
+                record['imei'] in [imei,None] and
+                record['time']>=after and
+                (cmd is None or record['cmd']==cmd))
+
+
+    def _claim(self,record):
+        '''
+        Mark a record as taken by a command; call with the lock held
+        '''
+
+        self.claimed.add(id(record))
+        self.stats['claimed'] += 1
+
+
+    def latest(self,imei):
+        '''
+        The most recent confirmation for a modem; None if there has been none
+        '''
+
+        with self.lock:
+            records = self.records.get(imei)
+            return records[-1] if records else None
+
+
+    def summary(self):
+        '''
+        One line summary of the store statistics for the log
+        '''
+
+        return 'parsed={parsed} skipped={skipped} confirmations={confirmations} claimed={claimed}'.format(**self.stats)
@@ -31,11 +31,11 @@ except ImportError:
 import widgets.Utility.Widget as Widget
 from widgets.Utility.Widget import _create_rounded_rectangle
 from functools import partial
-import widgets.Utility.Emailer as Emailer
+import widgets.Utility.Mail_Transport as Mail_Transport
+import widgets.Utility.Mailbox_Sync as Mailbox_Sync
+import widgets.Overview.Confirmations as Confirmations
 import datetime
-import base64
 import threading
-import re
 
 EMAIL_ADDRESS = 'iridium.msgc@gmail.com'
 
@@ -77,7 +77,15 @@ class Overview(Widget.Widget):
         ]
         
         self.fields = {}
-        self.UTC = -6
+        
+        # Gmail, or a local SMTP/IMAP server; signs in now so the first command is not held up by it
+        self.mail = Mail_Transport.transport()
+        self.mail.start(log=self.master.log)
+        
+        # Confirmations are watched for by one shared poller that gives up after confirm_timeout (s)
+        self.mailbox = Mailbox_Sync.Mailbox_Sync(self.mail,log=self.master.log)
+        self.confirmations = Confirmations.Confirmations()
+        self.confirm_timeout = 900
         
         self.canvas = tk.Canvas(self,borderwidth=0,highlightthickness=0,bg='black')
         self.add_comp(self.canvas,0,0,w,h)
@@ -355,6 +363,8 @@ class Overview(Widget.Widget):
             cmd = bin(self.active_cmd)[2:].zfill(3)
             imei = self.master.profile['imei']
             if messagebox.askyesno(title='Confirmation',message='Is this correct:\n\nCmd: {} ({})\nIMEI: {}'.format(alias,cmd,imei)):
+                # Session times are to the second
+                sent = datetime.datetime.utcnow().replace(microsecond=0)
                 try:
                     ret = self.send_iridium_cmd(cmd,imei)
                 except:
@@ -367,50 +377,44 @@ class Overview(Widget.Widget):
                 n_labels = 4
                 for i in range(n_labels):
                     self.components[self.ci_conf_block+1+n_labels+i][0].configure(text='-')
+                
+                thread = threading.Thread(target=self.check_for_confirm,args=(imei,cmd,sent))
+                thread.start()
             else:
                 self.master.log('Command aborted.')
         else:
             self.master.log('No profile selected!',lvl='DEBUG')
             
-        thread = threading.Thread(target=self.check_for_confirm)
-        thread.start()
-        #self.check_for_confirm
             
-            
-    def check_for_confirm(self):
+    def check_for_confirm(self,imei,cmd,sent):
         '''
-        Search emails for most recent confirmation email; re-enable 'Send Command' button
+        Wait for the confirmation email of the command just sent; re-enable 'Send Command' button
+        
+        Parameters:
+        self   (Widget): Required for object functions
+        imei      (str): The IMEI the command was sent to
+        cmd       (str): The command sent (e.g. '010')
+        sent (datetime): When the command was sent (UTC)
+        
+        Returns:
+        None
         '''
     
-        start = datetime.datetime.now()
-        srvc = Emailer.gmail_authenticate()
-        
-        while True:
-            msgs = Emailer.read_messages(srvc)
-            
-            froms = [msg['payload']['headers'][0]['value'] for msg in msgs]
-            txts = [msg['payload']['parts'][0]['body']['data'] for msg in msgs]
-            txts = [txt.replace('-','+').replace('_','/') for txt in txts]
-            txts = [base64.b64decode(txt).decode('utf-8') for txt in txts]
-            #times = [[msg['payload']['headers'][i]['value'].split(';')[-1].strip().split(' ') for i in range(len(msg['payload']['headers'])) if msg['payload']['headers'][i]['name']=='Date'][-1] for msg in msgs]
-            #times = ['{} {} {} {}'.format(*t[1:]) for t in times]
-            #times = [datetime.datetime.strptime(t,'%d %b %Y %H:%M:%S') for t in times]
-            times = [txt.split('\r\n')[3].split(': ')[-1].strip() if txt!='' else 'Blah Jan  1 00:00:00 1999' for txt in txts]
-            times = [datetime.datetime.strptime(' '.join(t.split(' ')[1:]),'%b %d %H:%M:%S %Y') for t in times]
-            times = [t + datetime.timedelta(hours=self.UTC) for t in times]
-            #print(['{:<0d}:{:<0d}:{:<0d}'.format(t.hour,t.minute,t.second) for t in times])
-            
-            msgs = [(t,f,s) for t,f,s in zip(times,froms,txts)]
-            msgs = [msg for msg in msgs if start<msg[0]]
+        # It may have come in while the mailbox was being watched for something else
+        record = self.mailbox.wait(partial(self.match_confirm,imei,cmd,sent),timeout=self.confirm_timeout,
+                                   check=partial(self.confirmations.match,imei,sent,cmd))
+        self.master.log('Mailbox {}'.format(self.mailbox.summary()),lvl='DEBUG')
+        self.master.log('Confirmations {}'.format(self.confirmations.summary()),lvl='DEBUG')
+        if record is None:
+            self.master.log('No confirmation received after {:g} minutes'.format(self.confirm_timeout/60),'ERROR')
+            self.components[self.ci_send_btn][0]['state'] = 'normal'
+            return;
             
-            if msgs:
-                break
-                
-        self.fields['time'] = ' '.join(msgs[0][-1].split('\r\n')[3].split(': ')[-1].strip().split(' ')[1:-1])+' UTC'
-        self.fields['cmd'] = msgs[0][-1].split('\r\n')[5].split(':')[-1].strip().replace('.sbd','')
+        self.fields['time'] = '{:%b %d %H:%M:%S} UTC'.format(record['time'])
+        self.fields['cmd'] = record['cmd']
         self.fields['cmd'] = '{} ({})'.format(list(self.master.profile['commands'].keys())[list(self.master.profile['commands'].values()).index(self.fields['cmd'])],self.fields['cmd'])
-        self.fields['mtmsn'] = re.findall('[0-9]+',msgs[0][-1].split('\r\n')[8].split(',')[0])[0]
-        self.fields['queue'] = re.findall('[0-9]+',msgs[0][-1].split('\r\n')[8].split(',')[-1])[0]
+        self.fields['mtmsn'] = str(record['mtmsn'])
+        self.fields['queue'] = str(record['queue'])
         
         n_labels = 4
         for i in range(n_labels):
@@ -425,6 +429,14 @@ class Overview(Widget.Widget):
         return;
     
     
+    def match_confirm(self,imei,cmd,sent,msg):
+        '''
+        The confirmation record of an email, claimed for the command, if it confirms cmd sent to imei after sent; None otherwise
+        '''
+        
+        return self.confirmations.claim(self.confirmations.add(msg),imei,sent,cmd)
+    
+    
     def send_iridium_cmd(self,cmd,imei):
         '''
         Construct and send email containing chosen command pin state
@@ -433,11 +445,10 @@ class Overview(Widget.Widget):
         if cmd not in self.COMMANDS:
             raise ValueError('Command must be one of the ones defined')
             
-        srvc       = Emailer.gmail_authenticate()
-        to         = 'data@sbd.iridium.com'
+        to         = Mail_Transport.IRIDIUM_ADDRESS
         subject    = imei
         msg        = ''
         attachment = 'attachments/{}.sbd'.format(cmd)
     
-        return Emailer.send_message(srvc,to,subject,msg,attachments=[attachment])
+        return self.mail.send(to,subject,msg,attachments=[attachment])
 
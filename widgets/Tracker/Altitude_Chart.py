@@ -0,0 +1,263 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is the Tracker's altitude plot, drawn natively on a tkinter Canvas and extended as reports come in.
+
+Reports are gathered into a fixed number of buckets, each keeping its lowest and highest altitude. When the flight outgrows
+the buckets, neighbouring pairs are merged and each bucket covers twice as many reports. The line drawn never has more than
+two points per bucket, so an update costs the same at the end of a long flight as at launch.
+"""
+
+try:
+    import tkinter as tk
+except ImportError:
+    import Tkinter as tk
+import numpy as np
+import math
+
+
+def nice_step(span,ticks=4):
+    """
+    Pick a round tick spacing (1, 2, or 5 times a power of ten)
+
+    Parameters:
+    span  (float): The range the ticks cover
+    ticks   (int): About how many ticks to show
+
+    Returns:
+    float: The tick spacing
+    """
+
+    raw = span/ticks
+    power = 10**math.floor(math.log10(raw))
+    for m in [1,2,5]:
+        if m*power>=raw:
+            return m*power
+    return 10*power
+
+
+class Altitude_Chart(tk.Canvas):
+    '''
+    A line plot of altitude against report number
+    '''
+
+    def __init__(self,master,buckets=256,color='red',**kwargs):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Altitude_Chart): Required for object functions
+        master     (tk.Frame): The parent frame
+        buckets         (int): The most buckets kept; the line has at most twice this many points
+        color           (str): The color of the line
+        **kwargs             : Passed on to tk.Canvas
+
+        Returns:
+        None
+        '''
+
+        tk.Canvas.__init__(self,master,bg='white',borderwidth=0,highlightthickness=0,**kwargs)
+        self.buckets = buckets
+        self.color = color
+        self.margins = (45,8,8,20)   # left, top, right, bottom (pixels)
+        self.width,self.height = 1,1
+
+        # (row,altitude) of the lowest and highest report in each bucket
+        self.low = np.zeros((buckets,2))
+        self.high = np.zeros((buckets,2))
+        self.clear()
+
+        self.frame = self.create_rectangle(0,0,0,0,outline='black')
+        self.line = self.create_line(0,0,0,0,fill=color,width=2)
+        self.marker = self.create_oval(0,0,0,0,fill=color,outline=color)
+        self.axis = []   # Tick marks and labels
+        self.bind('<Configure>',self._configure)
+
+
+    def clear(self):
+        '''
+        Forget every report
+        '''
+
+        self.store = None
+        self.generation = None   # store.generation the plot was drawn from
+        self.seen = 0        # store.count already added
+        self.first = None    # Row of the first report
+        self.step = 1        # Reports per bucket
+        self.used = 0        # Buckets holding reports
+        self.top = None      # Upper limit of the altitude axis
+        self.stats = {'points':0,'merges':0}
+
+
+    def extend(self,store):
+        '''
+        Add a flight's new reports and redraw the line
+
+        Parameters:
+        self (Altitude_Chart): Required for object functions
+        store  (Flight_Store): The flight; a different store than last time starts the plot over
+
+        Returns:
+        None
+        '''
+
+        if store is not self.store or store.generation!=self.generation:
+            self.clear()
+            self.store = store
+            self.generation = store.generation
+        new = store.count-self.seen
+        if new<=0:
+            return
+        alts = store['altitude'][-new:]
+        rows = np.arange(store.count-len(alts),store.count)
+        self.seen = store.count
+
+        for row,alt in zip(rows.tolist(),alts.tolist()):
+            if alt!=alt:
+                continue   # NaN
+            self._add(row,alt)
+        self.draw()
+
+
+    def _add(self,row,alt):
+        '''
+        Put one report into its bucket, merging buckets first if it is past the last one
+        '''
+
+        if self.first is None:
+            self.first = row
+        k = (row-self.first)//self.step
+        while k>=self.buckets:
+            self._merge()
+            k = (row-self.first)//self.step
+
+        if k>=self.used:
+            self.low[self.used:k+1] = self.high[self.used:k+1] = (row,alt)
+            self.used = k+1
+        elif alt<self.low[k,1]:
+            self.low[k] = (row,alt)
+        elif alt>self.high[k,1]:
+            self.high[k] = (row,alt)
+        self.stats['points'] += 1
+
+
+    def _merge(self):
+        '''
+        Halve the number of buckets by merging neighbouring pairs
+        '''
+
+        n = self.used
+        if n%2:
+            # Pad with a copy of the last bucket so pairs line up
+            self.low[n],self.high[n] = self.low[n-1],self.high[n-1]
+            n += 1
+        low,high = self.low[:n].reshape(-1,2,2),self.high[:n].reshape(-1,2,2)
+        m = n//2
+        pick = np.argmin(low[:,:,1],axis=1)
+        self.low[:m] = low[np.arange(m),pick]
+        pick = np.argmax(high[:,:,1],axis=1)
+        self.high[:m] = high[np.arange(m),pick]
+        self.used = m
+        self.step *= 2
+        self.stats['merges'] += 1
+
+
+    def points(self):
+        '''
+        The points of the line, in order of report
+
+        Returns:
+        numpy.ndarray: (row,altitude) of each point
+        '''
+
+        n = self.used
+        both = np.stack([self.low[:n],self.high[:n]],axis=1)
+        later = both[:,0,0]>both[:,1,0]
+        both[later] = both[later][:,::-1]
+        both = both.reshape(-1,2)
+        # A bucket with one report has the same point twice
+        keep = np.ones(len(both),bool)
+        keep[1:] = both[1:,0]!=both[:-1,0]
+        return both[keep]
+
+
+    def draw(self):
+        '''
+        Redraw the line, and the axes if their range changed
+        '''
+
+        if self.used==0:
+            self.coords(self.line,0,0,0,0)
+            self.coords(self.marker,0,0,0,0)
+            return
+
+        points = self.points()
+        top = max(points[:,1].max(),1.0)
+        if self.top is None or top>self.top:
+            # Leave headroom so the axis is not redrawn on every new high
+            self.top = top*1.1
+            self._draw_axis()
+
+        left,upper,right,lower = self.margins
+        w,h = max(self.width-left-right,1),max(self.height-upper-lower,1)
+        span = max((self.used*self.step)-1,1)
+        x = left+(points[:,0]-self.first)/span*w
+        y = upper+(1-points[:,1]/self.top)*h
+        xy = np.column_stack([x,y]).ravel().tolist()
+        if len(xy)<4:
+            xy = xy*2
+        self.coords(self.line,*xy)
+        self.coords(self.marker,xy[-2]-3,xy[-1]-3,xy[-2]+3,xy[-1]+3)
+
+
+    def _draw_axis(self):
+        '''
+        Draw the frame and the altitude ticks
+        '''
+
+        for item in self.axis:
+            self.delete(item)
+        self.axis = []
+
+        left,upper,right,lower = self.margins
+        w,h = max(self.width-left-right,1),max(self.height-upper-lower,1)
+        self.coords(self.frame,left,upper,left+w,upper+h)
+        if self.top is None:
+            return
+
+        step = nice_step(self.top)
+        alt = 0.0
+        while alt<=self.top:
+            y = upper+(1-alt/self.top)*h
+            self.axis.append(self.create_line(left-4,y,left,y,fill='black'))
+            self.axis.append(self.create_text(left-6,y,text='{:g}'.format(alt),anchor='e',font=('Verdana',7)))
+            alt += step
+        self.axis.append(self.create_text(left+w/2,upper+h+10,text='Altitude (m) by report',font=('Verdana',7)))
+
+
+    def _configure(self,event):
+        '''
+        Rescale to the canvas's new size
+        '''
+
+        self.width,self.height = event.width,event.height
+        self._draw_axis()
+        self.draw()
@@ -22,7 +22,7 @@ IN THE SOFTWARE.
 This is a wrapper class that uses cartopy to create a map, plot data points to it, and render the result in tkinter.
 """
 
-import requests
+import widgets.Utility.Http as Http
 import io
 import shapefile
 from shapely.geometry import Point
@@ -45,7 +45,7 @@ def get_cadastral_by_county(county):
     
     zip_url = 'http://ftpgeoinfo.msl.mt.gov/Data/Spatial/MSDI/Cadastral/Parcels/{0}/{0}_SHP.zip'
     chunk_size = 128
-    req = requests.get(zip_url.format(county),stream=True)
+    req = Http.get(zip_url.format(county),'cadastral',stream=True)
     zip_buffer = io.BytesIO()
     for chunk in req.iter_content(chunk_size=chunk_size):
         zip_buffer.write(chunk)
@@ -0,0 +1,310 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a helper class for Tracker that predicts where a descending payload will land.
+
+The descent rate under the parachute is scaled to the thinner air above by the barometric model in Flight_Metrics, and the
+wind at each altitude is estimated from how the payload drifted through it. An ensemble of trajectories with perturbed
+descent rates and winds is integrated in a process pool, and the spread of their landing points gives the landing ellipse.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from threading import Thread,Lock
+import multiprocessing
+import widgets.Utility.Flight_Metrics as Flight_Metrics
+import numpy as np
+import math
+
+# Chi-squared value for a 95% ellipse in two dimensions
+ELLIPSE_SCALE = math.sqrt(5.991)
+
+
+def integrate(start,ground,v_sea,levels,u,v,members,seed,dt=5.0,rate_sd=0.1,wind_sd=2.0,max_time=6*3600):
+    """
+    Integrate an ensemble of descent trajectories down to the ground; runs in a worker process
+
+    Parameters:
+    start   (tuple): Latitude, longitude, and altitude (m) to start from
+    ground  (float): Ground elevation (m) to stop at
+    v_sea   (float): Descent rate at sea level (m/s)
+    levels  (array): Altitudes (m) the wind is known at
+    u       (array): Eastward wind at each level (m/s)
+    v       (array): Northward wind at each level (m/s)
+    members   (int): Number of trajectories
+    seed      (int): Seed for the perturbations
+    dt      (float): Time step (s)
+    rate_sd (float): Relative spread of the descent rate
+    wind_sd (float): Spread of the wind (m/s)
+    max_time  (int): Give up on trajectories still aloft after this long (s)
+
+    Returns:
+    numpy.ndarray: Landing latitude, longitude, and time to landing (s) of each trajectory, one row each
+    """
+
+    rng = np.random.default_rng(seed)
+    lat = np.full(members,float(start[0]))
+    lon = np.full(members,float(start[1]))
+    alt = np.full(members,float(start[2]))
+    t = np.zeros(members)
+
+    k = v_sea*np.clip(rng.normal(1,rate_sd,members),0.5,1.5)
+    scale = np.clip(rng.normal(1,0.15,members),0.5,1.5)
+    du = rng.normal(0,wind_sd,members)
+    dv = rng.normal(0,wind_sd,members)
+
+    aloft = alt>ground
+    while aloft.any() and t.max()<max_time:
+        a = alt[aloft]
+        rate = k[aloft]/np.sqrt(Flight_Metrics.pressure_fraction(a))
+        # The last step only lasts until the trajectory reaches the ground
+        step = np.minimum(dt,(a-ground)/rate)
+        we = np.interp(a,levels,u)*scale[aloft]+du[aloft]
+        wn = np.interp(a,levels,v)*scale[aloft]+dv[aloft]
+
+        lat[aloft] += np.degrees(wn*step/Flight_Metrics.R_EARTH)
+        lon[aloft] += np.degrees(we*step/(Flight_Metrics.R_EARTH*np.cos(np.radians(lat[aloft]))))
+        alt[aloft] = a-rate*step
+        t[aloft] += step
+        aloft = alt>ground+1e-6
+
+    return np.column_stack([lat,lon,t])
+
+
+def wind_profile(lat,lon,alt,speed,bin_size=500.0):
+    """
+    Estimate the wind at each altitude from the drift of the payload
+
+    Parameters:
+    lat      (array): Latitude of each row
+    lon      (array): Longitude of each row
+    alt      (array): Altitude of each row (m)
+    speed    (array): Ground speed of each row (m/s)
+    bin_size (float): Height of the altitude bins (m)
+
+    Returns:
+    tuple: Altitudes of the bins (m), and eastward and northward wind in each (m/s)
+    """
+
+    # Direction of travel from each row to the next, paired with the reported speed
+    lat1,lon1,lat2,lon2 = [np.radians(x) for x in (lat[:-1],lon[:-1],lat[1:],lon[1:])]
+    east = np.sin(lon2-lon1)*np.cos(lat2)
+    north = np.cos(lat1)*np.sin(lat2)-np.sin(lat1)*np.cos(lat2)*np.cos(lon2-lon1)
+    moved = (np.hypot(east,north)>0)&~np.isnan(speed[1:])&~np.isnan(alt[1:])
+    if not moved.any():
+        return np.array([0.0]),np.array([0.0]),np.array([0.0])
+
+    bearing = np.arctan2(east[moved],north[moved])
+    s = speed[1:][moved]
+    bins = np.floor(alt[1:][moved]/bin_size).astype(int)
+    bins -= bins.min()
+    count = np.bincount(bins)
+    full = count>0
+    levels = (np.flatnonzero(full)+0.5)*bin_size+np.floor(np.nanmin(alt[1:][moved])/bin_size)*bin_size
+    u = np.bincount(bins,s*np.sin(bearing))[full]/count[full]
+    v = np.bincount(bins,s*np.cos(bearing))[full]/count[full]
+    return levels,u,v
+
+
+class Predictor:
+    '''
+    Predicts landing points of the tracked flights in a process pool
+    '''
+
+    def __init__(self,on_result=None,members=200,workers=2,cache_size=32):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Predictor): Required for object functions
+        on_result (func): Called with the flight uid from a worker thread whenever a new prediction is ready
+        members    (int): Number of trajectories in the ensemble
+        workers    (int): Number of worker processes
+        cache_size (int): The most predictions kept
+
+        Returns:
+        None
+        '''
+
+        self.on_result = on_result
+        self.members = members
+        self.workers = workers
+        self.cache_size = cache_size
+
+        self.pool = None      # Started on the first prediction
+        self.lock = Lock()
+        self.cache = OrderedDict()
+        self.results = {}     # uid -> latest prediction
+        self.generation = 0   # Bumped whenever any result changes, for anything drawn from them
+        self.pending = {}     # uid -> inputs key being computed
+        self.stats = {'predictions':0,'hits':0,'skipped':0}
+
+
+    def inputs(self,store,metrics):
+        '''
+        Gather the prediction inputs from a flight's rows
+
+        Parameters:
+        self        (Predictor): Required for object functions
+        store    (Flight_Store): The flight's rows
+        metrics (Flight_Metrics): The flight's derived metrics
+
+        Returns:
+        dict: The inputs; None if the payload is not descending or has never had a GPS fix
+        '''
+
+        if len(store)<3 or not store.latest('ascent_rate',0)<-1:
+            return None
+
+        lat,lon,alt = store['latitude'],store['longitude'],store['altitude']
+        # Start from the last report with a GPS fix; reports without one have no position
+        fixed = np.flatnonzero(np.isfinite(lat)&np.isfinite(lon)&np.isfinite(alt))
+        if len(fixed)==0:
+            return None
+        i = fixed[-1]
+        vv = store['vertical_velocity'][-30:]
+        pf = store['pressure_fraction'][-30:]
+        falling = vv<-1
+        if not falling.any():
+            return None
+        # Descent rate under the parachute scales with 1/sqrt(air density)
+        v_sea = float(np.median(-vv[falling]*np.sqrt(pf[falling])))
+
+        agl = store['agl'][i]
+        ground = alt[i]-agl if not np.isnan(agl) else float(np.nanmin(alt))
+        levels,u,v = wind_profile(lat,lon,alt,store['ground_speed_ms'])
+
+        return {'start':(float(lat[i]),float(lon[i]),float(alt[i])),'ground':float(ground),'v_sea':v_sea,'levels':levels,'u':u,'v':v}
+
+
+    def key(self,inputs):
+        '''
+        Quantize the inputs so telemetry that barely changes them reuses the last prediction
+        '''
+
+        start = inputs['start']
+        wind = np.round(np.concatenate([inputs['u'],inputs['v']])*2).astype(int)
+        return (round(start[0],3),round(start[1],3),round(start[2]/100),round(inputs['ground']/50),
+                round(inputs['v_sea']*4),tuple(np.round(inputs['levels']/500).astype(int)),tuple(wind))
+
+
+    def update(self,uid,store,metrics):
+        '''
+        Start a new prediction for a flight if its inputs changed enough since the last one
+
+        Parameters:
+        self        (Predictor): Required for object functions
+        uid               (int): The flight uid
+        store    (Flight_Store): The flight's rows
+        metrics (Flight_Metrics): The flight's derived metrics
+
+        Returns:
+        None
+        '''
+
+        inputs = self.inputs(store,metrics)
+        if inputs is None:
+            return
+        key = self.key(inputs)
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['hits'] += 1
+                if self.results.get(uid) is not self.cache[key]:
+                    self.results[uid] = self.cache[key]
+                    self.generation += 1
+                return
+            if uid in self.pending:
+                # One prediction per flight at a time; the next update picks up whatever changed meanwhile
+                self.stats['skipped'] += 1
+                return
+            self.pending[uid] = key
+            if self.pool is None:
+                # Spawned rather than forked, since forking copies Tk and every running thread
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,mp_context=multiprocessing.get_context('spawn'))
+
+        chunk = -(-self.members//self.workers)
+        futures = [self.pool.submit(integrate,inputs['start'],inputs['ground'],inputs['v_sea'],
+                                    inputs['levels'],inputs['u'],inputs['v'],chunk,seed)
+                   for seed in range(self.workers)]
+        Thread(target=self._collect,args=(uid,key,futures),daemon=True).start()
+
+
+    def _collect(self,uid,key,futures):
+        '''
+        Wait for an ensemble to finish and summarize its landing points
+        '''
+
+        try:
+            points = np.concatenate([f.result() for f in futures])
+            result = self.summarize(points)
+        except:
+            result = None
+
+        with self.lock:
+            self.pending.pop(uid,None)
+            if result is None:
+                return
+            self.stats['predictions'] += 1
+            self.cache[key] = result
+            if len(self.cache)>self.cache_size:
+                self.cache.popitem(last=False)
+            self.results[uid] = result
+            self.generation += 1
+
+        if self.on_result is not None:
+            self.on_result(uid)
+
+
+    def summarize(self,points,n=64):
+        '''
+        Reduce the ensemble's landing points to a mean and an ellipse
+
+        Parameters:
+        self (Predictor): Required for object functions
+        points   (array): Landing latitude, longitude, and time of each trajectory
+        n          (int): Number of points on the ellipse outline
+
+        Returns:
+        dict: Mean 'latitude' and 'longitude', 'radius' of the ellipse's long axis (m), median 'time' to landing (s), and the
+              ellipse outline as 'ellipse_lat' and 'ellipse_lon'
+        '''
+
+        lat0,lon0 = points[:,0].mean(),points[:,1].mean()
+        # Local east/north offsets in meters
+        k = math.radians(1)*Flight_Metrics.R_EARTH
+        xy = np.column_stack([(points[:,1]-lon0)*k*math.cos(math.radians(lat0)),(points[:,0]-lat0)*k])
+        vals,vecs = np.linalg.eigh(np.cov(xy.T))
+        axes = ELLIPSE_SCALE*np.sqrt(np.maximum(vals,0))
+
+        theta = np.linspace(0,2*np.pi,n)
+        outline = vecs@np.vstack([axes[0]*np.cos(theta),axes[1]*np.sin(theta)])
+        return {'latitude':lat0,'longitude':lon0,'radius':float(axes.max()),'time':float(np.median(points[:,2])),
+                'ellipse_lat':lat0+outline[1]/k,'ellipse_lon':lon0+outline[0]/(k*math.cos(math.radians(lat0)))}
+
+
+    def summary(self):
+        '''
+        One line summary of the prediction statistics for the log
+        '''
+
+        return 'predictions={predictions} cache_hits={hits} skipped={skipped}'.format(**self.stats)
@@ -0,0 +1,121 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a helper class for Tracker that bundles everything kept for one flight: its coordinates lookup, incremental feed, store, derived metrics, simplified track, and disk cache.
+"""
+
+import widgets.Utility.Balloon_Coordinates as BC
+import widgets.Utility.Flight_Feed as Flight_Feed
+import widgets.Utility.Flight_Store as Flight_Store
+import widgets.Utility.Flight_Cache as Flight_Cache
+import widgets.Utility.Flight_Metrics as Flight_Metrics
+import widgets.Utility.Track_LOD as Track_LOD
+import pandas as pd
+
+
+class Tracked_Flight:
+    '''
+    One flight followed by Tracker
+    '''
+
+    def __init__(self,imei,elevation=None):
+        '''
+        The initialization function; looks up the IMEI's latest flight and warm starts from the disk cache
+
+        Parameters:
+        self (Tracked_Flight): Required for object functions
+        imei            (str): The IMEI of the Iridium modem on the payload
+        elevation (Elevation_Service): Ground elevation lookup for altitude above ground
+
+        Returns:
+        None
+        '''
+
+        self.imei = imei
+        self.offline = False   # Whether the flight had to be looked up in the disk cache because the server could not be reached
+        try:
+            self.bc = BC.Balloon_Coordinates(imei)
+        except Exception:
+            flight = Flight_Cache.find(imei)
+            if flight is None:
+                raise
+            self.bc = BC.Balloon_Coordinates(imei,flight)
+            self.offline = True
+        self.uid = self.bc.uid
+        self.feed = Flight_Feed.Flight_Feed(self.uid)
+        self.data = Flight_Store.Flight_Store()
+        self.metrics = Flight_Metrics.Flight_Metrics(self.data,elevation)
+        self.lod = Track_LOD.Track_LOD(self.data)
+        self.cache = Flight_Cache.Flight_Cache(self.uid,imei=imei,flight=self.bc.latest_flight)
+
+        # Rows go in through metrics so the derived columns are filled in as they are added
+        self.loaded = self.cache.load(self.metrics,self.feed)
+        self.stale = self.loaded>0   # Whether the data has changed without the display being updated
+        self.error = None            # The last problem reaching the server, if any
+        self.cache_error = None
+        self.reported = None         # The cache problem last shown in the log, so it is only logged when it changes
+
+
+    def cache_problem(self):
+        '''
+        The cache problem to log, if it is new since the last call; None otherwise
+        '''
+
+        problem = None if self.cache_error is None else repr(self.cache_error)
+        if problem==self.reported:
+            return None
+        self.reported = problem
+        return self.cache_error
+
+
+    def poll(self):
+        '''
+        Fetch and store any new rows of the flight
+
+        Parameters:
+        self (Tracked_Flight): Required for object functions
+
+        Returns:
+        bool: Whether or not there is new data to display
+        '''
+
+        try:
+            rows = self.feed.poll()
+            self.error = None
+        except Exception as e:
+            # Carry on with no rows so cached data still waiting to be shown is drawn while offline
+            self.error = e
+            rows = pd.DataFrame()
+
+        if rows.empty and not self.stale:
+            return False
+        self.stale = False
+
+        if self.error is None and self.feed.resynced:
+            self.metrics.clear()
+        self.metrics.append(rows)
+        if not rows.empty:
+            try:
+                self.cache.append(rows,self.feed)
+                self.cache_error = None
+            except Exception as e:
+                self.cache_error = e
+        return self.data.latest('uid')==self.uid
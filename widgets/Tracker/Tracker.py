@@ -26,22 +26,25 @@ try:
     import tkinter as tk
 except ImportError:
     import Tkinter as tk
-import io
 import widgets.Utility.Widget as Widget
 from widgets.Utility.Widget import _create_rounded_rectangle
-import widgets.Utility.Balloon_Coordinates as BC
-import pandas as pd
-import requests
-import urllib
+import widgets.Utility.Flight_Store as Flight_Store
+import widgets.Utility.Poller as Poller
+import widgets.Utility.Elevation as Elevation
+import widgets.Utility.Flight_Metrics as Flight_Metrics
+import widgets.Tracker.Tracked_Flight as Tracked_Flight
+import widgets.Tracker.Predictor as Predictor
+import widgets.Tracker.Altitude_Chart as Altitude_Chart
+import widgets.Utility.Http as Http
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import widgets.Utility.Map as Map
+import widgets.Utility.Render_Worker as Render_Worker
+import widgets.Utility.Tile_Prefetcher as Tile_Prefetcher
+import widgets.Utility.Tile_Cache as Tile_Cache
 import numpy as np
 from functools import partial
-import matplotlib
-import matplotlib.pyplot as plt
-from PIL import Image,ImageTk
 import traceback
-matplotlib.use('Agg')
 
 
 class Tracker(Widget.Widget):
@@ -71,14 +74,13 @@ class Tracker(Widget.Widget):
         Widget.Widget.__init__(self,master,x,y,m_W,m_H,w,h,bg='black')
         tk.Canvas.create_rounded_rectangle = _create_rounded_rectangle
         self.img_oW,self.img_oH = int(0.5*self.w-110),150
-        self.img_w,self.img_h = self.img_oW,self.img_oH
         
-        self.p_0 = 101325
-        self.T_0 = 288.16
-        self.g = 9.80665
-        self.M = 0.02896968
-        self.R_0 = 8.314462618
-        self.numProcs = 0
+        # Ground elevation from local DEM tiles, falling back to USGS
+        self.elevation = Elevation.Elevation_Service()
+        
+        # Time between polls (ms); faster while descending, backing off to 'idle' when nothing changes
+        self.poll_intervals = {'flight':3000,'descent':1500,'idle':15000}
+        self.poller = Poller.Poller(self,self._update_coords,interval=self.poll_intervals['flight'],max_interval=self.poll_intervals['idle'])
         
         self.canvas = tk.Canvas(self,borderwidth=0,highlightthickness=0,bg='black')
         self.add_comp(self.canvas,0,0,w,h)
@@ -88,11 +90,29 @@ class Tracker(Widget.Widget):
         wev,hev = self.img_oW,self.img_oH
         self.add_comp(self.elev_frame,self.w-wev,self.h-hev,wev,hev)
         
+        # All flights being tracked; the first is the primary flight, whose store and coordinates are also self.data and self.bc
+        self.flights = []
+        self.track_colors = ['r','m','c','g','y']
+        self.bursts = set()   # uids of flights whose burst has been logged
+        
+        # Landing predictions run in worker processes; the map is redrawn when one finishes
+        self.predictor = Predictor.Predictor(on_result=self._prediction_ready)
+        
+        # Downloads tiles around the view, flight tracks, and predicted landings so the map works out of coverage
+        self.prefetcher = Tile_Prefetcher.Tile_Prefetcher(self.Map.tiles,log=self.master.log)
+        self.prefetched = {}   # uid -> (store generation,zoom,width,count) of the track already prefetched
+        
+        # Every map render goes through one worker; pans made while it is busy are merged into the latest view
+        self.map_worker = Render_Worker.Render_Worker('map')
+        self.view = None   # (center_pt,zoom) the map should show next
+        
+        self.pool = ThreadPoolExecutor(max_workers=4)
         self.bc = None
-        self.data = {'latitude':[self.Map.DEFAULT_center_pt[0]],
-                     'longitude':[self.Map.DEFAULT_center_pt[1]],
-                     'uid':[0],
-                     'altitude':[0.0]}
+        self.data = Flight_Store.Flight_Store()
+        self.data.append({'latitude':[self.Map.DEFAULT_center_pt[0]],
+                          'longitude':[self.Map.DEFAULT_center_pt[1]],
+                          'uid':[0],
+                          'altitude':[0.0]})
         
         self.titles = []
         self.labels = []
@@ -122,13 +142,7 @@ class Tracker(Widget.Widget):
         self.labels.append(label)
         self.altft_label = label
         
-        params = {'output':'json','x':self.Map.DEFAULT_center_pt[1],'y':self.Map.DEFAULT_center_pt[0],'units':'Meters'}
-        try:
-            url = r'https://nationalmap.gov/epqs/pqs.php?'
-            result = requests.get((url + urllib.parse.urlencode(params)),timeout=3)
-            agl = float(result.json()['USGS_Elevation_Point_Query_Service']['Elevation_Query']['Elevation']) - self.Map.DEFAULT_elev
-        except:
-            agl = 0
+        agl = self.agl(*self.Map.DEFAULT_center_pt,self.Map.DEFAULT_elev)
         label = tk.Label(self,text='AGL: {:7.2f} m'.format(agl),font=('Verdana',9),fg=self.master.colors['pale yellow'],bg='black',anchor='nw')
         self.add_comp(label,0.5*self.w+135,145,100,15)
         self.labels.append(label)
@@ -148,17 +162,16 @@ class Tracker(Widget.Widget):
         self.labels.append(label)
         self.grndvel_label = label
         
-        p_theory = self.p_0*np.exp(-((self.g*self.Map.DEFAULT_elev*self.M)/(self.T_0*self.R_0)))
-        pcntg = 100*(1-p_theory/self.p_0)
+        pcntg = 100*(1-Flight_Metrics.pressure_fraction(self.Map.DEFAULT_elev))
         label = tk.Label(self,text='You are above {:6.2f}% of\nthe atmosphere.'.format(pcntg),font=('Verdana',9),fg=self.master.colors['pale yellow'],bg='black',anchor='nw')
         self.add_comp(label,0.5*self.w+130,235,200,30)
         self.labels.append(label)
         self.pcntg_label = label
         
-        self.label = tk.Label(self.elev_frame)
-        self.label.pack(fill=tk.BOTH)
-        self.gen_plt()
-        self.gen_img()
+        # Drawn on a Canvas and extended with each poll rather than replotted
+        self.chart = Altitude_Chart.Altitude_Chart(self.elev_frame)
+        self.chart.pack(fill=tk.BOTH,expand=True)
+        self.chart.extend(self.data)
         
         self.buttons = []
         x_coords = [40,10,40,70,40,40]
@@ -188,38 +201,6 @@ class Tracker(Widget.Widget):
         self.redraw(m_W,m_H)
         
         
-    def gen_plt(self):
-        '''
-        Generate a plot of the balloons altitude
-        '''
-    
-        self.fig = plt.figure('ALTITUDE')
-        self.ax = self.fig.add_subplot(111,label='ALTITUDE')
-        
-        self.ax.plot(self.data['altitude'],'ro-')
-        
-        
-    def gen_img(self):
-        '''
-        Converts plot to image and updates image frame
-        '''
-        
-        buff = io.BytesIO()
-        self.fig.savefig(buff,format='png')
-        plt.close(self.fig)
-        
-        self.image = Image.open(buff)
-        self.image = self.autocrop_image(self.image)
-        self.image = self.image.resize((self.img_w,self.img_h))
-        
-        self.copy_of_image = self.image.copy()
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.configure(image=self.photo)
-        self.label.image = self.photo
-        
-        buff.close()
-    
-        
     def redraw(self,w,h):
         '''
         Updates all graphical components
@@ -269,31 +250,15 @@ class Tracker(Widget.Widget):
         
         self.Map.resize((self.w)/self.m_W*w,(self.h)/self.m_H*h)
         
-        self.img_w,self.img_h = int(self.img_oW/self.m_W*w), int(self.img_oH/self.m_H*h)
-        self.image = self.copy_of_image.resize((self.img_w,self.img_h))
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.config(image = self.photo)
-        self.label.image = self.photo #avoid garbage collection
-        
         
     def move_map(self,ind):
         '''
         Moves the map in the direction indicated
         '''
     
-        # Threading to prevent freezing in main thread
-        t1 = Thread(target=self._move_map, args=(ind,))
-        t1.start()
-        #self._move_map(ind)
-    
-    
-    def _move_map(self,ind):
-        '''
-        Wrapper for move_map; determine direction indicator
-        '''
-    
-        cntr = list(self.Map.center_pt)
-        zoom = self.Map.zoom
+        # Move from the view last asked for, not the last one drawn, so quick presses add up
+        cntr,zoom = self.view if self.view is not None else (self.Map.center_pt,self.Map.zoom)
+        cntr = list(cntr)
         
         if ind=='left':
             cntr[1]+=zoom
@@ -307,141 +272,283 @@ class Tracker(Widget.Widget):
             zoom-=0.25*zoom
         elif ind=='out':
             zoom+=0.75*zoom
+        
+        self.view = (tuple(cntr),zoom)
+        self.map_worker.submit(self._move_map)
+    
+    
+    def _move_map(self,stale):
+        '''
+        Wrapper for move_map; renders the latest view asked for in the map worker thread
+        
+        Parameters:
+        self    (Widget): Required for object functions
+        stale (function): Returns True once a newer view has been asked for
+        
+        Returns:
+        None
+        '''
+    
+        cntr,zoom = self.view if self.view is not None else (self.Map.center_pt,self.Map.zoom)
            
         try: 
-            self.Map.gen_plt([self.data['longitude'],self.cy], [self.data['latitude'],self.cx],decorator=['r-','b-'],center_pt=cntr,zoom=zoom,multidata=True)
+            xs,ys,decorators = self.track_layers(zoom)
+            self.Map.gen_plt(xs,ys,decorator=decorators,center_pt=cntr,zoom=zoom,multidata=True,version=self.track_version())
+            if stale():
+                # Never shown; the newer view is rendered next
+                self.map_worker.drop()
+                return
             self.Map.gen_img()
         except:
+            traceback.print_exc()
             self.master.log('Unable to generate plots.','ERROR')
         
-        return;   # kill thread on finish
+        self.prefetch_tiles()
         
         
-    def _update_coords(self,clear):
+    def _update_coords(self,clear=False):
         '''
-        Download the flight csv from Sierra's website and update current flight data
+        Download any new rows of every tracked flight's csv from Sierra's website and update current flight data
+        
+        Returns:
+        bool: Whether or not new data was received
         '''
     
-        if self.bc is None:
-            return;
+        if not self.flights:
+            return False
+        
+        # One batched poll for all flights; each flight only downloads its own new rows
+        flights = list(self.flights)
+        changed = list(self.pool.map(Tracked_Flight.Tracked_Flight.poll,flights))
+        for flight in flights:
+            if flight.cache_problem() is not None:
+                self.master.log('Unable to cache flight data for {}'.format(flight.imei[-4:]),'ERROR')
+        if not any(changed):
+            return False   # self.master.log('No new data',lvl='DEBUG')
+            
+        for flight,new in zip(flights,changed):
+            if new:
+                self.master.log('New data received for {} ({} rows, {} bytes downloaded, {} new)'.format(flight.imei[-4:],flight.feed.stats['last_rows'],flight.feed.stats['last_bytes'],flight.feed.stats['last_new_bytes']),lvl='DEBUG')
+        self.master.log('Poller {}'.format(self.poller.summary()),lvl='DEBUG')
+        self.master.log('HTTP {}'.format(Http.summary('borealis')),lvl='DEBUG')
+        self.master.log('Tiles {}'.format(self.Map.tiles.summary()),lvl='DEBUG')
+        self.master.log('Map frames {}'.format(self.Map.render_cache.summary()),lvl='DEBUG')
+        self.master.log('Map renders {}'.format(self.map_worker.summary()),lvl='DEBUG')
+        
+        for flight,new in zip(flights,changed):
+            if new:
+                self.predictor.update(flight.uid,flight.data,flight.metrics)
+        
+        # Poll faster while any payload is coming down
+        descending = any(flight.data.latest('ascent_rate',0)<-2 for flight in flights)
+        self.poller.base = self.poll_intervals['descent' if descending else 'flight']
+        
+        if self.data.latest('uid')!=self.bc.uid:
+            # Nothing from the primary flight yet; center on whichever flight has data
+            primary = next(flight.data for flight,new in zip(flights,changed) if new)
         else:
-            try:
-                urlData = requests.get("https://borealis.rci.montana.edu/flight?uid={}&format=csv".format(self.bc.uid),timeout=3).content
-                data = pd.read_csv(io.StringIO(urlData.decode('UTF-8')))
-            except:
-                data = self.data
-                
-            if data.shape==self.data.shape:
-                pass   # self.master.log('No new data',lvl='DEBUG')
-            else:
-                self.data = data
-                if list(self.data['uid'])[-1]!=self.bc.uid:
-                    return;
-                self.master.log('New data received',lvl='DEBUG')
-                
-                spread = np.array(self.data[['latitude','longitude']].max()) - np.array(self.data[['latitude','longitude']].min())
-                #zoom = (np.sqrt(sum(spread**2))/10**1)**0.5
-                
-                try:
-                    self.Map.gen_plt([self.data['longitude'],self.cy], [self.data['latitude'],self.cx],decorator=['r-','b-'],center_pt=(list(self.data['latitude'])[-1],list(self.data['longitude'])[-1]),zoom=self.Map.zoom,multidata=True)
-                    self.Map.gen_img()
-                except:
-                    traceback.print_exc()
-                    self.master.log('Unable to generate plots.','ERROR')
-                    try:
-                        self.Map.gen_plt(self.data['longitude'], self.data['latitude'],decorator='r-',zoom=self.Map.zoom)
-                    except:
-                        traceback.print_exc()
-                
-                self.gen_plt()
-                self.gen_img()
-                
-                self.latlon_label.configure(text='Lat: {:9.4f}\nLon: {:9.4f}'.format(list(self.data['latitude'])[-1],list(self.data['longitude'])[-1]))
-                self.alt_label.configure(text='Alt: {:7.2f} m'.format(list(self.data['altitude'])[-1]))
-                
-                self.altft_label.configure(text='Alt: {:7.2f} ft'.format(list(self.data['altitude'])[-1]*3.28084))
-                
-                params = {'output':'json','x':list(self.data['longitude'])[-1],'y':list(self.data['latitude'])[-1],'units':'Meters'}
-                try:
-                    url = r'https://nationalmap.gov/epqs/pqs.php?'
-                    result = requests.get((url + urllib.parse.urlencode(params)),timeout=3)
-                    agl = list(self.data['altitude'])[-1] - float(result.json()['USGS_Elevation_Point_Query_Service']['Elevation_Query']['Elevation'])
-                except:
-                    agl = 0
-                self.agl_label.configure(text='AGL: {:7.2f} m'.format(agl))
-                
-                self.vertvel_label.configure(text='Vert: {:7.2f} m/s'.format(list(self.data['vertical_velocity'])[-1]))
-                
-                self.grndvel_label.configure(text='Grnd: {:7.2f} m/s'.format(list(self.data['ground_speed'])[-1]/3.6))
-                
-                p_theory = self.p_0*np.exp(-((self.g*list(self.data['altitude'])[-1]*self.M)/(self.T_0*self.R_0)))
-                pcntg = 100*(1-p_theory/self.p_0)
-                self.pcntg_label.configure(text='You are above {:6.2f}% of\nthe atmosphere.'.format(pcntg))
-                
-                self.master.log('Payload @ ({:9.4f},{:9.4f})|{:7.2f} m'.format(list(self.data['latitude'])[-1],list(self.data['longitude'])[-1],list(self.data['altitude'])[-1]))
-        
-        #self.after(5000,self.update_coords)
-        self.numProcs -= 1
-        return;   # kill thread on finish
+            primary = self.data
         
-
-    def update_coords(self,clear=False):
+        # Recenter on the newest report at the current zoom
+        zoom = self.view[1] if self.view is not None else self.Map.zoom
+        self.view = ((primary.latest('latitude'),primary.latest('longitude')),zoom)
+        self.map_worker.submit(self._move_map)
+        
+        for flight,new in zip(flights,changed):
+            if new:
+                self.master.log('Payload {} @ ({:9.4f},{:9.4f})|{:7.2f} m'.format(flight.imei[-4:],flight.data.latest('latitude'),flight.data.latest('longitude'),flight.data.latest('altitude')))
+            if flight.metrics.burst is not None and flight.uid not in self.bursts:
+                self.bursts.add(flight.uid)
+                self.master.log('Payload {} burst at {:7.2f} m'.format(flight.imei[-4:],flight.metrics.burst[0]))
+        
+        if primary is not self.data:
+            return True
+        
+        self.chart.extend(self.data)
+        
+        self.latlon_label.configure(text='Lat: {:9.4f}\nLon: {:9.4f}'.format(self.data.latest('latitude'),self.data.latest('longitude')))
+        self.alt_label.configure(text='Alt: {:7.2f} m'.format(self.data.latest('altitude')))
+        
+        self.altft_label.configure(text='Alt: {:7.2f} ft'.format(self.data.latest('altitude')*3.28084))
+        
+        # Derived columns are computed as rows arrive; only look up the ground here if the DEM did not cover the newest row
+        agl = self.data.latest('agl')
+        if np.isnan(agl):
+            agl = self.agl(self.data.latest('latitude'),self.data.latest('longitude'),self.data.latest('altitude'))
+        self.agl_label.configure(text='AGL: {:7.2f} m'.format(agl))
+        
+        # The averaged ascent rate; the raw reading until there is one
+        vertvel = self.data.latest('ascent_rate')
+        if np.isnan(vertvel):
+            vertvel = self.data.latest('vertical_velocity')
+        self.vertvel_label.configure(text='Vert: {:7.2f} m/s'.format(vertvel))
+        
+        self.grndvel_label.configure(text='Grnd: {:7.2f} m/s'.format(self.data.latest('ground_speed_ms')))
+        
+        pcntg = 100*(1-self.data.latest('pressure_fraction'))
+        self.pcntg_label.configure(text='You are above {:6.2f}% of\nthe atmosphere.'.format(pcntg))
+        
+        return True
+        
+        
+    def agl(self,lat,lon,alt):
         '''
-        Wrapper function for _update_coords
+        Get the altitude above ground level of a point
+        
+        Parameters:
+        self (Widget): Required for object functions
+        lat   (float): Latitude of the point
+        lon   (float): Longitude of the point
+        alt   (float): Altitude of the point (m)
+        
+        Returns:
+        float: The altitude above ground (m); 0 if the ground elevation is unknown
         '''
         
-        # Threading to prevent freezing in main thread
-        t1 = Thread(target=self._update_coords, args=(clear,))
-        t1.start()
-        #self._update_coords(clear)
-        self.after(3000, self.update_coords)
+        ground = self.elevation.elevation(lat,lon)
+        return 0 if np.isnan(ground) else alt-ground
         
         
-    def set_profile(self):
+    def _prediction_ready(self,uid):
         '''
-        Set flight command profile
+        Log a new landing prediction and redraw the map with it; called from a worker thread
         '''
         
-        try:
-            self.bc = BC.Balloon_Coordinates(self.master.profile['imei'])
-        except:
-            self.bc = None
-            self.master.log('Unable to init Balloon_Coordinates','ERROR')
-        self.data = pd.DataFrame()
-        self.update_coords(clear=True)
+        flight = next((flight for flight in self.flights if flight.uid==uid),None)
+        if flight is None:
+            return
+        result = self.predictor.results[uid]
+        self.master.log('Payload {} landing ({:9.4f},{:9.4f}) +/- {:.0f} m in {:.0f} min'.format(flight.imei[-4:],result['latitude'],result['longitude'],result['radius'],result['time']/60))
+        self.master.log('Predictor {}'.format(self.predictor.summary()),lvl='DEBUG')
+        self.move_map(None)
         
         
-    def autocrop_image(self,image,border=0):
+    def prefetch_tiles(self):
+        '''
+        Queue downloads of the tiles the map is likely to need next, most likely first
+        '''
+        
+        lat,lon = self.Map.center_pt
+        zoom = self.Map.zoom
+        # Fetch the tile level the map is actually drawn from
+        width = self.Map.img_w if self.Map.renderer=='mosaic' else None
+        
+        # The current view and one pan in every direction
+        self.prefetcher.prefetch([lat,lat,lat,lat+zoom,lat-zoom],[lon,lon+zoom,lon-zoom,lon,lon],zoom,width,label='view')
+        if not self.prefetcher.bulk:
+            return
+        
+        # From each descending payload to its predicted landing ellipse
+        for flight in self.flights:
+            result = self.predictor.results.get(flight.uid)
+            if result is None or not len(flight.data):
+                continue
+            t = np.linspace(0,1,20)
+            lats = np.concatenate([flight.data.latest('latitude')+t*(result['latitude']-flight.data.latest('latitude')),result['ellipse_lat']])
+            lons = np.concatenate([flight.data.latest('longitude')+t*(result['longitude']-flight.data.latest('longitude')),result['ellipse_lon']])
+            self.prefetcher.prefetch(lats,lons,zoom,width,label='landing corridor')
+        
+        # Along each track, newest first; only the reports added since the last time at this zoom
+        for flight in self.flights:
+            generation,count = flight.data.version()
+            done = self.prefetched.get(flight.uid)
+            start = done[3] if done is not None and done[:3]==(generation,zoom,width) else 0
+            first = count-len(flight.data)   # Report number of the oldest row kept
+            lats = flight.data['latitude'][max(start-first,0):]
+            lons = flight.data['longitude'][max(start-first,0):]
+            self.prefetched[flight.uid] = (generation,zoom,width,count)
+            self.prefetcher.prefetch(lats[::-1],lons[::-1],zoom,width,label='track')
+        
+        
+    def track_version(self):
+        '''
+        Something that changes whenever anything drawn on the map does, for the Map's render cache
         '''
-        Crop image automatically to its content
+        
+        return (tuple((flight.uid,flight.data.version()) for flight in self.flights),
+                self.predictor.generation,
+                len(self.cx),len(self.cy))
+        
+        
+    def track_layers(self,zoom):
+        '''
+        Collect the track of every flight for plotting on the map
         
         Parameters:
         self (Widget): Required for object functions
-        image (Image): The image to be cropped
-        border  (int): The extra border to include with the cropped image
+        zoom  (float): The Map zoom the tracks will be drawn at
         
         Returns:
-        Image: The cropped image
+        tuple: Lists of the longitude data, latitude data, and line decorator for each track
         '''
-    
-        # Get the bounding box
-        bbox = image.getbbox()
-
-        # Crop the image to the contents of the bounding box
-        image = image.crop(bbox)
-
-        # Determine the width and height of the cropped image
-        (width,height) = image.size
-    
-        # Add border
-        width+=border*2
-        height+=border*2
-    
-        # Create a new image object for the output image
-        cropped_image = Image.new("RGBA",(width,height),(0,0,0,0))
-
-        # Paste the cropped image onto the new image
-        cropped_image.paste(image,(border, border))
-
-        return cropped_image
+        
+        # Tracks are simplified to what can be seen at the zoom level
+        z = Tile_Cache.zoom_level(zoom)
+        xs,ys,decorators = [],[],[]
+        for i,flight in enumerate(self.flights):
+            lons,lats = flight.lod.track(z)
+            xs.append(lons)
+            ys.append(lats)
+            decorators.append(self.track_colors[i%len(self.track_colors)]+'-')
+        if not self.flights:
+            xs,ys,decorators = [self.data['longitude']],[self.data['latitude']],['r-']
+        
+        # Predicted landing ellipses, dashed in the color of their track
+        for i,flight in enumerate(self.flights):
+            result = self.predictor.results.get(flight.uid)
+            if result is not None:
+                xs += [result['ellipse_lon'],[result['longitude']]]
+                ys += [result['ellipse_lat'],[result['latitude']]]
+                decorators += [self.track_colors[i%len(self.track_colors)]+'--',self.track_colors[i%len(self.track_colors)]+'x']
+        
+        xs.append(self.cy)
+        ys.append(self.cx)
+        decorators.append('b-')
+        return xs,ys,decorators
+        
 
+    def update_coords(self,clear=False):
+        '''
+        Wrapper function for _update_coords
+        '''
+        
+        # Polls run in a worker thread to prevent freezing in main thread, one at a time
+        self.poller.start()
+        
+        
+    def set_profile(self):
+        '''
+        Set flight command profile
+        '''
+        
+        self.poller.stop()
+        self.prefetcher.cancel()
+        self.prefetched = {}
+        
+        # The profile's IMEI is the primary flight shown in the labels; 'imeis' lists any others to track alongside it
+        imeis = [self.master.profile['imei']]
+        imeis += [imei for imei in self.master.profile.get('imeis',[]) if imei not in imeis]
+        
+        flights = []
+        for imei in imeis:
+            try:
+                # Warm starts from whatever was saved of the flight; its feed then asks only for newer rows
+                flight = Tracked_Flight.Tracked_Flight(imei,self.elevation)
+            except:
+                self.master.log('Unable to init Balloon_Coordinates for {}'.format(imei),'ERROR')
+                continue
+            if flight.offline:
+                self.master.log('Unable to reach the server; using the cached flight for {}'.format(imei[-4:]),'ERROR')
+            if flight.loaded:
+                self.master.log('Loaded {} cached rows for flight {}'.format(flight.loaded,flight.uid))
+            flights.append(flight)
+        
+        self.flights = flights
+        if flights:
+            self.bc,self.data = flights[0].bc,flights[0].data
+        else:
+            self.bc,self.data = None,Flight_Store.Flight_Store()
+        self.chart.extend(self.data)
+        self.update_coords(clear=True)
+        # Get the launch area before the first reports come in
+        Thread(target=self.prefetch_tiles,daemon=True).start()
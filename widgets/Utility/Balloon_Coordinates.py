@@ -20,31 +20,43 @@ IN THE SOFTWARE.
 ----------------------------------------------------------------------------
 """
 
-import requests;
+import widgets.Utility.Http as Http;
 import time;
+import os;
+
+# Set ICC_BOREALIS_URL to point ICC at another server (e.g. widgets/Utility/Replay_Server.py)
+BOREALIS_URL = os.environ.get('ICC_BOREALIS_URL', 'https://borealis.rci.montana.edu').rstrip('/');
 
 
 class Balloon_Coordinates:
     BOREALIS_EPOCH = 1357023600;
 
-    def __init__(self, imei):
+    def __init__(self, imei, latest_flight=None):
 
         self.imei = imei;
 
-        # Grab and Define IMEI's Latest Flight
-        req = requests.get("https://borealis.rci.montana.edu/meta/flights?imei={}".format(self.imei));
-        self.latest_flight = req.json()[-1];
+        # Grab and Define IMEI's Latest Flight, unless it is already known (e.g. from the flight cache when offline)
+        if latest_flight is None:
+            req = Http.get("{}/meta/flights?imei={}".format(BOREALIS_URL, self.imei), 'borealis');
+            latest_flight = req.json()[-1];
+        self.latest_flight = latest_flight;
 
         # Define UID
-        flightTime = int(time.mktime(time.strptime(self.latest_flight, "%Y-%m-%d")) - 25200 - Balloon_Coordinates.BOREALIS_EPOCH);   # Changed 21600 to 25200 (JP)
-        self.uid = (int(flightTime) << 24)|int(self.imei[8:]);
+        self.uid = Balloon_Coordinates.make_uid(self.imei, self.latest_flight);
         return;
 
+
+    @staticmethod
+    def make_uid(imei, flight_date):
+        # UID of the flight flown by an IMEI on a date ("%Y-%m-%d")
+        flightTime = int(time.mktime(time.strptime(flight_date, "%Y-%m-%d")) - 25200 - Balloon_Coordinates.BOREALIS_EPOCH);   # Changed 21600 to 25200 (JP)
+        return (int(flightTime) << 24)|int(imei[8:]);
+
     
     @staticmethod
     def list_IMEI():
         # Request IMEI List
-        req = requests.get('https://borealis.rci.montana.edu/meta/imeis');
+        req = Http.get('{}/meta/imeis'.format(BOREALIS_URL), 'borealis');
         data = req.json();
         IMEIs = [];
         
@@ -53,7 +65,7 @@ class Balloon_Coordinates:
         return IMEIs;
 
     def get_coor_alt(self):
-        req = requests.get("https://borealis.rci.montana.edu/flight?uid={}".format(self.uid));
+        req = Http.get("{}/flight?uid={}".format(BOREALIS_URL, self.uid), 'borealis');
         data = req.json();
         # Lat, Long, Alt
         self.coor_alt = [data['data'][-1][3], data['data'][-1][4], data['data'][-1][5]];
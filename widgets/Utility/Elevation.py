@@ -0,0 +1,209 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a ground elevation lookup that reads local DEM tiles so above ground level altitudes work without a network connection.
+
+Tiles are SRTM .hgt files (e.g. N45W112.hgt, either 1201x1201 or 3601x3601 big-endian 16 bit samples) placed in the
+dem folder, or wherever ICC_DEM_DIR points. Points not covered by a tile are looked up with the USGS point query service.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+import widgets.Utility.Http as Http
+import numpy as np
+import math
+import os
+
+DEM_DIR = os.environ.get('ICC_DEM_DIR','dem')
+USGS_URL = 'https://nationalmap.gov/epqs/pqs.php'
+
+# SRTM marks missing samples with this value
+VOID = -32768
+
+
+class Elevation_Service:
+    '''
+    Looks up ground elevation (m) from memory-mapped DEM tiles, falling back to USGS
+    '''
+
+    def __init__(self,path=DEM_DIR,quantum=1e-4,cache_size=4096):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Elevation_Service): Required for object functions
+        path               (str): The folder containing .hgt tiles
+        quantum          (float): Points closer than this (degrees) share a cache entry
+        cache_size         (int): The most points kept in the cache
+
+        Returns:
+        None
+        '''
+
+        self.path = path
+        self.quantum = quantum
+        self.cache_size = cache_size
+
+        self.lock = Lock()
+        self.cache = OrderedDict()
+        self.tiles = {}
+        self.stats = {'hits':0,'dem':0,'remote':0,'failed':0}
+
+
+    def tile(self,lat,lon):
+        '''
+        Get the memory-mapped tile covering a point
+
+        Parameters:
+        self (Elevation_Service): Required for object functions
+        lat              (float): Latitude of the point
+        lon              (float): Longitude of the point
+
+        Returns:
+        numpy.memmap: The tile's samples (north row first); None if there is no tile for the point
+        '''
+
+        key = (math.floor(lat),math.floor(lon))
+        with self.lock:
+            if key in self.tiles:
+                return self.tiles[key]
+
+        name = '{}{:02d}{}{:03d}.hgt'.format('N' if key[0]>=0 else 'S',abs(key[0]),'E' if key[1]>=0 else 'W',abs(key[1]))
+        fname = os.path.join(self.path,name)
+        samples = None
+        if os.path.isfile(fname):
+            n = int(round(math.sqrt(os.path.getsize(fname)/2)))
+            samples = np.memmap(fname,dtype='>i2',mode='r',shape=(n,n))
+
+        with self.lock:
+            self.tiles[key] = samples
+        return samples
+
+
+    def _from_dem(self,lats,lons):
+        '''
+        Bilinear interpolation of the DEM at arrays of points all in the same tile; NaN where there is no data
+        '''
+
+        samples = self.tile(lats[0],lons[0])
+        if samples is None:
+            return np.full(len(lats),np.nan)
+
+        n = samples.shape[0]
+        lat0,lon0 = math.floor(lats[0]),math.floor(lons[0])
+        row = (lat0+1-lats)*(n-1)
+        col = (lons-lon0)*(n-1)
+        r = np.clip(np.floor(row).astype(int),0,n-2)
+        c = np.clip(np.floor(col).astype(int),0,n-2)
+        fr,fc = row-r,col-c
+
+        z = np.stack([samples[r,c],samples[r,c+1],samples[r+1,c],samples[r+1,c+1]]).astype(float)
+        z[z==VOID] = np.nan
+        return (z[0]*(1-fc)+z[1]*fc)*(1-fr)+(z[2]*(1-fc)+z[3]*fc)*fr
+
+
+    def _from_usgs(self,lat,lon):
+        '''
+        Ask the USGS point query service for the elevation of a point; NaN if it cannot be reached
+        '''
+
+        params = {'output':'json','x':lon,'y':lat,'units':'Meters'}
+        try:
+            result = Http.get(USGS_URL,'usgs',params=params)
+            elev = float(result.json()['USGS_Elevation_Point_Query_Service']['Elevation_Query']['Elevation'])
+        except:
+            return np.nan
+        # The service reports points it has no data for as a large negative number
+        return elev if elev>-1000 else np.nan
+
+
+    def elevation(self,lat,lon):
+        '''
+        Get the ground elevation at a point
+
+        Parameters:
+        self (Elevation_Service): Required for object functions
+        lat              (float): Latitude of the point
+        lon              (float): Longitude of the point
+
+        Returns:
+        float: The elevation (m); NaN if unknown
+        '''
+
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return np.nan
+        key = (round(lat/self.quantum),round(lon/self.quantum))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return self.cache[key]
+
+        elev = self._from_dem(np.array([lat],float),np.array([lon],float))[0]
+        if not np.isnan(elev):
+            source = 'dem'
+        else:
+            elev = self._from_usgs(lat,lon)
+            source = 'remote' if not np.isnan(elev) else 'failed'
+
+        with self.lock:
+            self.stats[source] += 1
+            if source!='failed':
+                self.cache[key] = elev
+                if len(self.cache)>self.cache_size:
+                    self.cache.popitem(last=False)
+        return elev
+
+
+    def elevations(self,lats,lons,remote=True):
+        '''
+        Get the ground elevation along a whole track at once
+
+        Parameters:
+        self (Elevation_Service): Required for object functions
+        lats             (array): Latitudes of the points
+        lons             (array): Longitudes of the points
+        remote            (bool): Whether or not to look up points without DEM coverage one at a time with USGS
+
+        Returns:
+        numpy.ndarray: The elevations (m); NaN where unknown, including points without a position
+        '''
+
+        lats = np.asarray(lats,float)
+        lons = np.asarray(lons,float)
+        out = np.full(len(lats),np.nan)
+        # Rows with an empty latitude or longitude have no ground to look up
+        valid = np.flatnonzero(np.isfinite(lats)&np.isfinite(lons))
+        if len(valid)==0:
+            return out
+
+        # One vectorized pass per tile the track passes through
+        keys = np.floor(lats[valid]).astype(int)*1000+np.floor(lons[valid]).astype(int)
+        for key in np.unique(keys):
+            idx = valid[keys==key]
+            out[idx] = self._from_dem(lats[idx],lons[idx])
+        with self.lock:
+            self.stats['dem'] += int(np.count_nonzero(~np.isnan(out)))
+
+        if remote:
+            for i in valid[np.isnan(out[valid])]:
+                out[i] = self.elevation(lats[i],lons[i])
+        return out
@@ -26,95 +26,205 @@ This is a wrapper class for the Google GMail API. It is used by Overview.py to s
 import os
 import pickle
 import json
+import datetime
+import threading
+import time
+import traceback
 
 # Gmail API utils
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build,build_from_document
+from googleapiclient import discovery_cache
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
-# for encoding/decoding messages in base64
-from base64 import urlsafe_b64decode, urlsafe_b64encode
+# for encoding messages in base64
+from base64 import urlsafe_b64encode
 
-# for dealing with attachement MIME types
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
-from email.mime.audio import MIMEAudio
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from mimetypes import guess_type as guess_mime_type
+# Building the emails is shared with the other transports
+import widgets.Utility.Mail_Transport as Mail_Transport
 
 # Request all access (permission to read/send/receive emails, manage the inbox, and more)
 SCOPES = ['https://mail.google.com/']
 
+# Confirmations of commands come from this address
+IRIDIUM_SENDER = Mail_Transport.IRIDIUM_SENDER
 
+# The parts of an email read_messages fetches: the headers and the text of each part
+MESSAGE_FIELDS = 'id,threadId,internalDate,payload(headers(name,value),parts(mimeType,body/data))'
+
+# Tokens are refreshed this long before they expire (s)
+REFRESH_MARGIN = 300
+
+# How long a caller waits on a sign in or refresh already under way in another thread before giving up (s)
+SIGN_IN_WAIT = 10
+
+# The longest the background refresh waits between attempts after failing (s)
+RETRY_MAX = 600
+
+# One set of credentials for the whole process; each thread gets its own service built from them, since the
+# service's HTTP connection may not be shared between threads
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()   # Held while signing in or refreshing, which can take a while; never while holding _lock
+_creds = None
+_document = None
+_local = threading.local()
+_refresher = None
+
+
+def credentials(wait=SIGN_IN_WAIT):
+    """
+    Get valid gmail credentials, loading, refreshing, or asking for them only when needed; requires credentials.json
+    from Google Cloud services; creates token.pickle
+    
+    Only one thread signs in or refreshes at a time. The others carry on with the current credentials while they are
+    still valid, and otherwise wait for it, up to a limit.
+    
+    Parameters:
+    wait (float): The longest to wait on a sign in or refresh under way in another thread (s); None to wait for it
+    
+    Returns:
+    Credentials: The credentials shared by every service
+    """
+
+    global _creds
+    with _lock:
+        creds = _creds
+    if creds and creds.valid and _expires_in(creds)>=REFRESH_MARGIN:
+        return creds
+    
+    if not _refresh_lock.acquire(blocking=False):
+        if creds and creds.valid:
+            return creds
+        if not _refresh_lock.acquire(timeout=-1 if wait is None else wait):
+            raise TimeoutError('Still signing in to gmail')
+    try:
+        with _lock:
+            creds = _creds
+        # the file token.pickle stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first time
+        if creds is None and os.path.exists("token.pickle"):
+            with open("token.pickle","rb") as token:
+                creds = pickle.load(token)
+        # if there are no (valid) credentials availablle, let the user log in.
+        if not creds or not creds.valid or _expires_in(creds)<REFRESH_MARGIN:
+            if creds and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json',SCOPES)
+                creds = flow.run_local_server(port=0)
+            # save the credentials for the next run
+            with open("token.pickle","wb") as token:
+                pickle.dump(creds, token)
+        with _lock:
+            _creds = creds
+        return creds
+    finally:
+        _refresh_lock.release()
+        
+        
+def _expires_in(creds):
+    """
+    Seconds until the access token expires; infinite if it does not say
+    """
+    
+    if creds.expiry is None:
+        return float('inf')
+    return (creds.expiry-datetime.datetime.utcnow()).total_seconds()
+    
+    
+def gmail_service():
+    """
+    Get the calling thread's gmail service, building it the first time the thread asks
+    
+    Parameters:
+    None
+    
+    Returns:
+    Resource: The authenticated gmail service
+    """
+    
+    global _document
+    creds = credentials()
+    service = getattr(_local,'service',None)
+    if service is not None and _local.creds is creds:
+        return service
+    
+    with _lock:
+        if _document is None:
+            # The discovery document ships with the client library; parse it once rather than per service
+            doc = discovery_cache.get_static_doc('gmail','v1')
+            _document = json.loads(doc) if doc else False
+    if _document:
+        service = build_from_document(_document,credentials=creds)
+    else:
+        service = build('gmail','v1',credentials=creds)
+    _local.service,_local.creds = service,creds
+    return service
+    
+    
 def gmail_authenticate():
     """
-    Authenticate gmail credentials; requires credentials.json from Google Cloud services; creates token.pickle
+    Authenticate gmail credentials; kept for callers of the original name
     
     Parameters:
     None
     
     Returns:
-    ???: Google authentication I guess
-    """
-
-    creds = None
-    # the file token.pickle stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first time
-    if os.path.exists("token.pickle"):
-        with open("token.pickle","rb") as token:
-            creds = pickle.load(token)
-    # if there are no (valid) credentials availablle, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json',SCOPES)
-            creds = flow.run_local_server(port=0)
-        # save the credentials for the next run
-        with open("token.pickle","wb") as token:
-            pickle.dump(creds, token)
-    return build('gmail','v1',credentials=creds)
+    Resource: The authenticated gmail service for the calling thread
+    """
+    
+    return gmail_service()
     
     
-# Adds the attachment with the given filename to the given message
-def add_attachment(message,filename):
+def prewarm(log=None):
     """
-    Add an attachment to the email
+    Load the credentials and the gmail API in the background so the first command goes out without waiting on them,
+    and keep the credentials refreshed from then on
     
     Parameters:
-    message  (???): The email object to be sent
-    filename (str): The filename of the attachement to be attached
+    log (function): Called with (message,level) if the credentials cannot be loaded or refreshed
     
     Returns:
     None
     """
-
-    content_type, encoding = guess_mime_type(filename)
-    if content_type is None or encoding is not None:
-        content_type = 'application/octet-stream'
-    main_type,sub_type = content_type.split('/',1)
-    if main_type=='text':
-        fp = open(filename,'rb')
-        msg = MIMEText(fp.read().decode(),_subtype=sub_type)
-        fp.close()
-    elif main_type=='image':
-        fp = open(filename,'rb')
-        msg = MIMEImage(fp.read(),_subtype=sub_type)
-        fp.close()
-    elif main_type=='audio':
-        fp = open(filename,'rb')
-        msg = MIMEAudio(fp.read(),_subtype=sub_type)
-        fp.close()
-    else:
-        fp = open(filename,'rb')
-        msg = MIMEBase(main_type,sub_type)
-        msg.set_payload(fp.read())
-        fp.close()
-    filename = os.path.basename(filename)
-    msg.add_header('Content-Disposition','attachment',filename=filename)
-    message.attach(msg)
+    
+    global _refresher
+    with _lock:
+        if _refresher is not None:
+            return
+        _refresher = threading.Thread(target=_refresh_loop,args=(log,),name='gmail-refresh',daemon=True)
+    _refresher.start()
+    
+    
+def _refresh_loop(log):
+    """
+    Refresh the shared credentials shortly before each access token expires, trying again with backoff when it fails
+    """
+    
+    retry = 10
+    failing = False
+    while True:
+        try:
+            creds = credentials(wait=None)
+            gmail_service()
+        except:
+            # Only report the first failure in a row; commands still try (and report) on their own meanwhile
+            if not failing:
+                if log is not None:
+                    log('Unable to authenticate with gmail ahead of time','ERROR')
+                else:
+                    traceback.print_exc()
+            failing = True
+            time.sleep(retry)
+            retry = min(retry*2,RETRY_MAX)
+            continue
+        if failing and log is not None:
+            log('Authenticated with gmail','INFO')
+        retry = 10
+        failing = False
+        time.sleep(min(max(_expires_in(creds)-REFRESH_MARGIN,10),3600))
+    
     
 def build_message(destination,obj,body,attachments=[]):
     """
@@ -130,17 +240,7 @@ def build_message(destination,obj,body,attachments=[]):
     dict: Prepared email
     """
     
-    if not attachments: # no attachments given
-        message = MIMEText(body)
-        message['to'] = destination
-        message['subject'] = obj
-    else:
-        message = MIMEMultipart()
-        message['to'] = destination
-        message['subject'] = obj
-        message.attach(MIMEText(body))
-        for filename in attachments:
-            add_attachment(message, filename)
+    message = Mail_Transport.mime_message(destination,obj,body,attachments)
     return {'raw':urlsafe_b64encode(message.as_bytes()).decode()}
     
 def send_message(service,destination,obj,body,attachments=[]):
@@ -161,20 +261,127 @@ def send_message(service,destination,obj,body,attachments=[]):
     return service.users().messages().send(userId="me",body=build_message(destination,obj,body,attachments)).execute()
     
     
-def read_messages(service,num_read=5):
+def search_query(sender=IRIDIUM_SENDER,since=None):
+    """
+    Build a gmail search for messages from a sender
+    
+    Parameters:
+    sender           (str): Only messages from this address; None for any
+    since (datetime/float): Only messages received after this (a datetime or seconds since the epoch); None for any
+    
+    Returns:
+    str: The search
+    """
+    
+    terms = []
+    if sender:
+        terms.append('from:{}'.format(sender))
+    if since is not None:
+        if isinstance(since,datetime.datetime):
+            since = since.timestamp()
+        terms.append('after:{:d}'.format(int(since)))
+    return ' '.join(terms)
+    
+    
+def read_messages(service,num_read=5,sender=IRIDIUM_SENDER,since=None,fields=MESSAGE_FIELDS):
+    """
+    Reads the newest emails, filtered by gmail and fetched together in one batch request
+    
+    Parameters:
+    service      (???): The authenticated gmail service from above
+    num_read     (int): The number of emails to read
+    sender       (str): Only emails from this address; None for any
+    since   (datetime): Only emails received after this; None for any
+    fields       (str): The parts of each email to fetch; None for all of it
+    
+    Returns:
+    list: A list of the read emails, newest first
+    """
+    
+    result = service.users().messages().list(userId='me',q=search_query(sender,since),maxResults=num_read).execute()
+    messages = result.get('messages',[])[:num_read]
+    return get_messages(service,[msg['id'] for msg in messages],fields)
+    
+    
+def get_messages(service,ids,fields=MESSAGE_FIELDS):
     """
-    Reads emails
+    Fetch emails together in one batch request
     
     Parameters:
     service  (???): The authenticated gmail service from above
-    num_read (int): The number of emails to read
+    ids     (list): The ids of the emails
+    fields   (str): The parts of each email to fetch; None for all of it
+    
+    Returns:
+    list: The emails, in the order of ids; emails deleted in the meantime are left out
+    """
+    
+    if not ids:
+        return []
+    
+    txts = {}
+    errors = []
+    def collect(request_id,response,exception):
+        if isinstance(exception,HttpError) and exception.resp.status==404:
+            pass
+        elif exception is not None:
+            errors.append(exception)
+        else:
+            txts[request_id] = response
+    
+    # A batch takes at most 100 requests
+    for i in range(0,len(ids),100):
+        batch = service.new_batch_http_request(callback=collect)
+        for msg_id in ids[i:i+100]:
+            batch.add(service.users().messages().get(userId='me',id=msg_id,fields=fields),request_id=msg_id)
+        batch.execute()
+    if errors:
+        raise errors[0]
+    return [txts[msg_id] for msg_id in ids if msg_id in txts]
+    
+    
+def history_id(service):
+    """
+    Get where the mailbox's history is up to
+    
+    Parameters:
+    service (???): The authenticated gmail service from above
+    
+    Returns:
+    str: The mailbox's current history id
+    """
+    
+    return service.users().getProfile(userId='me',fields='historyId').execute()['historyId']
+    
+    
+def new_message_ids(service,start):
+    """
+    List the emails added to the mailbox since a point in its history
+    
+    Parameters:
+    service (???): The authenticated gmail service from above
+    start   (str): The history id to start from
     
     Returns:
-    list: A list of the bodies of the read emails
+    tuple: The ids of the new emails, oldest first, and the history id they bring the mailbox up to; None if gmail
+           no longer keeps history that far back
     """
     
-    result = service.users().messages().list(userId='me').execute()
-    messages = result.get('messages')
-    txts = [service.users().messages().get(userId='me',id=msg['id']).execute() for msg in messages[:num_read]]
-    return txts
+    ids = []
+    latest = start
+    token = None
+    while True:
+        try:
+            result = service.users().history().list(userId='me',startHistoryId=start,historyTypes='messageAdded',
+                                                    pageToken=token).execute()
+        except HttpError as e:
+            if e.resp.status==404:
+                return None
+            raise
+        for record in result.get('history',[]):
+            ids += [added['message']['id'] for added in record.get('messagesAdded',[]) if added['message']['id'] not in ids]
+        latest = result.get('historyId',latest)
+        token = result.get('nextPageToken')
+        if token is None:
+            return ids,latest
 
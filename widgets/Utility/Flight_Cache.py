@@ -0,0 +1,191 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is an on-disk cache of flight telemetry so Tracker can pick up where it left off after a restart instead of downloading the whole flight again.
+
+Each flight gets a folder named after its uid holding one raw binary file per column, which rows are appended to as they
+arrive, and meta.json, which records how many rows are complete, where the Flight_Feed left off, and the IMEI and date of
+the flight, so the flight can be found again without asking the server.
+"""
+
+import widgets.Utility.Flight_Store as Flight_Store
+import numpy as np
+import shutil
+import json
+import os
+
+CACHE_DIR = 'cache/flights'
+
+
+def find(imei,path=CACHE_DIR):
+    """
+    Find the latest flight of an IMEI that has been cached, for when the server cannot be reached
+
+    Parameters:
+    imei (str): The IMEI of the Iridium modem on the payload
+    path (str): The folder all flight caches are kept in
+
+    Returns:
+    str: The date of the flight ("%Y-%m-%d"), as from Balloon_Coordinates; None if none is cached
+    """
+
+    flights = []
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return None
+    for name in names:
+        try:
+            with open(os.path.join(path,name,'meta.json'),'r') as f:
+                meta = json.load(f)
+        except (OSError,ValueError):
+            continue
+        if meta.get('imei')==imei and meta.get('flight') is not None:
+            flights.append(meta['flight'])
+    return max(flights) if flights else None
+
+
+class Flight_Cache:
+    '''
+    Appends flight rows to disk as they arrive and loads them back on startup
+    '''
+
+    def __init__(self,uid,columns=Flight_Store.COLUMNS,path=CACHE_DIR,imei=None,flight=None):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Flight_Cache): Required for object functions
+        uid           (int): The flight uid from Balloon_Coordinates
+        columns      (dict): Column names mapped to their numpy types
+        path          (str): The folder all flight caches are kept in
+        imei          (str): The IMEI the flight belongs to, recorded so find() can look it up offline
+        flight        (str): The date of the flight, as from Balloon_Coordinates
+
+        Returns:
+        None
+        '''
+
+        self.uid = uid
+        self.imei = imei
+        self.flight = flight
+        self.columns = dict(columns)
+        self.dir = os.path.join(path,str(uid))
+        self.rows = 0
+
+
+    def _file(self,name):
+        return os.path.join(self.dir,name+'.bin')
+
+
+    def load(self,store,feed):
+        '''
+        Fill a store with the cached rows and move the feed to where the cache left off
+
+        Parameters:
+        self (Flight_Cache): Required for object functions
+        store (Flight_Store): The store to fill, or anything else with an append (e.g. Flight_Metrics)
+        feed   (Flight_Feed): The feed to restore
+
+        Returns:
+        int: The number of rows loaded; 0 if there was nothing usable
+        '''
+
+        try:
+            with open(os.path.join(self.dir,'meta.json'),'r') as f:
+                meta = json.load(f)
+            n = meta['rows']
+            data = {}
+            for name,dtype in self.columns.items():
+                values = np.fromfile(self._file(name),dtype=dtype)
+                if len(values)<n:
+                    raise ValueError('Column {} is missing rows'.format(name))
+                # Anything past n was written by an update that never finished; the feed will fetch it again
+                data[name] = values[:n]
+        except (OSError,ValueError,KeyError):
+            self.clear()
+            return 0
+
+        self._truncate(n)
+        self.rows = n
+        store.append(data)
+        feed.restore(meta['feed'])
+        return n
+
+
+    def append(self,rows,feed):
+        '''
+        Append new rows to the cache and record the feed position they go with
+
+        Parameters:
+        self (Flight_Cache): Required for object functions
+        rows    (DataFrame): The new rows
+        feed  (Flight_Feed): The feed the rows came from
+
+        Returns:
+        None
+        '''
+
+        os.makedirs(self.dir,exist_ok=True)
+        if feed.resynced:
+            self._truncate(0)
+            self.rows = 0
+
+        n = len(rows)
+        try:
+            for name,dtype in self.columns.items():
+                if name in rows:
+                    values = np.asarray(rows[name],dtype=dtype)
+                else:
+                    values = np.full(n,0 if np.issubdtype(dtype,np.integer) else np.nan,dtype=dtype)
+                with open(self._file(name),'ab') as f:
+                    values.tofile(f)
+        except:
+            # Keep the columns lined up for the next append
+            self._truncate(self.rows)
+            raise
+        self.rows += n
+
+        # Written last and swapped in whole, so a crash never leaves meta.json pointing past the data
+        tmp = os.path.join(self.dir,'meta.json.tmp')
+        with open(tmp,'w') as f:
+            json.dump({'uid':self.uid,'imei':self.imei,'flight':self.flight,'rows':self.rows,'feed':feed.state()},f)
+        os.replace(tmp,os.path.join(self.dir,'meta.json'))
+
+
+    def _truncate(self,n):
+        '''
+        Cut every column file down to n rows
+        '''
+
+        for name,dtype in self.columns.items():
+            if os.path.exists(self._file(name)):
+                with open(self._file(name),'r+b') as f:
+                    f.truncate(n*np.dtype(dtype).itemsize)
+
+
+    def clear(self):
+        '''
+        Delete the cache for this flight
+        '''
+
+        shutil.rmtree(self.dir,ignore_errors=True)
+        self.rows = 0
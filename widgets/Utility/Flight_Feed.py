@@ -0,0 +1,189 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a helper class that incrementally downloads the flight csv from Sierra's website so only new rows are transferred and parsed.
+"""
+
+import io
+import widgets.Utility.Http as Http
+from widgets.Utility.Balloon_Coordinates import BOREALIS_URL
+import pandas as pd
+
+CSV_URL = BOREALIS_URL+'/flight?uid={}&format=csv'
+
+# Columns that may hold the time of a fix, in order of preference
+TIME_COLUMNS = ['timestamp','time','datetime']
+
+
+class Flight_Feed:
+    '''
+    Keeps track of how much of a flight csv has been received and fetches only the rest
+    '''
+
+    def __init__(self,uid,url=CSV_URL):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Flight_Feed): Required for object functions
+        uid          (int): The flight uid from Balloon_Coordinates
+        url          (str): The csv url; formatted with the uid
+
+        Returns:
+        None
+        '''
+
+        self.uid = uid
+        self.url = url.format(uid)
+
+        self.reset()
+        self.stats = {'polls':0,
+                      'bytes':0,        # Bytes downloaded
+                      'new_bytes':0,    # Bytes of the csv not seen before; less than bytes when the server ignores Range
+                      'rows':0,
+                      'last_bytes':0,
+                      'last_new_bytes':0,
+                      'last_rows':0}
+
+
+    def reset(self):
+        '''
+        Forget everything received so far; the next poll downloads the whole csv
+        '''
+
+        self.offset = 0         # Number of bytes of the csv consumed so far
+        self.header = None      # The csv header line
+        self.time_col = None    # The column used to drop rows already seen
+        self.last_time = None
+        self.rows = 0
+        self.resynced = True
+
+
+    def state(self):
+        '''
+        Get where the feed left off as a json-friendly dictionary (see restore)
+        '''
+
+        last_time = self.last_time.item() if hasattr(self.last_time,'item') else self.last_time
+        return {'offset':self.offset,
+                'header':None if self.header is None else self.header.decode('utf-8'),
+                'time_col':self.time_col,
+                'last_time':last_time,
+                'rows':self.rows}
+
+
+    def restore(self,state):
+        '''
+        Pick up where a previous feed for the same flight left off
+
+        Parameters:
+        self (Flight_Feed): Required for object functions
+        state       (dict): The dictionary from state()
+
+        Returns:
+        None
+        '''
+
+        self.offset = state['offset']
+        self.header = None if state['header'] is None else state['header'].encode('utf-8')
+        self.time_col = state['time_col']
+        self.last_time = state['last_time']
+        self.rows = state['rows']
+        self.resynced = False
+
+
+    def poll(self,timeout=3):
+        '''
+        Download and parse any rows added to the flight csv since the last poll
+
+        Parameters:
+        self (Flight_Feed): Required for object functions
+        timeout    (float): Seconds to wait on the server
+
+        Returns:
+        DataFrame: The new rows; empty if nothing changed
+        '''
+
+        self.resynced = self.offset==0
+        headers = {}
+        if self.offset>0:
+            # The csv only ever grows, so ask for just the bytes we have not seen yet.
+            # Byte ranges of a gzipped response would not line up with the offset.
+            headers['Range'] = 'bytes={}-'.format(self.offset)
+            headers['Accept-Encoding'] = 'identity'
+        req = Http.get(self.url,'borealis',headers=headers,timeout=timeout)
+
+        if req.status_code==416:
+            # Range starts at the end of the file; nothing new
+            content = b''
+        else:
+            content = req.content
+        # What actually came over the wire, before anything already seen is cut off
+        transferred = len(content)
+        if req.status_code not in (206,416):
+            req.raise_for_status()
+            if self.offset>0 and (len(content)<self.offset or not content.startswith(self.header)):
+                # The csv was rewritten underneath us; start over from the top
+                self.reset()
+            content = content[self.offset:]
+
+        new = len(content)
+
+        if self.header is None:
+            if b'\n' not in content:
+                return self._record(transferred,new,pd.DataFrame())
+            self.header = content[:content.index(b'\n')+1]
+            self.offset += len(self.header)
+            content = content[len(self.header):]
+
+        # Only consume whole lines; a partial last line is fetched again next poll
+        end = content.rfind(b'\n')+1
+        if end==0:
+            return self._record(transferred,new,pd.DataFrame())
+        self.offset += end
+
+        data = pd.read_csv(io.BytesIO(self.header+content[:end]))
+
+        if self.time_col is None:
+            self.time_col = next((col for col in TIME_COLUMNS if col in data.columns),None)
+        if self.time_col is not None and len(data)>0:
+            if self.last_time is not None:
+                data = data[data[self.time_col]>self.last_time]
+            if len(data)>0:
+                self.last_time = data[self.time_col].iloc[-1]
+
+        self.rows += len(data)
+        return self._record(transferred,new,data.reset_index(drop=True))
+
+
+    def _record(self,transferred,new,data):
+        '''
+        Update the ingest statistics for a poll: bytes downloaded, bytes of them not seen before, and the rows parsed
+        '''
+
+        self.stats['polls'] += 1
+        self.stats['bytes'] += transferred
+        self.stats['new_bytes'] += new
+        self.stats['rows'] += len(data)
+        self.stats['last_bytes'] = transferred
+        self.stats['last_new_bytes'] = new
+        self.stats['last_rows'] = len(data)
+        return data
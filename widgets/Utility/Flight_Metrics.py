@@ -0,0 +1,195 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This computes values derived from flight telemetry (smoothed ascent rate, ground speed in m/s, pressure, distance from launch,
+altitude above ground, and burst) with numpy over whole batches of rows as they are added to a Flight_Store.
+"""
+
+import numpy as np
+
+# Barometric model of the atmosphere
+P_0 = 101325          # Sea level pressure (Pa)
+T_0 = 288.16          # Sea level temperature (K)
+G = 9.80665           # Gravitational acceleration (m/s^2)
+M = 0.02896968        # Molar mass of air (kg/mol)
+R_0 = 8.314462618     # Universal gas constant (J/(mol K))
+
+R_EARTH = 6371000.0   # Mean radius of the Earth (m)
+
+# Columns added to the store
+COLUMNS = ['ascent_rate','ground_speed_ms','pressure_fraction','distance','agl']
+
+
+def pressure_fraction(alt):
+    """
+    Fraction of sea level pressure at an altitude
+
+    Parameters:
+    alt (float,array): Altitude (m)
+
+    Returns:
+    float,array: p/p_0
+    """
+
+    return np.exp(-((G*np.asarray(alt,float)*M)/(T_0*R_0)))
+
+
+def distance(lat1,lon1,lat2,lon2):
+    """
+    Great circle distance between points
+
+    Parameters:
+    lat1 (float,array): Latitude of the first point(s)
+    lon1 (float,array): Longitude of the first point(s)
+    lat2 (float,array): Latitude of the second point(s)
+    lon2 (float,array): Longitude of the second point(s)
+
+    Returns:
+    float,array: The distance (m)
+    """
+
+    lat1,lon1,lat2,lon2 = [np.radians(np.asarray(v,float)) for v in (lat1,lon1,lat2,lon2)]
+    a = np.sin((lat2-lat1)/2)**2+np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 2*R_EARTH*np.arcsin(np.sqrt(a))
+
+
+class Flight_Metrics:
+    '''
+    Adds derived columns to a Flight_Store; append rows through this instead of the store
+    '''
+
+    def __init__(self,store,elevation=None,window=5,burst_drop=200.0,burst_rate=-2.0):
+        '''
+        The initialization function
+
+        Parameters:
+        self      (Flight_Metrics): Required for object functions
+        store       (Flight_Store): The store to add rows to
+        elevation (Elevation_Service): Ground elevation lookup for altitude above ground; skipped if None
+        window               (int): Number of rows the ascent rate is averaged over
+        burst_drop         (float): How far below its highest point the payload must fall to call it a burst (m)
+        burst_rate         (float): The ascent rate the payload must be falling faster than to call it a burst (m/s)
+
+        Returns:
+        None
+        '''
+
+        self.store = store
+        self.elevation = elevation
+        self.window = window
+        self.burst_drop = burst_drop
+        self.burst_rate = burst_rate
+        for name in COLUMNS:
+            self.store.add_column(name)
+        self.reset()
+
+
+    def reset(self):
+        '''
+        Forget the launch point, highest point, and burst
+        '''
+
+        self.launch = None   # (lat,lon) of the first row
+        self.peak = None     # (alt,lat,lon) of the highest row so far
+        self.burst = None    # (alt,lat,lon) of the highest row once a burst is detected
+
+
+    def clear(self):
+        '''
+        Drop all rows from the store and start over
+        '''
+
+        self.store.clear()
+        self.reset()
+
+
+    def append(self,rows):
+        '''
+        Compute the derived columns for new rows and append everything to the store
+
+        Parameters:
+        self (Flight_Metrics): Required for object functions
+        rows      (DataFrame): The new rows; anything indexable by column name works
+
+        Returns:
+        None
+        '''
+
+        cols = {name:np.asarray(rows[name],float) for name in ['latitude','longitude','altitude','vertical_velocity','ground_speed'] if name in rows}
+        if 'altitude' not in cols or len(cols['altitude'])==0:
+            self.store.append(rows)
+            return
+        n = len(cols['altitude'])
+        nan = np.full(n,np.nan)
+        lat,lon,alt = cols.get('latitude',nan),cols.get('longitude',nan),cols['altitude']
+        vv = cols.get('vertical_velocity',nan)
+
+        data = {name:rows[name] for name in self.store.columns if name in rows}
+
+        # Trailing moving average, carrying the last few rows already in the store
+        prev = self.store['vertical_velocity'][-(self.window-1):] if self.window>1 and len(self.store) else np.empty(0)
+        full = np.concatenate([prev,vv])
+        csum = np.concatenate([[0.0],np.cumsum(np.nan_to_num(full))])
+        cnt = np.concatenate([[0],np.cumsum(~np.isnan(full))])
+        end = np.arange(len(prev)+1,len(full)+1)
+        begin = np.maximum(end-self.window,0)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            data['ascent_rate'] = (csum[end]-csum[begin])/(cnt[end]-cnt[begin])
+
+        data['ground_speed_ms'] = cols.get('ground_speed',nan)/3.6
+        data['pressure_fraction'] = pressure_fraction(alt)
+
+        # Reports can come in with an empty latitude or longitude; leave their position based columns NaN
+        located = np.isfinite(lat)&np.isfinite(lon)
+        if self.launch is None and located.any():
+            i = int(np.argmax(located))
+            self.launch = (lat[i],lon[i])
+        data['distance'] = distance(self.launch[0],self.launch[1],lat,lon) if self.launch is not None else nan
+
+        ground = np.full(n,np.nan)
+        if self.elevation is not None and located.any():
+            # Only a handful of new rows are worth sending to USGS if the DEM does not cover them
+            ground[located] = self.elevation.elevations(lat[located],lon[located],remote=np.count_nonzero(located)<=3)
+        data['agl'] = alt-ground
+
+        self._detect_burst(lat,lon,alt,data['ascent_rate'])
+        self.store.append(data)
+
+
+    def _detect_burst(self,lat,lon,alt,rate):
+        '''
+        Track the highest point and call a burst once the payload is falling well below it
+        '''
+
+        if self.burst is not None:
+            return
+
+        peak_alt = -np.inf if self.peak is None else self.peak[0]
+        running = np.maximum.accumulate(np.concatenate([[peak_alt],np.nan_to_num(alt,nan=-np.inf)]))[1:]
+        falling = (alt<running-self.burst_drop)&(rate<self.burst_rate)
+
+        stop = np.argmax(falling) if falling.any() else len(alt)
+        if stop>0:
+            i = int(np.nanargmax(np.nan_to_num(alt[:stop],nan=-np.inf)))
+            if alt[i]>peak_alt:
+                self.peak = (alt[i],lat[i],lon[i])
+        if falling.any():
+            self.burst = self.peak
@@ -0,0 +1,200 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a columnar store for flight telemetry backed by numpy arrays, used by Tracker in place of a DataFrame.
+"""
+
+import numpy as np
+
+# Columns kept for every flight and their types
+COLUMNS = {'uid':np.int64,
+           'latitude':np.float64,
+           'longitude':np.float64,
+           'altitude':np.float64,
+           'vertical_velocity':np.float64,
+           'ground_speed':np.float64}
+
+
+class Flight_Store:
+    '''
+    Holds the most recent rows of a flight as one preallocated numpy array per column
+    '''
+
+    def __init__(self,columns=COLUMNS,capacity=1024,max_rows=2**16):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Flight_Store): Required for object functions
+        columns      (dict): Column names mapped to their numpy types
+        capacity      (int): The number of rows to allocate up front
+        max_rows      (int): The most rows kept; older rows are dropped past this
+
+        Returns:
+        None
+        '''
+
+        self.columns = dict(columns)
+        self.max_rows = max_rows
+        self.capacity = capacity
+        self.generation = 0
+        self.clear()
+
+
+    def clear(self):
+        '''
+        Drop all rows
+        '''
+
+        self.arrays = {name:np.empty(self.capacity,dtype) for name,dtype in self.columns.items()}
+        self.start = 0     # Array position of the oldest row kept
+        self.stop = 0      # Array position one past the newest row
+        self.count = 0     # Number of rows appended since the last clear
+        self.generation += 1   # Number of clears, so a refilled store never looks like one seen before
+
+
+    def version(self):
+        '''
+        Something that changes whenever the rows do; (generation,count)
+        '''
+
+        return (self.generation,self.count)
+
+
+    def __len__(self):
+        return self.stop-self.start
+
+
+    def __contains__(self,name):
+        return name in self.columns
+
+
+    def __getitem__(self,name):
+        '''
+        Get a column as a view of the rows kept
+
+        Views are never written to after they are handed out, so they stay valid
+        (but do not grow) when more rows are appended.
+        '''
+
+        return self.arrays[name][self.start:self.stop]
+
+
+    def latest(self,name,default=None):
+        '''
+        Get the newest value of a column
+
+        Parameters:
+        self (Flight_Store): Required for object functions
+        name          (str): The column name
+        default       (var): Returned if the store is empty
+
+        Returns:
+        var: The newest value
+        '''
+
+        if self.stop==self.start:
+            return default
+        return self.arrays[name][self.stop-1]
+
+
+    def add_column(self,name,dtype=np.float64,fill=np.nan):
+        '''
+        Add a column to the store; existing rows are set to fill
+        '''
+
+        if name in self.columns:
+            return
+        self.columns[name] = dtype
+        self.arrays[name] = np.full(self._size(),fill,dtype=dtype)
+
+
+    def append(self,data):
+        '''
+        Append rows to the end of the store
+
+        Parameters:
+        self (Flight_Store): Required for object functions
+        data    (DataFrame): The rows; anything indexable by column name works. Missing columns are filled with NaN (or 0 for integer columns)
+
+        Returns:
+        None
+        '''
+
+        keys = [name for name in self.columns if name in data]
+        if not keys:
+            return
+        n = len(data[keys[0]])
+        if n==0:
+            return
+
+        skip = max(0,n-self.max_rows)
+        self._reserve(n-skip)
+        for name,dtype in self.columns.items():
+            dest = self.arrays[name][self.stop:self.stop+n-skip]
+            if name in data:
+                dest[:] = np.asarray(data[name])[skip:]
+            else:
+                dest[:] = 0 if np.issubdtype(dtype,np.integer) else np.nan
+        self.stop += n-skip
+        self.start = max(self.start,self.stop-self.max_rows)
+        self.count += n
+
+
+    def _reserve(self,n):
+        '''
+        Make room for n more rows at the end of the arrays
+
+        Arrays grow by doubling up to twice max_rows. Past that, the newest rows are
+        copied to the front of fresh arrays, which happens at most once every max_rows
+        appends and keeps memory bounded without ever writing into handed out views.
+        '''
+
+        size = self._size()
+        if self.stop+n<=size:
+            return
+
+        keep = min(self.stop-self.start,self.max_rows-n)
+        while size<2*(keep+n) and size<2*self.max_rows:
+            size *= 2
+        size = max(min(size,2*self.max_rows),keep+n)
+
+        for name,dtype in self.columns.items():
+            array = np.empty(size,dtype)
+            array[:keep] = self.arrays[name][self.stop-keep:self.stop]
+            self.arrays[name] = array
+        self.start,self.stop = 0,keep
+
+
+    def _size(self):
+        '''
+        The number of rows the arrays currently have room for
+        '''
+
+        return len(next(iter(self.arrays.values())))
+
+
+    def to_dict(self):
+        '''
+        Copy the rows kept into a dictionary of lists
+        '''
+
+        return {name:self[name].tolist() for name in self.columns}
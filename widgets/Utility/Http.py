@@ -0,0 +1,194 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is the process-wide HTTP client. All widgets should make their web requests through get() so connections are reused and every endpoint has sensible timeouts, retries, and statistics.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from threading import Lock
+import random
+import time
+
+# Settings for each kind of remote data source
+#   timeout : seconds to wait on the server; (connect,read) tuples are allowed
+#   retries : the most times a failed request is retried
+#   backoff : seconds before the first retry; doubles with every retry after
+ENDPOINTS = {
+    'default':{'timeout':10,'retries':1,'backoff':0.5},
+    'borealis':{'timeout':3,'retries':2,'backoff':0.25},
+    'usgs':{'timeout':3,'retries':0,'backoff':0.0},
+    'osm':{'timeout':5,'retries':2,'backoff':0.25},
+    'hasp':{'timeout':10,'retries':2,'backoff':0.5},
+    'cadastral':{'timeout':(5,60),'retries':1,'backoff':1.0},
+}
+
+# Statuses worth trying again
+RETRY_STATUSES = {429,500,502,503,504}
+
+# Retry budget: every retry spends a token and every success earns part of one back.
+# Once an endpoint is below half its tokens it stops retrying, so a server that is down
+# is not hammered by every widget at once.
+BUDGET_TOKENS = 10.0
+BUDGET_REFILL = 0.1
+
+POOL_SIZE = 8
+
+_lock = Lock()
+_sessions = {}
+_budgets = {}
+_stats = {}
+
+
+def session(url):
+    """
+    Get the keep-alive session for the host of a url, creating it if needed
+
+    Parameters:
+    url (str): Any url on the host
+
+    Returns:
+    requests.Session: The session for that host
+    """
+
+    parts = urlsplit(url)
+    host = '{}://{}'.format(parts.scheme,parts.netloc)
+    with _lock:
+        if host not in _sessions:
+            sess = requests.Session()
+            sess.mount(host,HTTPAdapter(pool_connections=1,pool_maxsize=POOL_SIZE))
+            sess.headers.update({'Accept-Encoding':'gzip, deflate'})
+            _sessions[host] = sess
+        return _sessions[host]
+
+
+def get(url,endpoint='default',**kwargs):
+    """
+    Make a GET request through the shared sessions
+
+    Parameters:
+    url      (str): The url to request
+    endpoint (str): The name of the data source in ENDPOINTS; sets timeout, retries, and where statistics are kept
+    **kwargs      : Additional parameters passed on to requests (params, headers, stream, timeout, etc)
+
+    Returns:
+    requests.Response: The response
+    """
+
+    settings = ENDPOINTS.get(endpoint,ENDPOINTS['default'])
+    kwargs.setdefault('timeout',settings['timeout'])
+    sess = session(url)
+    stats = _get_stats(endpoint)
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            resp = sess.get(url,**kwargs)
+            error = resp.status_code in RETRY_STATUSES
+        except (requests.ConnectionError,requests.Timeout) as e:
+            resp,exc = None,e
+            error = True
+        latency = time.perf_counter()-start
+
+        # Size the body before taking the lock so downloads are not serialized behind each other
+        size = 0
+        if resp is not None and not kwargs.get('stream',False):
+            # Bytes actually read off the wire, which is less than len(content) when gzipped
+            size = resp.raw.tell() or len(resp.content)
+        elif resp is not None:
+            size = int(resp.headers.get('Content-Length',0))
+
+        with _lock:
+            stats['requests'] += 1
+            stats['latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'],latency)
+            stats['bytes'] += size
+            if error:
+                stats['errors'] += 1
+            else:
+                _budgets[endpoint] = min(BUDGET_TOKENS,_budgets[endpoint]+BUDGET_REFILL)
+
+            retry = error and attempt<settings['retries'] and _budgets[endpoint]>BUDGET_TOKENS/2
+            if retry:
+                _budgets[endpoint] -= 1
+                stats['retries'] += 1
+
+        if not retry:
+            break
+        # Exponential backoff with a little jitter so widgets do not retry in lockstep
+        time.sleep(settings['backoff']*2**attempt*random.uniform(0.5,1.5))
+        attempt += 1
+
+    if resp is None:
+        # Out of retries; let the caller deal with the connection problem
+        raise exc
+    return resp
+
+
+def _get_stats(endpoint):
+    """
+    Get the statistics record for an endpoint, creating it if needed
+    """
+
+    with _lock:
+        if endpoint not in _stats:
+            _stats[endpoint] = {'requests':0,
+                                'errors':0,
+                                'retries':0,
+                                'bytes':0,
+                                'latency':0.0,
+                                'max_latency':0.0}
+            _budgets[endpoint] = BUDGET_TOKENS
+        return _stats[endpoint]
+
+
+def stats():
+    """
+    Get a copy of the statistics for every endpoint used so far
+
+    Parameters:
+    None
+
+    Returns:
+    dict: Endpoint names mapped to request, error, retry, byte, and latency counts
+    """
+
+    with _lock:
+        return {key:dict(val) for key,val in _stats.items()}
+
+
+def summary(endpoint):
+    """
+    Get a one-line description of an endpoint's statistics for logging
+    """
+
+    s = stats().get(endpoint)
+    if s is None or s['requests']==0:
+        return '{}: no requests'.format(endpoint)
+    return '{}: {} requests, {} errors, {} retries, {:.1f} kB, {:.0f} ms avg, {:.0f} ms max'.format(endpoint,
+                                                                                                 s['requests'],
+                                                                                                 s['errors'],
+                                                                                                 s['retries'],
+                                                                                                 s['bytes']/1024,
+                                                                                                 1000*s['latency']/s['requests'],
+                                                                                                 1000*s['max_latency'])
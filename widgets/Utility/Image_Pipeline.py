@@ -0,0 +1,136 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This gets matplotlib figures onto Tk labels without encoding them as PNGs first.
+
+The figure is drawn with Agg and its RGBA buffer is cropped to its content directly. The figure is sized so the content
+comes out at the size shown, and frames are pasted into the label's existing PhotoImage.
+"""
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image,ImageTk
+import numpy as np
+
+
+class Image_Pipeline:
+    '''
+    Draws figures and shows them on a label
+    '''
+
+    def __init__(self,label):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Image_Pipeline): Required for object functions
+        label      (tk.Label): The label images are shown on
+
+        Returns:
+        None
+        '''
+
+        self.label = label
+        self.photo = None
+        self.bboxes = {}    # Buffer shape -> content bounding box (left,top,right,bottom)
+        self.frac = None    # Content bounding box as fractions of the figure, from the last frame
+
+
+    def bbox(self,rgba):
+        '''
+        Get the bounding box of the non-transparent pixels; only measured once per buffer size
+
+        Parameters:
+        self (Image_Pipeline): Required for object functions
+        rgba  (numpy.ndarray): The figure's RGBA buffer
+
+        Returns:
+        tuple: left, top, right, and bottom of the content (pixels)
+        '''
+
+        key = rgba.shape
+        if key not in self.bboxes:
+            alpha = rgba[:,:,3]
+            rows = np.flatnonzero(alpha.any(axis=1))
+            cols = np.flatnonzero(alpha.any(axis=0))
+            if len(rows)==0:
+                box = (0,0,rgba.shape[1],rgba.shape[0])
+            else:
+                box = (int(cols[0]),int(rows[0]),int(cols[-1])+1,int(rows[-1])+1)
+            self.bboxes[key] = box
+        return self.bboxes[key]
+
+
+    def render(self,fig,size):
+        '''
+        Draw a figure and crop it to its content at the given size
+
+        Parameters:
+        self (Image_Pipeline): Required for object functions
+        fig          (Figure): The figure
+        size          (tuple): Width and height of the image wanted (pixels)
+
+        Returns:
+        Image: The image
+        '''
+
+        w,h = int(size[0]),int(size[1])
+
+        # Size the figure so its content comes out at the size wanted, going by where the content was last frame
+        if self.frac is not None:
+            l,t,r,b = self.frac
+            dpi = fig.get_dpi()
+            inches = (w/(r-l)/dpi,h/(b-t)/dpi)
+            if np.abs(np.subtract(fig.get_size_inches(),inches)).max()>0.5/dpi:
+                fig.set_size_inches(*inches,forward=False)
+
+        canvas = fig.canvas if isinstance(fig.canvas,FigureCanvasAgg) else FigureCanvasAgg(fig)
+        canvas.draw()
+        rgba = np.asarray(canvas.buffer_rgba())
+
+        left,top,right,bottom = self.bbox(rgba)
+        H,W = rgba.shape[:2]
+        self.frac = (left/W,top/H,right/W,bottom/H)
+
+        image = Image.fromarray(rgba[top:bottom,left:right])
+        if image.size!=(w,h):
+            # Only until the figure size settles, or when the content does not keep its shape
+            image = image.resize((w,h))
+        return image
+
+
+    def show(self,image):
+        '''
+        Show an image on the label, reusing its PhotoImage when the size has not changed
+
+        Parameters:
+        self (Image_Pipeline): Required for object functions
+        image         (Image): The image
+
+        Returns:
+        None
+        '''
+
+        if self.photo is not None and (self.photo.width(),self.photo.height())==image.size:
+            self.photo.paste(image)
+            return
+        self.photo = ImageTk.PhotoImage(image)
+        self.label.configure(image=self.photo)
+        self.label.image = self.photo   # avoid garbage collection
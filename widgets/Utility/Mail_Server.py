@@ -0,0 +1,512 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a local stand-in for the mail side of commanding: a small SMTP and IMAP server that keeps mail in memory, and a
+fake Iridium gateway that answers each .sbd email sent to data@sbd.iridium.com with a confirmation after a delay.
+
+Only as much of SMTP and IMAP is spoken as smtplib and imaplib (and so Mail_Transport.Local_Transport) use. There is no
+authentication; the IMAP login picks whose mailbox to read.
+
+From the directory containing main.py:
+
+    python -m widgets.Utility.Mail_Server --delay 5
+    python -m widgets.Utility.Mail_Server --delay 2 --bench 40 --outstanding 4
+
+then start ICC with ICC_MAIL_TRANSPORT=local to send commands through it.
+"""
+
+from threading import Thread,Lock,Timer
+from functools import partial
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import widgets.Utility.Mail_Transport as Mail_Transport
+import widgets.Utility.Mailbox_Sync as Mailbox_Sync
+import widgets.Overview.Confirmations as Confirmations
+import socketserver
+import numpy as np
+import argparse
+import datetime
+import email
+import email.utils
+import shlex
+import os
+import time
+import re
+
+
+def address(text):
+    '''
+    The bare, lower case address from an SMTP argument or email header
+    '''
+
+    match = re.search(r'<([^>]*)>',text)
+    text = match.group(1) if match else email.utils.parseaddr(text)[1]
+    return text.strip().lower()
+
+
+class Mail_Store:
+    '''
+    Mailboxes kept in memory, one per address
+    '''
+
+    def __init__(self):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Mail_Store): Required for object functions
+
+        Returns:
+        None
+        '''
+
+        self.lock = Lock()
+        self.boxes = {}     # address -> [(uid,raw,received)] in order of uid
+        self.uidnext = {}   # address -> the uid the next email will get
+        self.validity = int(time.time())
+
+
+    def deliver(self,to,raw):
+        '''
+        Put an email in a mailbox
+
+        Parameters:
+        self (Mail_Store): Required for object functions
+        to          (str): The address
+        raw       (bytes): The email
+
+        Returns:
+        None
+        '''
+
+        to = address(to)
+        with self.lock:
+            uid = self.uidnext.get(to,1)
+            self.boxes.setdefault(to,[]).append((uid,raw,datetime.datetime.now()))
+            self.uidnext[to] = uid+1
+
+
+    def box(self,owner):
+        '''
+        The emails in a mailbox, and the uid the next email will get
+        '''
+
+        owner = address(owner)
+        with self.lock:
+            return list(self.boxes.get(owner,[])),self.uidnext.get(owner,1)
+
+
+class Iridium_Gateway:
+    '''
+    Delivers email, answering commands sent to Iridium with confirmations the way the Iridium gateway does
+    '''
+
+    def __init__(self,store,delay=5.0,verbose=False):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Iridium_Gateway): Required for object functions
+        store     (Mail_Store): Where email is delivered
+        delay          (float): Seconds from receiving a command to sending its confirmation
+        verbose         (bool): Whether or not to print each command and confirmation
+
+        Returns:
+        None
+        '''
+
+        self.store = store
+        self.delay = delay
+        self.verbose = verbose
+        self.lock = Lock()
+        self.mtmsn = {}     # imei -> the last MTMSN given out
+        self.queued = {}    # imei -> commands not yet confirmed
+        self.stats = {'delivered':0,'commands':0,'rejected':0,'confirmed':0}
+
+
+    def receive(self,sender,recipients,raw):
+        '''
+        Handle an email received over SMTP
+
+        Parameters:
+        self (Iridium_Gateway): Required for object functions
+        sender           (str): The envelope sender
+        recipients      (list): The envelope recipients
+        raw            (bytes): The email
+
+        Returns:
+        None
+        '''
+
+        for to in recipients:
+            if address(to)==Mail_Transport.IRIDIUM_ADDRESS:
+                self.command(sender,raw)
+            else:
+                self.store.deliver(to,raw)
+                self.stats['delivered'] += 1
+
+
+    def command(self,sender,raw):
+        '''
+        Queue a command; the subject is the IMEI and the .sbd attachment is the message for the modem
+        '''
+
+        message = email.message_from_bytes(raw)
+        imei = re.search(r'\b[0-9]{15}\b',message.get('subject',''))
+        sbd = next((part for part in message.walk() if (part.get_filename() or '').endswith('.sbd')),None)
+        if imei is None or sbd is None:
+            self.stats['rejected'] += 1
+            if self.verbose:
+                print('Rejected email from {}: no IMEI subject or .sbd attachment'.format(sender))
+            return
+
+        imei = imei.group(0)
+        with self.lock:
+            self.mtmsn[imei] = self.mtmsn.get(imei,0)+1
+            self.queued[imei] = self.queued.get(imei,0)+1
+            mtmsn = self.mtmsn[imei]
+        self.stats['commands'] += 1
+        size = len(sbd.get_payload(decode=True) or b'')
+        timer = Timer(self.delay,self.confirm,args=(sender,imei,sbd.get_filename(),size,mtmsn))
+        timer.daemon = True
+        timer.start()
+
+
+    def confirm(self,to,imei,filename,size,mtmsn):
+        '''
+        Send the confirmation of a queued command
+
+        The body has the session time on its 4th line, the file on its 6th, and the MTMSN and queue depth on its 9th,
+        where Confirmations.parse reads them.
+        '''
+
+        with self.lock:
+            self.queued[imei] -= 1
+            queue = self.queued[imei]
+        lines = ['SBD Mobile Terminated Message Queued',
+                 '',
+                 'IMEI: {}'.format(imei),
+                 'Time of Session (UTC): {}'.format(time.strftime('%a %b %d %H:%M:%S %Y',time.gmtime())),
+                 'Session Status: 00 - Transfer OK',
+                 'MT Filename: {}'.format(filename),
+                 'MT Message Size (bytes): {}'.format(size),
+                 '',
+                 'MTMSN: {}, Queue Depth: {}'.format(mtmsn,queue),
+                 '']
+        message = MIMEMultipart()
+        message['from'] = Mail_Transport.IRIDIUM_SENDER
+        message['to'] = to
+        message['subject'] = 'SBD Mobile Terminated Message Queued for Unit: {}'.format(imei)
+        message['date'] = email.utils.formatdate()
+        message['message-id'] = email.utils.make_msgid()
+        message.attach(MIMEText('\r\n'.join(lines)))
+        self.store.deliver(to,message.as_bytes())
+        self.stats['confirmed'] += 1
+        if self.verbose:
+            print('Confirmed {} to {} (MTMSN {}, queue {})'.format(filename,imei,mtmsn,queue))
+
+
+class Mail_Server(socketserver.ThreadingTCPServer):
+    '''
+    Serves SMTP or IMAP for an Iridium_Gateway and its Mail_Store
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self,handler,gateway,port):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Mail_Server): Required for object functions
+        handler    (class): SMTP_Handler or IMAP_Handler
+        gateway (Iridium_Gateway): Where email goes and comes from
+        port         (int): The port to listen on
+
+        Returns:
+        None
+        '''
+
+        socketserver.ThreadingTCPServer.__init__(self,('127.0.0.1',port),handler)
+        self.gateway = gateway
+        self.store = gateway.store
+
+
+class SMTP_Handler(socketserver.StreamRequestHandler):
+    '''
+    Receives email
+    '''
+
+    def reply(self,code,text):
+        self.wfile.write('{} {}\r\n'.format(code,text).encode())
+
+
+    def handle(self):
+        self.reply(220,'localhost ICC mail ready')
+        sender,recipients = None,[]
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode('utf-8','replace').strip()
+            verb = cmd.split(' ')[0].upper()
+            if verb in ['HELO','EHLO']:
+                self.reply(250,'localhost')
+            elif cmd.upper().startswith('MAIL FROM:'):
+                sender,recipients = address(cmd[10:]),[]
+                self.reply(250,'OK')
+            elif cmd.upper().startswith('RCPT TO:'):
+                recipients.append(address(cmd[8:]))
+                self.reply(250,'OK')
+            elif verb=='DATA':
+                if sender is None or not recipients:
+                    self.reply(503,'Need MAIL and RCPT first')
+                    continue
+                self.reply(354,'End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in [b'.\r\n',b'.\n']:
+                        break
+                    lines.append(line[1:] if line.startswith(b'.') else line)
+                self.server.gateway.receive(sender,recipients,b''.join(lines))
+                sender,recipients = None,[]
+                self.reply(250,'OK')
+            elif verb=='RSET':
+                sender,recipients = None,[]
+                self.reply(250,'OK')
+            elif verb=='NOOP':
+                self.reply(250,'OK')
+            elif verb=='QUIT':
+                self.reply(221,'Bye')
+                return
+            else:
+                self.reply(502,'Command not implemented')
+
+
+class IMAP_Handler(socketserver.StreamRequestHandler):
+    '''
+    Lets a client read its mailbox
+    '''
+
+    def send(self,text):
+        self.wfile.write(text.encode()+b'\r\n')
+
+
+    def handle(self):
+        self.user = None
+        self.send('* OK [CAPABILITY IMAP4rev1] ICC mail ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                words = shlex.split(line.decode('utf-8','replace').strip())
+            except ValueError:
+                words = []
+            if len(words)<2:
+                self.send('* BAD Malformed command')
+                continue
+            tag,cmd,args = words[0],words[1].upper(),words[2:]
+
+            if cmd=='CAPABILITY':
+                self.send('* CAPABILITY IMAP4rev1')
+            elif cmd=='LOGIN' and args:
+                self.user = args[0]
+            elif cmd=='LOGOUT':
+                self.send('* BYE')
+                self.send('{} OK LOGOUT completed'.format(tag))
+                return
+            elif cmd=='NOOP':
+                pass
+            elif self.user is None:
+                self.send('{} NO Log in first'.format(tag))
+                continue
+            elif cmd in ['SELECT','EXAMINE']:
+                box,uidnext = self.server.store.box(self.user)
+                self.send('* {} EXISTS'.format(len(box)))
+                self.send('* 0 RECENT')
+                self.send('* OK [UIDVALIDITY {}]'.format(self.server.store.validity))
+                self.send('* OK [UIDNEXT {}]'.format(uidnext))
+                self.send('{} OK [READ-WRITE] {} completed'.format(tag,cmd))
+                continue
+            elif cmd=='STATUS' and args:
+                box,uidnext = self.server.store.box(self.user)
+                self.send('* STATUS {} (MESSAGES {} UIDNEXT {} UIDVALIDITY {})'.format(args[0],len(box),uidnext,self.server.store.validity))
+            elif cmd=='UID' and args and args[0].upper()=='SEARCH':
+                box,uidnext = self.server.store.box(self.user)
+                uids = [str(uid) for uid,raw,received in self.search(box,args[1:])]
+                self.send(' '.join(['* SEARCH']+uids))
+            elif cmd=='UID' and len(args)>=2 and args[0].upper()=='FETCH':
+                box,uidnext = self.server.store.box(self.user)
+                for seq,(uid,raw,received) in enumerate(box,1):
+                    if self.in_set(uid,args[1],uidnext):
+                        self.wfile.write('* {} FETCH (UID {} RFC822 {{{}}}\r\n'.format(seq,uid,len(raw)).encode()+raw+b')\r\n')
+            else:
+                self.send('{} BAD Command not implemented'.format(tag))
+                continue
+            self.send('{} OK {} completed'.format(tag,cmd))
+
+
+    def in_set(self,uid,uids,uidnext):
+        '''
+        Whether or not a uid is in an IMAP set such as "4", "2:7", "5:*", or "1,3:4"
+        '''
+
+        for rng in uids.split(','):
+            first,_,last = rng.partition(':')
+            first = uidnext-1 if first=='*' else int(first)
+            last = first if not _ else (uidnext-1 if last=='*' else int(last))
+            if min(first,last)<=uid<=max(first,last):
+                return True
+        return False
+
+
+    def search(self,box,criteria):
+        '''
+        The emails matching UID, FROM, and SINCE search criteria
+        '''
+
+        uidnext = box[-1][0]+1 if box else 1
+        found = box
+        i = 0
+        while i<len(criteria):
+            key = criteria[i].upper()
+            if key=='ALL':
+                i += 1
+                continue
+            value = criteria[i+1] if i+1<len(criteria) else ''
+            if key=='UID':
+                found = [item for item in found if self.in_set(item[0],value,uidnext)]
+            elif key=='FROM':
+                found = [item for item in found if value.lower() in email.message_from_bytes(item[1]).get('from','').lower()]
+            elif key=='SINCE':
+                since = datetime.datetime.strptime(value,'%d-%b-%Y').date()
+                found = [item for item in found if item[2].date()>=since]
+            i += 2
+        return found
+
+
+def serve(delay=5.0,smtp_port=2525,imap_port=1143,verbose=False):
+    """
+    Start the SMTP and IMAP servers in the background
+
+    Parameters:
+    delay     (float): Seconds from receiving a command to sending its confirmation
+    smtp_port   (int): The SMTP port (0 for any free port)
+    imap_port   (int): The IMAP port (0 for any free port)
+    verbose    (bool): Whether or not to print each command and confirmation
+
+    Returns:
+    tuple: The SMTP and IMAP Mail_Servers
+    """
+
+    gateway = Iridium_Gateway(Mail_Store(),delay=delay,verbose=verbose)
+    servers = (Mail_Server(SMTP_Handler,gateway,smtp_port),Mail_Server(IMAP_Handler,gateway,imap_port))
+    for server in servers:
+        Thread(target=server.serve_forever,daemon=True).start()
+    return servers
+
+
+def bench(smtp,imap,commands,outstanding,attachment='attachments/010.sbd',timeout=120):
+    """
+    Send commands through the servers the way Overview does and report throughput and confirmation latency
+
+    Each outstanding command goes to its own IMEI, so confirmations can be told apart; all of them share one Mailbox_Sync.
+
+    Parameters:
+    smtp         (str): host:port of the SMTP server
+    imap         (str): host:port of the IMAP server
+    commands     (int): How many commands to send in all
+    outstanding  (int): How many commands may wait on confirmations at once
+    attachment   (str): The .sbd file to send
+    timeout    (float): The longest to wait for each confirmation (s)
+
+    Returns:
+    None
+    """
+
+    transport = Mail_Transport.Local_Transport(smtp,imap,Mail_Transport.MAIL_USER)
+    mailbox = Mailbox_Sync.Mailbox_Sync(transport,min_interval=0.2,max_interval=2.0)
+    confirmations = Confirmations.Confirmations()
+    sends,latencies,missed = [],[],[0]
+
+    cmd = os.path.basename(attachment).replace('.sbd','')
+
+    def match(imei,sent,msg):
+        return confirmations.claim(confirmations.add(msg),imei,sent,cmd)
+
+    def run(imei,n):
+        for i in range(n):
+            sent = datetime.datetime.utcnow().replace(microsecond=0)
+            start = time.perf_counter()
+            transport.send(Mail_Transport.IRIDIUM_ADDRESS,imei,'',attachments=[attachment])
+            sends.append(time.perf_counter()-start)
+            record = mailbox.wait(partial(match,imei,sent),timeout=timeout,check=partial(confirmations.match,imei,sent,cmd))
+            if record is None:
+                missed[0] += 1
+                continue
+            latencies.append(time.perf_counter()-start)
+
+    per = [commands//outstanding+(i<commands%outstanding) for i in range(outstanding)]
+    threads = [Thread(target=run,args=('3002340100{:05d}'.format(i+1),n)) for i,n in enumerate(per) if n]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter()-start
+
+    print('{} commands in {:.1f} s ({:.2f} commands/s), {} outstanding at a time'.format(commands,elapsed,commands/elapsed,len(threads)))
+    if sends:
+        print('Send latency {:.1f} ms avg, {:.1f} ms max'.format(1000*np.mean(sends),1000*np.max(sends)))
+    if latencies:
+        print('Confirmation latency {:.2f} s avg, {:.2f} s p95, {:.2f} s max'.format(np.mean(latencies),np.percentile(latencies,95),np.max(latencies)))
+    print('{} unconfirmed'.format(missed[0]))
+    print('Mailbox {}'.format(mailbox.summary()))
+    print('Confirmations {}'.format(confirmations.summary()))
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Serve SMTP and IMAP locally with a fake Iridium gateway.')
+    parser.add_argument('--delay',type=float,default=5.0,help='seconds before each command is confirmed')
+    parser.add_argument('--smtp-port',type=int,default=2525)
+    parser.add_argument('--imap-port',type=int,default=1143)
+    parser.add_argument('--verbose',action='store_true',help='print every command and confirmation')
+    parser.add_argument('--bench',type=int,metavar='COMMANDS',help='send COMMANDS commands and report throughput and latency')
+    parser.add_argument('--outstanding',type=int,default=1,help='commands waiting on confirmation at once during --bench')
+    args = parser.parse_args()
+
+    smtp_server,imap_server = serve(args.delay,args.smtp_port,args.imap_port,args.verbose)
+    smtp = '127.0.0.1:{}'.format(smtp_server.server_address[1])
+    imap = '127.0.0.1:{}'.format(imap_server.server_address[1])
+    print('SMTP on {}, IMAP on {}; confirming commands after {:g} s'.format(smtp,imap,args.delay))
+
+    if args.bench:
+        bench(smtp,imap,args.bench,max(args.outstanding,1))
+    else:
+        print('Start ICC with ICC_MAIL_TRANSPORT=local ICC_SMTP={} ICC_IMAP={}'.format(smtp,imap))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,425 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+These are the ways ICC can send commands and read confirmations: through the Gmail API (Emailer), or through plain SMTP
+and IMAP, such as the local stand-in in Mail_Server.
+
+Both hand back emails in the shape the Gmail API uses ({'id','payload':{'headers','parts'}}), so Mailbox_Sync and
+Confirmations work the same with either. Set the environment variable ICC_MAIL_TRANSPORT=local to use SMTP and IMAP;
+ICC_SMTP and ICC_IMAP give their host:port, and ICC_MAIL_USER and ICC_MAIL_PASSWORD the login.
+"""
+
+import os
+import re
+import email
+import email.utils
+import imaplib
+import smtplib
+import threading
+from base64 import urlsafe_b64encode
+
+# for dealing with attachement MIME types
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.image import MIMEImage
+from email.mime.audio import MIMEAudio
+from email.mime.base import MIMEBase
+from mimetypes import guess_type as guess_mime_type
+
+# Commands go to this address, and their confirmations come from the other
+IRIDIUM_ADDRESS = 'data@sbd.iridium.com'
+IRIDIUM_SENDER = 'sbdservice@sbd.iridium.com'
+
+MAIL_TRANSPORT = os.environ.get('ICC_MAIL_TRANSPORT','gmail')
+SMTP_ADDRESS = os.environ.get('ICC_SMTP','127.0.0.1:2525')
+IMAP_ADDRESS = os.environ.get('ICC_IMAP','127.0.0.1:1143')
+MAIL_USER = os.environ.get('ICC_MAIL_USER','iridium.msgc@gmail.com')
+MAIL_PASSWORD = os.environ.get('ICC_MAIL_PASSWORD','')
+
+_lock = threading.Lock()
+_transport = None
+
+
+def transport():
+    """
+    Get the process's mail transport, chosen by ICC_MAIL_TRANSPORT
+
+    Parameters:
+    None
+
+    Returns:
+    Gmail_Transport/Local_Transport: The transport
+    """
+
+    global _transport
+    with _lock:
+        if _transport is None:
+            if MAIL_TRANSPORT=='local':
+                _transport = Local_Transport(SMTP_ADDRESS,IMAP_ADDRESS,MAIL_USER,MAIL_PASSWORD)
+            else:
+                _transport = Gmail_Transport()
+        return _transport
+
+
+# Adds the attachment with the given filename to the given message
+def add_attachment(message,filename):
+    """
+    Add an attachment to the email
+
+    Parameters:
+    message  (???): The email object to be sent
+    filename (str): The filename of the attachement to be attached
+
+    Returns:
+    None
+    """
+
+    content_type, encoding = guess_mime_type(filename)
+    if content_type is None or encoding is not None:
+        content_type = 'application/octet-stream'
+    main_type,sub_type = content_type.split('/',1)
+    if main_type=='text':
+        fp = open(filename,'rb')
+        msg = MIMEText(fp.read().decode(),_subtype=sub_type)
+        fp.close()
+    elif main_type=='image':
+        fp = open(filename,'rb')
+        msg = MIMEImage(fp.read(),_subtype=sub_type)
+        fp.close()
+    elif main_type=='audio':
+        fp = open(filename,'rb')
+        msg = MIMEAudio(fp.read(),_subtype=sub_type)
+        fp.close()
+    else:
+        fp = open(filename,'rb')
+        msg = MIMEBase(main_type,sub_type)
+        msg.set_payload(fp.read())
+        fp.close()
+    filename = os.path.basename(filename)
+    msg.add_header('Content-Disposition','attachment',filename=filename)
+    message.attach(msg)
+
+
+def mime_message(destination,obj,body,attachments=[]):
+    """
+    Construct the email
+
+    Parameters:
+    desitination (str): Who the email is to
+    obj          (str): Subject of the email
+    body         (str): The body of the email
+    attachments (list): The attachments to send
+
+    Returns:
+    Message: Prepared email
+    """
+
+    if not attachments: # no attachments given
+        message = MIMEText(body)
+        message['to'] = destination
+        message['subject'] = obj
+    else:
+        message = MIMEMultipart()
+        message['to'] = destination
+        message['subject'] = obj
+        message.attach(MIMEText(body))
+        for filename in attachments:
+            add_attachment(message, filename)
+    return message
+
+
+def gmail_shape(msg_id,raw):
+    """
+    Put a raw email in the shape the Gmail API gives it
+
+    Parameters:
+    msg_id   (str): The id of the email
+    raw    (bytes): The email as received
+
+    Returns:
+    dict: The id, and the payload's headers and the data of each of its parts (base64url, with CRLF line endings)
+    """
+
+    message = email.message_from_bytes(raw)
+    parts = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        data = part.get_payload(decode=True) or b''
+        if part.get_content_maintype()=='text':
+            data = data.replace(b'\r\n',b'\n').replace(b'\n',b'\r\n')
+        parts.append({'mimeType':part.get_content_type(),'body':{'data':urlsafe_b64encode(data).decode()}})
+    if not message.is_multipart():
+        # Gmail puts a single part email's body in the payload itself
+        payload = {'headers':[],'body':parts[0]['body'] if parts else {}}
+    else:
+        payload = {'headers':[],'parts':parts}
+    payload['headers'] = [{'name':name,'value':str(value)} for name,value in message.items()]
+    return {'id':msg_id,'payload':payload}
+
+
+class Gmail_Transport:
+    '''
+    Sends and reads email with the Gmail API
+    '''
+
+    def __init__(self):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Gmail_Transport): Required for object functions
+
+        Returns:
+        None
+        '''
+
+        # Imported here so the local transport works without the Google libraries
+        import widgets.Utility.Emailer as Emailer
+        self.Emailer = Emailer
+
+
+    def start(self,log=None):
+        '''
+        Sign in ahead of the first command and keep the sign in fresh
+        '''
+
+        self.Emailer.prewarm(log=log)
+
+
+    def send(self,destination,obj,body,attachments=[]):
+        '''
+        Send an email
+
+        Parameters:
+        self (Gmail_Transport): Required for object functions
+        destination      (str): Who the email is to
+        obj              (str): The subject line of the email
+        body             (str): The body of the email
+        attachments     (list): The attachments to send
+
+        Returns:
+        dict: The sent email's id and labelIds
+        '''
+
+        return self.Emailer.send_message(self.Emailer.gmail_service(),destination,obj,body,attachments=attachments)
+
+
+    def checkpoint(self):
+        '''
+        Where the mailbox is up to, to read new emails from later
+        '''
+
+        return self.Emailer.history_id(self.Emailer.gmail_service())
+
+
+    def new_messages(self,cursor):
+        '''
+        Read the emails that arrived since a checkpoint
+
+        Parameters:
+        self (Gmail_Transport): Required for object functions
+        cursor           (str): From checkpoint or a previous new_messages
+
+        Returns:
+        tuple: The new emails, oldest first, and the cursor for next time; None if the cursor is too old to use
+        '''
+
+        service = self.Emailer.gmail_service()
+        new = self.Emailer.new_message_ids(service,cursor)
+        if new is None:
+            return None
+        ids,cursor = new
+        return self.Emailer.get_messages(service,ids),cursor
+
+
+    def recent(self,sender=IRIDIUM_SENDER,since=None,num_read=5):
+        '''
+        Read the newest emails from a sender
+
+        Parameters:
+        self (Gmail_Transport): Required for object functions
+        sender           (str): Only emails from this address; None for any
+        since       (datetime): Only emails received after this; None for any
+        num_read         (int): The most emails to read
+
+        Returns:
+        list: The emails, newest first
+        '''
+
+        return self.Emailer.read_messages(self.Emailer.gmail_service(),num_read=num_read,sender=sender,since=since)
+
+
+class Local_Transport:
+    '''
+    Sends email with SMTP and reads it with IMAP
+    '''
+
+    def __init__(self,smtp,imap,user,password=''):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Local_Transport): Required for object functions
+        smtp             (str): host:port of the SMTP server
+        imap             (str): host:port of the IMAP server
+        user             (str): The address to send from, and the IMAP login
+        password         (str): The password for both; empty to skip SMTP login
+
+        Returns:
+        None
+        '''
+
+        self.smtp = smtp.rsplit(':',1)
+        self.imap = imap.rsplit(':',1)
+        self.user = user
+        self.password = password
+        self.local = threading.local()   # Each thread keeps its own IMAP connection
+
+
+    def start(self,log=None):
+        '''
+        Nothing to warm up; connections are made when first used
+        '''
+
+        pass
+
+
+    def send(self,destination,obj,body,attachments=[]):
+        '''
+        Send an email
+
+        Parameters:
+        self (Local_Transport): Required for object functions
+        destination      (str): Who the email is to
+        obj              (str): The subject line of the email
+        body             (str): The body of the email
+        attachments     (list): The attachments to send
+
+        Returns:
+        dict: The sent email's id and labelIds, as Gmail would give them
+        '''
+
+        message = mime_message(destination,obj,body,attachments)
+        message['from'] = self.user
+        message['date'] = email.utils.formatdate()
+        message['message-id'] = email.utils.make_msgid()
+        with smtplib.SMTP(self.smtp[0],int(self.smtp[1]),timeout=30) as smtp:
+            if self.password:
+                smtp.login(self.user,self.password)
+            smtp.send_message(message)
+        return {'id':message['message-id'],'labelIds':['SENT']}
+
+
+    def _imap(self):
+        '''
+        The calling thread's IMAP connection, with the inbox selected
+        '''
+
+        conn = getattr(self.local,'conn',None)
+        if conn is not None:
+            try:
+                conn.noop()
+                return conn
+            except (imaplib.IMAP4.error,OSError):
+                self.local.conn = None
+        conn = imaplib.IMAP4(self.imap[0],int(self.imap[1]))
+        conn.login(self.user,self.password)
+        conn.select('INBOX')
+        self.local.conn = conn
+        return conn
+
+
+    def _fetch(self,conn,uids):
+        '''
+        Fetch emails by UID, in the order given
+        '''
+
+        msgs = []
+        for uid in uids:
+            typ,data = conn.uid('FETCH',str(uid),'(RFC822)')
+            raw = next((item[1] for item in data if isinstance(item,tuple)),None)
+            if typ=='OK' and raw is not None:
+                msgs.append(gmail_shape(str(uid),raw))
+        return msgs
+
+
+    def checkpoint(self):
+        '''
+        Where the mailbox is up to, to read new emails from later
+        '''
+
+        conn = self._imap()
+        typ,data = conn.status('INBOX','(UIDNEXT UIDVALIDITY)')
+        status = data[0].decode()
+        uidnext = int(re.search(r'UIDNEXT (\d+)',status).group(1))
+        validity = int(re.search(r'UIDVALIDITY (\d+)',status).group(1))
+        return (validity,uidnext)
+
+
+    def new_messages(self,cursor):
+        '''
+        Read the emails that arrived since a checkpoint
+
+        Parameters:
+        self (Local_Transport): Required for object functions
+        cursor         (tuple): From checkpoint or a previous new_messages
+
+        Returns:
+        tuple: The new emails, oldest first, and the cursor for next time; None if the mailbox was rebuilt
+        '''
+
+        validity,uidnext = cursor
+        latest = self.checkpoint()
+        if latest[0]!=validity:
+            return None
+        if latest[1]<=uidnext:
+            return [],cursor
+        conn = self._imap()
+        typ,data = conn.uid('SEARCH','UID','{}:*'.format(uidnext))
+        # n:* always includes the newest email, even if it is older than n
+        uids = sorted(uid for uid in map(int,data[0].split()) if uid>=uidnext)
+        return self._fetch(conn,uids),latest
+
+
+    def recent(self,sender=IRIDIUM_SENDER,since=None,num_read=5):
+        '''
+        Read the newest emails from a sender
+
+        Parameters:
+        self (Local_Transport): Required for object functions
+        sender           (str): Only emails from this address; None for any
+        since       (datetime): Only emails received on or after this day; None for any
+        num_read         (int): The most emails to read
+
+        Returns:
+        list: The emails, newest first
+        '''
+
+        criteria = []
+        if sender:
+            criteria += ['FROM','"{}"'.format(sender)]
+        if since is not None:
+            criteria += ['SINCE',since.strftime('%d-%b-%Y')]
+        conn = self._imap()
+        typ,data = conn.uid('SEARCH',*(criteria or ['ALL']))
+        uids = sorted(map(int,data[0].split()))[-num_read:][::-1]
+        return self._fetch(conn,uids)
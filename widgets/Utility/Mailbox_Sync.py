@@ -0,0 +1,238 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This watches the mailbox for new emails while anything is waiting on one, fetching only what arrived since the last look.
+It works through a Mail_Transport, so the same loop reads Gmail or a local IMAP server.
+
+Everything waiting shares one polling thread. Polls start quick and back off while nothing arrives, and each wait gives up
+after its own timeout.
+"""
+
+import widgets.Utility.Mail_Transport as Mail_Transport
+from threading import Thread,Lock,Event
+import datetime
+import time
+import traceback
+
+
+class Mailbox_Sync:
+    '''
+    Polls the mailbox incrementally on behalf of everything waiting on an email
+    '''
+
+    def __init__(self,transport=None,log=None,sender=Mail_Transport.IRIDIUM_SENDER,min_interval=2.0,max_interval=30.0,backoff=1.5,lookback=600):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Mailbox_Sync): Required for object functions
+        transport     (???): Where the mail is read from; None for Mail_Transport.transport()
+        log      (function): Called with (message,level) when polling fails
+        sender        (str): Only emails from this address are passed on; None for any
+        min_interval (float): Time between polls after something arrives (s)
+        max_interval (float): The longest time between polls (s)
+        backoff     (float): How much longer to wait after each poll that finds nothing
+        lookback      (int): How far back to read when starting (s), for emails that came in just before a wait
+
+        Returns:
+        None
+        '''
+
+        self.transport = transport if transport is not None else Mail_Transport.transport()
+        self.log = log
+        self.sender = sender
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.lookback = lookback
+
+        self.lock = Lock()
+        self.deliver = Lock()    # Held while an email is handed to the waiters, and while a wait checks what came before it
+        self.waiters = []        # [match,deadline,Event,result] for each wait
+        self.thread = None
+        self.wake = Event()      # Set to poll right away
+        self.cursor = None       # Where the mailbox was up to at the last poll
+        self.read = set()        # Ids of the emails read when starting
+        self.failing = False
+        self.stats = {'polls':0,'messages':0,'resyncs':0,'matched':0,'timeouts':0}
+
+
+    def wait(self,match,timeout=900,check=None):
+        '''
+        Wait for an email
+
+        Parameters:
+        self (Mailbox_Sync): Required for object functions
+        match    (function): Called with each new email; returns what the wait should return, or None to keep waiting
+        timeout     (float): The longest to wait (s)
+        check    (function): Called once with no arguments before waiting, for what was already read (e.g. for another
+                             wait); returns what the wait should return, or None to wait. No email is handed out between
+                             the check and the start of the wait, so none can be missed in between.
+
+        Returns:
+        ???: Whatever check or match returned; None if no email was accepted before the timeout
+        '''
+
+        waiter = [match,time.monotonic()+timeout,Event(),None]
+        with self.deliver:
+            if check is not None:
+                result = check()
+                if result is not None:
+                    return result
+            with self.lock:
+                self.waiters.append(waiter)
+                if self.thread is None:
+                    self.thread = Thread(target=self._run,name='mailbox-sync',daemon=True)
+                    self.thread.start()
+                else:
+                    self.wake.set()
+        waiter[2].wait()
+        return waiter[3]
+
+
+    def sync(self):
+        '''
+        Fetch the emails that arrived since the last poll
+
+        Parameters:
+        self (Mailbox_Sync): Required for object functions
+
+        Returns:
+        list: The new emails, oldest first
+        '''
+
+        self.stats['polls'] += 1
+        if self.cursor is not None:
+            new = self.transport.new_messages(self.cursor)
+            if new is not None:
+                msgs,self.cursor = new
+                msgs = [msg for msg in msgs if msg['id'] not in self.read and self.wanted(msg)]
+                self.read = set()
+                self.stats['messages'] += len(msgs)
+                return msgs
+            # Too far behind for the mailbox's history; start over
+            self.stats['resyncs'] += 1
+
+        # Note where the mailbox is before reading, so nothing arriving in between is missed
+        self.cursor = self.transport.checkpoint()
+        since = datetime.datetime.now()-datetime.timedelta(seconds=self.lookback)
+        msgs = self.transport.recent(sender=self.sender,since=since)[::-1]
+        # These may show up again among the first new messages
+        self.read = set(msg['id'] for msg in msgs)
+        self.stats['messages'] += len(msgs)
+        return msgs
+
+
+    def wanted(self,msg):
+        '''
+        Whether or not an email is from the sender being watched for
+        '''
+
+        if self.sender is None:
+            return True
+        headers = msg.get('payload',{}).get('headers',[])
+        return any(header['name'].lower()=='from' and self.sender in header['value'] for header in headers)
+
+
+    def _run(self):
+        '''
+        The polling thread; runs while anything is waiting
+        '''
+
+        interval = self.min_interval
+        while True:
+            with self.lock:
+                self._expire()
+                if not self.waiters:
+                    self.thread = None
+                    self.cursor = None   # Nothing watches in between, so start fresh next time
+                    return
+                deadline = min(waiter[1] for waiter in self.waiters)
+
+            try:
+                msgs = self.sync()
+                self.failing = False
+            except:
+                if not self.failing and self.log is not None:
+                    self.log('Unable to check for emails','ERROR')
+                elif self.log is None:
+                    traceback.print_exc()
+                self.failing = True
+                msgs = []
+                interval = self.max_interval
+
+            for msg in msgs:
+                with self.deliver:
+                    # Waits may have started since the poll; they get this email too
+                    with self.lock:
+                        waiters = list(self.waiters)
+                    for waiter in waiters:
+                        if waiter[2].is_set():
+                            continue
+                        try:
+                            result = waiter[0](msg)
+                        except:
+                            traceback.print_exc()
+                            result = None
+                        if result is not None:
+                            self._finish(waiter,result)
+                            self.stats['matched'] += 1
+
+            if msgs:
+                interval = self.min_interval
+            elif not self.failing:
+                interval = min(interval*self.backoff,self.max_interval)
+            # Don't sleep past the next timeout
+            self.wake.wait(min(interval,max(deadline-time.monotonic(),0)))
+            self.wake.clear()
+
+
+    def _expire(self):
+        '''
+        End the waits that have timed out; call with the lock held
+        '''
+
+        now = time.monotonic()
+        for waiter in list(self.waiters):
+            if waiter[1]<=now:
+                self.waiters.remove(waiter)
+                waiter[2].set()
+                self.stats['timeouts'] += 1
+
+
+    def _finish(self,waiter,result):
+        '''
+        End a wait with what it was waiting for
+        '''
+
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            waiter[3] = result
+            waiter[2].set()
+
+
+    def summary(self):
+        '''
+        One line summary of the sync statistics for the log
+        '''
+
+        return 'polls={polls} messages={messages} resyncs={resyncs} matched={matched} timeouts={timeouts}'.format(**self.stats)
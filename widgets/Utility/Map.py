@@ -26,16 +26,22 @@ try:
     import tkinter as tk
 except ImportError:
     import Tkinter as tk
-import matplotlib.pyplot as plt
 import numpy as np
-import cartopy.crs as ccrs
-import cartopy.io.img_tiles as cimgt
-import io
-from urllib.request import urlopen, Request
-from PIL import Image,ImageTk
+import os
+import widgets.Utility.Render_Service as Render_Service
+import widgets.Utility.Tile_Cache as Tile_Cache
+import widgets.Utility.Tile_Mosaic as Tile_Mosaic
+import widgets.Utility.Image_Pipeline as Image_Pipeline
+import widgets.Utility.Render_Cache as Render_Cache
+from PIL import Image
 import widgets.Utility.Widget as Widget
 
 
+# 'mosaic' pastes tiles together with PIL; 'cartopy' draws the map with matplotlib and cartopy, and 'retained'
+# does the same but keeps one figure alive and updates it in place
+MAP_RENDERER = os.environ.get('ICC_MAP_RENDERER','mosaic')
+
+
 class Map(Widget.Widget):
     '''
     Creates a map and displays it
@@ -77,26 +83,45 @@ class Map(Widget.Widget):
         self.canvas = tk.Canvas(self,borderwidth=0,highlightthickness=0,bg='black')
         self.add_comp(self.canvas,0,0,w,h)
         
-        # Necessary to be able to retrieve political map data (streets, buildings, names, etc., etc.)
-        def image_spoof(self, tile):
-            '''
-            Spoof a user-agent to get tiles with political map data
-            '''
+        # Tiles come from memory or disk when they can, so panning and zooming work offline
+        self.tiles = Tile_Cache.Tile_Cache()
+        tiles = self.tiles
+        self.renderer = MAP_RENDERER
+        self.mosaic = Tile_Mosaic.Tile_Mosaic(self.tiles)
+        
+        if self.renderer!='mosaic':
+            # Only the matplotlib renderers need cartopy, which is slow to import
+            import cartopy.crs as ccrs
+            import cartopy.io.img_tiles as cimgt
+            self.ccrs = ccrs
             
-            url = self._image_url(tile)
-            req = Request(url)
-            req.add_header('User-agent','Anaconda 3')
-            fh = urlopen(req) 
-            im_data = io.BytesIO(fh.read())
-            fh.close()
-            img = Image.open(im_data)
-            img = img.convert(self.desired_tile_form)
-            return img, self.tileextent(tile), 'lower'
-        cimgt.OSM.get_image = image_spoof
-        self.osm_img = cimgt.OSM()
+            # Necessary to be able to retrieve political map data (streets, buildings, names, etc., etc.)
+            def image_spoof(self, tile):
+                '''
+                Spoof a user-agent to get tiles with political map data
+                '''
+                
+                x,y,z = tile
+                img = tiles.get(z,x,y)
+                if img is None:
+                    # Blank rather than failing the whole map when a tile is out of reach
+                    img = Image.new(tiles.mode,(Tile_Cache.TILE_SIZE,Tile_Cache.TILE_SIZE),(40,40,40))
+                if img.mode!=self.desired_tile_form:
+                    img = img.convert(self.desired_tile_form)
+                return img, self.tileextent(tile), 'lower'
+            cimgt.OSM.get_image = image_spoof
+            self.osm_img = cimgt.OSM()
 
         self.label = tk.Label(self,bg='black',anchor='nw')
         self.label.pack(fill=tk.BOTH)
+        self.pipeline = Image_Pipeline.Image_Pipeline(self.label)
+        
+        # Finished frames by view and data version, so revisiting a view does not render it again
+        self.render_cache = Render_Cache.Render_Cache()
+        self.render_key = None
+        self.version = None
+        self.cached = None
+        self.missing = 0  # Tiles missing before the frame being drawn, to tell whether it has gray gaps
         
         try:
             self.gen_plt([self.DEFAULT_center_pt[1]],[self.DEFAULT_center_pt[0]])
@@ -105,7 +130,7 @@ class Map(Widget.Widget):
             self.master.master.log('Unable to generate plots.','ERROR')
         
         
-    def gen_plt(self,x,y,decorator='ro-',zoom=0.001,center_pt=None,multidata=False,**kwargs):
+    def gen_plt(self,x,y,decorator='ro-',zoom=0.001,center_pt=None,multidata=False,version=None,**kwargs):
         '''
         Generate the map using the data provided
         
@@ -117,6 +142,7 @@ class Map(Widget.Widget):
         zoom      (float): How far to zoom in
         center_pt (tuple): The center point of the map
         multidata  (bool): Whether or not there are multiple lists of data in x and y
+        version (hashable): Changes whenever the data does; frames are only cached when given
         **kwargs         : Additional parameters to be passed on to the plotting functions
         
         Returns:
@@ -131,10 +157,27 @@ class Map(Widget.Widget):
         self.center_pt = center_pt
         self.zoom = zoom
         
-        if self.fig is not None:
-            self.fig.delaxes(self.ax)
+        self.version = version
+        self.render_key = None if version is None else self.view_key(center_pt,zoom,(self.img_w,self.img_h),version)
+        self.cached = None if self.render_key is None else self.render_cache.get(self.render_key)
+        if self.cached is not None:
+            self.image = self.cached
+            return
+        self.missing = self.tiles.stats['missing']
         
-        self.fig = plt.figure('MAP',frameon=False)
+        if self.renderer in ('mosaic','retained'):
+            if not multidata:
+                x,y,decorator = [x],[y],[decorator]
+            elif type(decorator)==type(''):
+                decorator = [decorator]*len(x)
+            layers = list(zip(x,y,decorator))
+            if self.renderer=='mosaic':
+                self.image = self.mosaic.render(layers,center_pt,zoom,(self.img_w,self.img_h))
+            else:
+                self._update_plt(layers,center_pt,zoom)
+            return
+        
+        self.fig = Render_Service.figure(frameon=False)
         self.ax = self.fig.add_subplot(111,label="MAP",projection=self.osm_img.crs)
         self.ax.set_axis_off()
         self.fig.patch.set_facecolor('black')
@@ -147,13 +190,57 @@ class Map(Widget.Widget):
         self.ax.add_image(self.osm_img, int(scale))
 
         if not multidata:
-            self.ax.plot(x,y,decorator,transform=ccrs.Geodetic())
+            self.ax.plot(x,y,decorator,transform=self.ccrs.Geodetic())
         else:
             for i,(xs,ys) in enumerate(zip(x,y)):
                 if type(decorator)==type(''):
-                    self.ax.plot(xs,ys,decorator,transform=ccrs.Geodetic())
+                    self.ax.plot(xs,ys,decorator,transform=self.ccrs.Geodetic())
                 else:
-                    self.ax.plot(xs,ys,decorator[i],transform=ccrs.Geodetic())
+                    self.ax.plot(xs,ys,decorator[i],transform=self.ccrs.Geodetic())
+        
+        
+    def _update_plt(self,layers,center_pt,zoom):
+        '''
+        Update the one map figure kept alive in retained mode
+
+        The figure, axes, and track lines are made once and changed in place after that; the tile image is
+        only replaced when the tile zoom level changes, and fetches whatever the new extent needs when drawn.
+        '''
+        
+        if self.fig is None:
+            self.fig = Render_Service.figure(frameon=False)
+            self.ax = self.fig.add_subplot(111,label="MAP",projection=self.osm_img.crs)
+            self.ax.set_axis_off()
+            self.fig.patch.set_facecolor('black')
+            self.tile_layer = None
+            self.tile_scale = None
+            self.lines = []
+        
+        extent = [center_pt[1]-(zoom*2.0),center_pt[1]+(zoom*2.0),center_pt[0]-zoom,center_pt[0]+zoom]
+        self.ax.set_extent(extent)
+        
+        scale = np.ceil(-np.sqrt(2)*np.log(np.divide(zoom,350.0)))
+        scale = int((scale<20) and scale or 19)
+        if scale!=self.tile_scale:
+            if self.tile_layer is not None:
+                self.tile_layer.remove()
+            self.tile_layer = self.ax.add_image(self.osm_img,scale)
+            self.tile_scale = scale
+        
+        for i,(xs,ys,decorator) in enumerate(layers):
+            if i<len(self.lines) and self.lines[i][1]==decorator:
+                self.lines[i][0].set_data(xs,ys)
+                continue
+            line, = self.ax.plot(xs,ys,decorator,transform=self.ccrs.Geodetic())
+            if i<len(self.lines):
+                # A different style; replace the line rather than restyling it
+                self.lines[i][0].remove()
+                self.lines[i] = (line,decorator)
+            else:
+                self.lines.append((line,decorator))
+        for line,_ in self.lines[len(layers):]:
+            line.remove()
+        del self.lines[len(layers):]
         
         
     def gen_img(self):
@@ -161,20 +248,16 @@ class Map(Widget.Widget):
         Convert the plot to image and update image frame
         '''
     
-        buff = io.BytesIO()
-        self.fig.savefig(buff,format='png')
-        plt.close(self.fig)
-        
-        self.image = Image.open(buff)
-        self.image = self.autocrop_image(self.image)
-        self.image = self.image.resize((self.img_w,self.img_h))
+        # The mosaic renderer already made an image of the right size, and cached frames are done
+        if self.cached is None:
+            if self.renderer!='mosaic':
+                self.image = self.pipeline.render(self.fig,(self.img_w,self.img_h))
+            # Frames with tiles that could not be had are drawn again next time instead of kept gray
+            if self.render_key is not None and self.tiles.stats['missing']==self.missing:
+                self.render_cache.put(self.render_key,self.image)
         
-        self.copy_of_image = self.image.copy()
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.configure(image=self.photo)
-        self.label.image = self.photo
-        
-        buff.close()
+        self.copy_of_image = self.image
+        self.pipeline.show(self.image)
         
         
     def redraw(self,w,h):
@@ -186,43 +269,18 @@ class Map(Widget.Widget):
             return;
     
         self.img_w,self.img_h = int(self.img_oW/self.m_W*w), int(self.img_oH/self.m_H*h)
-        self.image = self.copy_of_image.resize((self.img_w,self.img_h))
-        self.photo = ImageTk.PhotoImage(self.image)
-        self.label.config(image = self.photo)
-        self.label.image = self.photo #avoid garbage collection
-        
         
-    def autocrop_image(self,image,border=0):
-        '''
-        Crop image automatically to its content
+        # Going back to a size the current view was rendered at
+        cached = None
+        if self.version is not None:
+            cached = self.render_cache.get(self.view_key(self.center_pt,self.zoom,(self.img_w,self.img_h),self.version))
+        self.image = cached if cached is not None else self.copy_of_image.resize((self.img_w,self.img_h))
+        self.pipeline.show(self.image)
         
-        Parameters:
-        self (Widget): Required for object functions
-        image (Image): The image to be cropped
-        border  (int): The extra border to include with the cropped image
         
-        Returns:
-        Image: The cropped image
+    def view_key(self,center_pt,zoom,size,version):
+        '''
+        The render cache key of a view; centers are rounded to a thousandth of the zoom so pans back land on the same key
         '''
-    
-        # Get the bounding box
-        bbox = image.getbbox()
-
-        # Crop the image to the contents of the bounding box
-        image = image.crop(bbox)
-
-        # Determine the width and height of the cropped image
-        (width,height) = image.size
-    
-        # Add border
-        width+=border*2
-        height+=border*2
-    
-        # Create a new image object for the output image
-        cropped_image = Image.new("RGBA",(width,height),(0,0,0,0))
-
-        # Paste the cropped image onto the new image
-        cropped_image.paste(image,(border, border))
-
-        return cropped_image
         
+        return (round(center_pt[0]/zoom*1000),round(center_pt[1]/zoom*1000),round(np.log(zoom)*1000),tuple(size),self.renderer,version)
@@ -0,0 +1,137 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a helper class that runs a polling function off the main thread on a tkinter timer without ever letting two polls overlap.
+"""
+
+from threading import Thread,Lock
+import time
+
+
+class Poller:
+    '''
+    Calls a function every so often in a worker thread; ticks that land while a poll is still running are skipped
+    '''
+
+    def __init__(self,widget,target,interval=3000,max_interval=15000,backoff=1.5):
+        '''
+        The initialization function
+
+        Parameters:
+        self       (Poller): Required for object functions
+        widget  (tk.Widget): The widget whose 'after' drives the timer
+        target   (function): Called with no arguments; should return True when it found new data
+        interval      (int): The base time between polls (ms)
+        max_interval  (int): The longest time between polls when nothing is changing (ms)
+        backoff     (float): How much the interval grows after each poll with no new data
+
+        Returns:
+        None
+        '''
+
+        self.widget = widget
+        self.target = target
+        self.base = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self.lock = Lock()
+        self.busy = False
+        self.after_id = None
+        self.stats = {'polls':0,
+                      'skipped':0,
+                      'in_flight':0,
+                      'last_latency':0.0,
+                      'avg_latency':0.0,
+                      'max_latency':0.0}
+
+
+    def start(self):
+        '''
+        Start polling now; restarting an already running poller does not start a second timer
+        '''
+
+        with self.lock:
+            if self.after_id is not None:
+                self.widget.after_cancel(self.after_id)
+            self.interval = self.base
+            self.after_id = self.widget.after(0,self._tick)
+
+
+    def stop(self):
+        '''
+        Stop polling; a poll already running is allowed to finish
+        '''
+
+        with self.lock:
+            if self.after_id is not None:
+                self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+
+    def _tick(self):
+        '''
+        Start a poll unless one is still running, then schedule the next tick
+        '''
+
+        with self.lock:
+            if self.busy:
+                self.stats['skipped'] += 1
+            else:
+                self.busy = True
+                self.stats['in_flight'] = 1
+                Thread(target=self._poll,daemon=True).start()
+            self.after_id = self.widget.after(int(self.interval),self._tick)
+
+
+    def _poll(self):
+        '''
+        Run the target and adjust the interval based on whether it found anything new
+        '''
+
+        start = time.perf_counter()
+        changed = False
+        try:
+            changed = self.target()
+        finally:
+            latency = time.perf_counter()-start
+            with self.lock:
+                if changed:
+                    self.interval = self.base
+                else:
+                    self.interval = min(self.interval*self.backoff,max(self.max_interval,self.base))
+
+                n = self.stats['polls']
+                self.stats['polls'] = n+1
+                self.stats['last_latency'] = latency
+                self.stats['avg_latency'] = (self.stats['avg_latency']*n+latency)/(n+1)
+                self.stats['max_latency'] = max(self.stats['max_latency'],latency)
+                self.stats['in_flight'] = 0
+                self.busy = False
+
+
+    def summary(self):
+        '''
+        Get a one-line description of the poll statistics for logging
+        '''
+
+        return 'polls: {polls}, skipped: {skipped}, in flight: {in_flight}, latency: {last_latency:.2f} s (avg {avg_latency:.2f} s, max {max_latency:.2f} s)'.format(**self.stats)
@@ -0,0 +1,126 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a memory cache of rendered images, bounded by the total size of the images kept.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class Render_Cache:
+    '''
+    Keeps the most recently used rendered images up to a size limit
+    '''
+
+    def __init__(self,max_mb=64):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Render_Cache): Required for object functions
+        max_mb      (float): The most the kept images may take up (MB)
+
+        Returns:
+        None
+        '''
+
+        self.max_bytes = int(max_mb*2**20)
+        self.lock = Lock()
+        self.images = OrderedDict()   # key -> (image,bytes), least recently used first
+        self.bytes = 0
+        self.stats = {'hits':0,'misses':0,'evicted':0}
+
+
+    def get(self,key):
+        '''
+        Get a rendered image
+
+        Parameters:
+        self (Render_Cache): Required for object functions
+        key      (hashable): What the image was rendered from
+
+        Returns:
+        Image: The image; None if it is not cached
+        '''
+
+        with self.lock:
+            if key not in self.images:
+                self.stats['misses'] += 1
+                return None
+            self.images.move_to_end(key)
+            self.stats['hits'] += 1
+            return self.images[key][0]
+
+
+    def put(self,key,image):
+        '''
+        Keep a rendered image, evicting the least recently used images past the size limit
+
+        Parameters:
+        self (Render_Cache): Required for object functions
+        key      (hashable): What the image was rendered from
+        image       (Image): The image; it must not be changed afterward
+
+        Returns:
+        None
+        '''
+
+        size = image.size[0]*image.size[1]*len(image.getbands())
+        if size>self.max_bytes:
+            return
+        with self.lock:
+            if key in self.images:
+                self.bytes -= self.images.pop(key)[1]
+            self.images[key] = (image,size)
+            self.bytes += size
+            while self.bytes>self.max_bytes:
+                _,(_,evicted) = self.images.popitem(last=False)
+                self.bytes -= evicted
+                self.stats['evicted'] += 1
+
+
+    def clear(self):
+        '''
+        Drop every image
+        '''
+
+        with self.lock:
+            self.images.clear()
+            self.bytes = 0
+
+
+    def hit_ratio(self):
+        '''
+        The fraction of lookups that found an image
+        '''
+
+        total = self.stats['hits']+self.stats['misses']
+        return self.stats['hits']/total if total else 0.0
+
+
+    def summary(self):
+        '''
+        One line summary of the cache statistics for the log
+        '''
+
+        return 'hit_ratio={:.2f} hits={hits} misses={misses} evicted={evicted} images={} size={:.1f}MB'.format(
+            self.hit_ratio(),len(self.images),self.bytes/2**20,**self.stats)
@@ -0,0 +1,65 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This makes matplotlib figures for ICC without pyplot.
+
+Pyplot keeps every figure in one global registry that is not safe to use from several threads at once. Figures made here
+belong only to whoever made them, each with its own Agg canvas, so any number can be drawn at the same time from worker
+threads. They are freed like any other object when no longer referenced; there is nothing to close.
+"""
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+def figure(**kwargs):
+    """
+    Make a figure drawn with Agg
+
+    Parameters:
+    **kwargs: Passed on to matplotlib.figure.Figure (figsize, dpi, frameon, ...)
+
+    Returns:
+    Figure: The figure
+    """
+
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def subplots(nrows=1,ncols=1,subplot_kw=None,**kwargs):
+    """
+    Make a figure with a grid of axes, like pyplot.subplots
+
+    Parameters:
+    nrows         (int): Rows of axes
+    ncols         (int): Columns of axes
+    subplot_kw   (dict): Passed on to each add_subplot (e.g. projection)
+    **kwargs           : Passed on to matplotlib.figure.Figure
+
+    Returns:
+    tuple: The figure, and the axes (an array of them unless there is only one)
+    """
+
+    fig = figure(**kwargs)
+    axs = fig.subplots(nrows=nrows,ncols=ncols,subplot_kw=subplot_kw)
+    return fig,axs
@@ -0,0 +1,120 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a single background thread for rendering, where only the latest request matters.
+"""
+
+from threading import Thread,Condition
+import traceback
+
+
+class Render_Worker:
+    '''
+    Runs render jobs one at a time in its own thread; a new job replaces any job still waiting
+    '''
+
+    def __init__(self,name='render'):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Render_Worker): Required for object functions
+        name          (str): Name of the thread
+
+        Returns:
+        None
+        '''
+
+        self.cond = Condition()
+        self.pending = None
+        self.generation = 0
+        self.stats = {'submitted':0,'rendered':0,'coalesced':0,'dropped':0}
+
+        self.thread = Thread(target=self._run,name=name,daemon=True)
+        self.thread.start()
+
+
+    def submit(self,job):
+        '''
+        Ask for a render
+
+        Parameters:
+        self (Render_Worker): Required for object functions
+        job      (function): Called in the worker thread with a function that returns True once a newer job
+                             has been submitted; the job should check it before showing anything
+
+        Returns:
+        None
+        '''
+
+        with self.cond:
+            if self.pending is not None:
+                self.stats['coalesced'] += 1
+            self.pending = job
+            self.generation += 1
+            self.stats['submitted'] += 1
+            self.cond.notify()
+
+
+    def stale(self,generation):
+        '''
+        Whether or not a job has been superseded
+        '''
+
+        with self.cond:
+            return self.generation!=generation
+
+
+    def drop(self):
+        '''
+        Count a job that gave up because it was stale
+        '''
+
+        with self.cond:
+            self.stats['dropped'] += 1
+
+
+    def _run(self):
+        '''
+        The worker thread
+        '''
+
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                job,self.pending = self.pending,None
+                generation = self.generation
+            try:
+                job(lambda: self.stale(generation))
+            except:
+                # Jobs report their own failures; this only keeps the worker alive
+                traceback.print_exc()
+            with self.cond:
+                self.stats['rendered'] += 1
+
+
+    def summary(self):
+        '''
+        One line summary of the worker statistics for the log
+        '''
+
+        return 'submitted={submitted} rendered={rendered} coalesced={coalesced} dropped={dropped}'.format(**self.stats)
@@ -0,0 +1,428 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a local stand-in for the BOREALIS server. It replays recorded (or made up) flights on the same routes
+Balloon_Coordinates and Tracker use, releasing rows of the flight csv as flight time passes, sped up as desired.
+
+From the directory containing main.py:
+
+    python -m widgets.Utility.Replay_Server --record 300234010000000 --out flight.csv
+    python -m widgets.Utility.Replay_Server flight.csv --speed 20
+    python -m widgets.Utility.Replay_Server --synthetic 4 --speed 100 --bench 60
+
+then start ICC with ICC_BOREALIS_URL=http://127.0.0.1:8000 to track the replayed flights. --bench measures ingest only
+(download, parse, and store); to see render latency and thread behavior, run ICC against the replay and watch the DEBUG
+lines Tracker logs (map frames, renders, and tiles) each poll.
+"""
+
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+from urllib.parse import urlsplit,parse_qs
+from threading import Thread
+import widgets.Utility.Balloon_Coordinates as BC
+import widgets.Utility.Flight_Feed as Flight_Feed
+import widgets.Utility.Flight_Store as Flight_Store
+import widgets.Utility.Http as Http
+import numpy as np
+import argparse
+import datetime
+import bisect
+import json
+import time
+import csv
+import io
+
+# Columns of made up flights; latitude, longitude, and altitude sit where Balloon_Coordinates.get_coor_alt expects them
+SYNTHETIC_COLUMNS = ['uid','timestamp','imei','latitude','longitude','altitude','vertical_velocity','ground_speed']
+
+
+class Replay_Flight:
+    '''
+    A flight csv and the flight time at which each of its rows becomes available
+    '''
+
+    def __init__(self,imei,date,text,interval=15.0):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Replay_Flight): Required for object functions
+        imei           (str): The IMEI the flight is served under
+        date           (str): The flight date ("%Y-%m-%d")
+        text         (bytes): The full flight csv
+        interval     (float): Seconds between rows when the csv has no usable time column
+
+        Returns:
+        None
+        '''
+
+        self.imei = imei
+        self.date = date
+        self.uid = BC.Balloon_Coordinates.make_uid(imei,date)
+
+        lines = text.replace(b'\r\n',b'\n').split(b'\n')
+        self.header = lines[0]+b'\n'
+        self.lines = [line+b'\n' for line in lines[1:] if line.strip()]
+        self.columns = next(csv.reader([self.header.decode()]))
+
+        # Byte offset of the end of each row so growing the csv is just a slice
+        self.blob = self.header+b''.join(self.lines)
+        self.ends = np.cumsum([len(self.header)]+[len(line) for line in self.lines])
+
+        self.times = self._flight_times(interval)
+
+
+    def _flight_times(self,interval):
+        '''
+        Seconds since the first row for every row
+        '''
+
+        col = next((c for c in Flight_Feed.TIME_COLUMNS if c in self.columns),None)
+        if col is not None:
+            i = self.columns.index(col)
+            try:
+                times = [float(row[i]) for row in csv.reader(line.decode() for line in self.lines)]
+            except ValueError:
+                try:
+                    times = [datetime.datetime.fromisoformat(row[i]).timestamp() for row in csv.reader(line.decode() for line in self.lines)]
+                except ValueError:
+                    times = None
+            if times:
+                return [t-times[0] for t in times]
+        return [i*interval for i in range(len(self.lines))]
+
+
+    def released(self,elapsed):
+        '''
+        The number of rows available after some flight time (s)
+        '''
+
+        return bisect.bisect_right(self.times,elapsed)
+
+
+    def csv(self,elapsed):
+        '''
+        The flight csv as it would look after some flight time (s)
+        '''
+
+        return self.blob[:self.ends[self.released(elapsed)]]
+
+
+    def json(self,elapsed):
+        '''
+        The flight rows as the json the /flight route serves
+        '''
+
+        data = []
+        for row in csv.reader(line.decode() for line in self.lines[:self.released(elapsed)]):
+            data.append([_number(val) for val in row])
+        return {'columns':self.columns,'data':data}
+
+
+class Replay_Server(ThreadingHTTPServer):
+    '''
+    Serves /meta/imeis, /meta/flights, and /flight for a set of replayed flights
+    '''
+
+    daemon_threads = True
+
+    def __init__(self,flights,speed=1.0,skip=0.0,port=8000,verbose=False):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Replay_Server): Required for object functions
+        flights       (list): The Replay_Flights to serve
+        speed        (float): How many seconds of flight time pass per second
+        skip         (float): Seconds of flight time already passed at startup
+        port           (int): The port to listen on
+        verbose       (bool): Whether or not to print every request
+
+        Returns:
+        None
+        '''
+
+        ThreadingHTTPServer.__init__(self,('127.0.0.1',port),Replay_Handler)
+        self.flights = {flight.uid:flight for flight in flights}
+        self.speed = speed
+        self.skip = skip
+        self.verbose = verbose
+        self.start = time.monotonic()
+
+
+    def elapsed(self):
+        '''
+        Flight time passed so far (s)
+        '''
+
+        return self.skip+(time.monotonic()-self.start)*self.speed
+
+
+class Replay_Handler(BaseHTTPRequestHandler):
+    '''
+    Answers requests the same way the BOREALIS server does
+    '''
+
+    server_version = 'ICCReplay/1.0'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        flights = self.server.flights.values()
+
+        if url.path=='/meta/imeis':
+            self._send_json(sorted({flight.imei for flight in flights}))
+        elif url.path=='/meta/flights':
+            imei = query.get('imei',[''])[0]
+            self._send_json(sorted({flight.date for flight in flights if flight.imei==imei}))
+        elif url.path=='/flight':
+            try:
+                flight = self.server.flights[int(query.get('uid',['0'])[0])]
+            except (KeyError,ValueError):
+                self.send_error(404,'Unknown flight')
+                return
+            if query.get('format',[''])[0]=='csv':
+                self._send_csv(flight.csv(self.server.elapsed()))
+            else:
+                self._send_json(flight.json(self.server.elapsed()))
+        else:
+            self.send_error(404)
+
+
+    def _send_json(self,obj):
+        body = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def _send_csv(self,body):
+        '''
+        Send the csv, honoring 'Range: bytes=N-' so incremental fetches get only the new part
+        '''
+
+        rng = self.headers.get('Range','')
+        if rng.startswith('bytes=') and rng.endswith('-') and rng[6:-1].isdigit():
+            first = int(rng[6:-1])
+            if first>=len(body):
+                self.send_response(416)
+                self.send_header('Content-Range','bytes */{}'.format(len(body)))
+                self.send_header('Content-Length','0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range','bytes {}-{}/{}'.format(first,len(body)-1,len(body)))
+            body = body[first:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type','text/csv')
+        self.send_header('Accept-Ranges','bytes')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self,format,*args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self,format,*args)
+
+
+def _number(val):
+    '''
+    Convert a csv value to a number where possible
+    '''
+
+    try:
+        return int(val)
+    except ValueError:
+        try:
+            return float(val)
+        except ValueError:
+            return val
+
+
+def load_flight(path,imei=None,date=None,interval=15.0):
+    """
+    Load a recorded flight csv
+
+    Parameters:
+    path      (str): The csv file
+    imei      (str): The IMEI to serve it under; taken from an 'imei' column if not given
+    date      (str): The flight date to serve it under ("%Y-%m-%d"); today if not given
+    interval (float): Seconds between rows if the csv has no time column
+
+    Returns:
+    Replay_Flight: The flight
+    """
+
+    with open(path,'rb') as f:
+        text = f.read()
+    if imei is None:
+        reader = csv.DictReader(io.StringIO(text.decode()))
+        row = next(reader,{})
+        imei = str(row.get('imei') or '300234010000000')
+    date = date or time.strftime('%Y-%m-%d')
+    return Replay_Flight(imei,date,text,interval)
+
+
+def synthetic_flight(imei,date=None,interval=15.0,burst=30000.0,launch=(45.662947,-111.044888,1500.0),seed=0):
+    """
+    Make up a flight: a 5 m/s ascent to burst, a parachute descent that slows as the air thickens, and drift with a wind that picks up with altitude
+
+    Parameters:
+    imei       (str): The IMEI to serve it under
+    date       (str): The flight date ("%Y-%m-%d"); today if not given
+    interval (float): Seconds between rows
+    burst    (float): Burst altitude (m)
+    launch   (tuple): Latitude, longitude, and altitude (m) of the launch site
+    seed       (int): Seed for the random noise
+
+    Returns:
+    Replay_Flight: The flight
+    """
+
+    rng = np.random.default_rng(seed)
+    date = date or time.strftime('%Y-%m-%d')
+    uid = BC.Balloon_Coordinates.make_uid(imei,date)
+    t0 = time.mktime(time.strptime(date,'%Y-%m-%d'))+8*3600
+
+    lat,lon,alt = launch
+    t,ascending = 0.0,True
+    out = io.StringIO()
+    writer = csv.writer(out,lineterminator='\n')
+    writer.writerow(SYNTHETIC_COLUMNS)
+    while True:
+        if ascending:
+            vv = 5.0+rng.normal(0,0.3)
+        else:
+            vv = -5.0*np.exp(alt/(2*8400.0))+rng.normal(0,0.3)
+        wind_u = 5.0+alt/1000.0+rng.normal(0,1.0)    # m/s east
+        wind_v = 2.0+rng.normal(0,1.0)               # m/s north
+        writer.writerow([uid,'{:.0f}'.format(t0+t),imei,'{:.6f}'.format(lat),'{:.6f}'.format(lon),'{:.1f}'.format(alt),
+                         '{:.2f}'.format(vv),'{:.2f}'.format(3.6*np.hypot(wind_u,wind_v))])
+
+        t += interval
+        alt += vv*interval
+        lat += wind_v*interval/111320.0
+        lon += wind_u*interval/(111320.0*np.cos(np.radians(lat)))
+        if ascending and alt>=burst:
+            ascending = False
+        if not ascending and alt<=launch[2]:
+            break
+
+    return Replay_Flight(imei,date,out.getvalue().encode(),interval)
+
+
+def record(imei,path):
+    """
+    Download an IMEI's latest flight csv from the live server to a file
+    """
+
+    bc = BC.Balloon_Coordinates(imei)
+    req = Http.get(Flight_Feed.CSV_URL.format(bc.uid),'borealis',timeout=30)
+    req.raise_for_status()
+    with open(path,'wb') as f:
+        f.write(req.content)
+    print('Saved {} ({}) to {}'.format(imei,bc.latest_flight,path))
+
+
+def bench(url,flights,seconds,poll=1.0):
+    """
+    Poll the server the way Tracker does and report ingest statistics; nothing is rendered, so this times download,
+    parsing, and storing the rows only
+
+    Parameters:
+    url       (str): The server url
+    flights  (list): The Replay_Flights being served
+    seconds (float): How long to run
+    poll    (float): Seconds between polls of each flight
+
+    Returns:
+    None
+    """
+
+    feeds = [Flight_Feed.Flight_Feed(flight.uid,url=url+'/flight?uid={}&format=csv') for flight in flights]
+    stores = [Flight_Store.Flight_Store() for flight in flights]
+    latencies = [[] for flight in flights]
+
+    end = time.monotonic()+seconds
+    while time.monotonic()<end:
+        for feed,store,lat in zip(feeds,stores,latencies):
+            start = time.perf_counter()
+            store.append(feed.poll())
+            lat.append(time.perf_counter()-start)
+        time.sleep(poll)
+
+    for flight,feed,store,lat in zip(flights,feeds,stores,latencies):
+        print('{} uid {}: {} rows, {:.1f} kB in {} polls ({:.0f} rows/s); poll latency {:.1f} ms avg, {:.1f} ms max'.format(flight.imei,
+                                                                                                                            flight.uid,
+                                                                                                                            len(store),
+                                                                                                                            feed.stats['bytes']/1024,
+                                                                                                                            feed.stats['polls'],
+                                                                                                                            feed.stats['rows']/seconds,
+                                                                                                                            1000*np.mean(lat),
+                                                                                                                            1000*np.max(lat)))
+    print(Http.summary('borealis'))
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Replay BOREALIS flights locally.')
+    parser.add_argument('csvs',nargs='*',help='recorded flight csv files')
+    parser.add_argument('--imei',action='append',help='IMEI to serve each csv under (in order)')
+    parser.add_argument('--synthetic',type=int,default=0,help='number of made up flights to add')
+    parser.add_argument('--speed',type=float,default=1.0,help='flight seconds per real second (1-100)')
+    parser.add_argument('--skip',type=float,default=0.0,help='flight seconds already passed at startup')
+    parser.add_argument('--interval',type=float,default=15.0,help='seconds between rows without a time column')
+    parser.add_argument('--port',type=int,default=8000)
+    parser.add_argument('--verbose',action='store_true',help='print every request')
+    parser.add_argument('--record',metavar='IMEI',help='download the latest flight of IMEI from the live server and exit')
+    parser.add_argument('--out',default='flight.csv',help='where --record saves the csv')
+    parser.add_argument('--bench',type=float,metavar='SECONDS',help='poll the replay for SECONDS and report ingest statistics (no rendering)')
+    args = parser.parse_args()
+    if not 1<=args.speed<=100:
+        parser.error('--speed must be from 1 to 100')
+
+    if args.record:
+        record(args.record,args.out)
+        raise SystemExit
+
+    imeis = args.imei or []
+    flights = [load_flight(path,imeis[i] if i<len(imeis) else None,interval=args.interval) for i,path in enumerate(args.csvs)]
+    flights += [synthetic_flight('3002340100{:05d}'.format(i+1),interval=args.interval,seed=i) for i in range(args.synthetic)]
+    if not flights:
+        parser.error('nothing to replay; give csv files or --synthetic N')
+
+    server = Replay_Server(flights,speed=args.speed,skip=args.skip,port=args.port,verbose=args.verbose)
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    for flight in flights:
+        print('Serving {} ({}) as uid {}: {} rows over {:.0f} min of flight'.format(flight.imei,flight.date,flight.uid,len(flight.lines),flight.times[-1]/60 if flight.times else 0))
+    print('Listening on {} at {}x'.format(url,args.speed))
+
+    if args.bench:
+        Thread(target=server.serve_forever,daemon=True).start()
+        bench(url,flights,args.bench)
+        server.shutdown()
+    else:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,384 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a cache of OpenStreetMap tiles so the map only downloads each tile once and keeps working without a connection.
+
+Tiles are saved as cache/tiles/z/x/y.png (or under ICC_TILE_DIR), and the least recently used are deleted once the folder
+grows past its size cap (ICC_TILE_CACHE_MB, 256 MB by default). The most recently used tiles are also kept decoded in memory.
+
+Tiles come from the OpenStreetMap servers unless ICC_TILE_URL points at another server (with {z}, {x}, and {y} in place of the
+tile). The OpenStreetMap tile usage policy does not allow bulk downloads, so only other servers are marked for prefetching.
+"""
+
+from collections import OrderedDict
+from threading import Thread,Lock
+import time
+import widgets.Utility.Http as Http
+from PIL import Image
+import numpy as np
+import tempfile
+import math
+import io
+import os
+
+TILE_DIR = os.environ.get('ICC_TILE_DIR','cache/tiles')
+TILE_CACHE_MB = float(os.environ.get('ICC_TILE_CACHE_MB',256))
+OSM_URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+TILE_URL = os.environ.get('ICC_TILE_URL',OSM_URL)
+# Servers whose usage policy forbids downloading tiles nobody has asked to see yet
+NO_BULK_HOSTS = ['tile.openstreetmap.org']
+# Tile servers ask that clients identify themselves honestly
+USER_AGENT = 'IridiumCommand/1.0 (+https://github.com/jhphillips1029/IridiumCommand)'
+TILE_SIZE = 256
+
+# A tile that fails to download is not asked for again for this long (s), doubling with each failure in a row up to the max
+RETRY_AFTER = 30
+RETRY_MAX = 600
+
+
+def tile_xy(lat,lon,z):
+    """
+    Get the Web Mercator tile containing a point
+
+    Parameters:
+    lat (float,array): Latitude of the point(s)
+    lon (float,array): Longitude of the point(s)
+    z           (int): Zoom level
+
+    Returns:
+    tuple: Fractional x and y of the point(s) in tiles; the tile is their floor
+    """
+
+    n = 2**z
+    lat = np.clip(lat,-85.0511,85.0511)
+    x = (np.asarray(lon,float)+180.0)/360.0*n
+    y = (1.0-np.arcsinh(np.tan(np.radians(lat)))/np.pi)/2.0*n
+    return x,y
+
+
+def zoom_level(zoom):
+    """
+    Get the tile zoom level the map uses for a Map zoom
+
+    Parameters:
+    zoom (float): The Map zoom (degrees of latitude from the center to the edge of the view)
+
+    Returns:
+    int: The tile zoom level
+    """
+
+    return max(min(int(np.ceil(-np.sqrt(2)*np.log(zoom/350.0))),19),0)
+
+
+def view_width(zoom,z):
+    """
+    Width of a map view in pixels at a tile zoom level; views span 2*zoom degrees of longitude either side of the center
+    """
+
+    return 4*zoom/360.0*TILE_SIZE*2**z
+
+
+def render_level(zoom,width=None,max_level=19):
+    """
+    Get the tile zoom level a map view is drawn from; the renderer and the prefetcher both use this so they agree
+
+    Starts from zoom_level and steps out while the view would be far more pixels than the image, since the mosaic
+    renderer would only shrink those tiles.
+
+    Parameters:
+    zoom    (float): The Map zoom (degrees of latitude from the center to the edge of the view)
+    width     (int): The width of the rendered image; None for zoom_level unchanged (the cartopy renderers)
+    max_level (int): The highest tile zoom level
+
+    Returns:
+    int: The tile zoom level
+    """
+
+    z = min(zoom_level(zoom),max_level)
+    if width is None:
+        return z
+    while z>0 and view_width(zoom,z)>1.5*width:
+        z -= 1
+    return max(z,0)
+
+
+def tile_latlon(x,y,z):
+    """
+    Get the point at a (fractional) tile position; the inverse of tile_xy
+
+    Parameters:
+    x (float): x in tiles
+    y (float): y in tiles
+    z   (int): Zoom level
+
+    Returns:
+    tuple: Latitude and longitude of the point
+    """
+
+    n = 2**z
+    lon = x/n*360.0-180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi*(1-2*y/n))))
+    return lat,lon
+
+
+class Tile_Cache:
+    '''
+    Gets map tiles from memory, then disk, then the network
+    '''
+
+    def __init__(self,path=TILE_DIR,max_mb=TILE_CACHE_MB,memory_tiles=256,url=TILE_URL,mode='RGB'):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Tile_Cache): Required for object functions
+        path        (str): The folder tiles are saved in
+        max_mb    (float): The most the saved tiles may take up (MB)
+        memory_tiles(int): The most decoded tiles kept in memory
+        url         (str): The tile server, with {z}, {x}, and {y} in place of the tile
+        mode        (str): The PIL mode tiles are decoded to
+
+        Returns:
+        None
+        '''
+
+        self.path = path
+        self.max_bytes = int(max_mb*2**20)
+        self.memory_tiles = memory_tiles
+        self.url = url
+        self.mode = mode
+        self.bulk = not any(host in url for host in NO_BULK_HOSTS)   # Whether or not the server allows prefetching
+
+        self.lock = Lock()
+        self.index_lock = Lock()      # Held while reading the folder, so it is only read once
+        self.memory = OrderedDict()   # (z,x,y) -> decoded image, least recently used first
+        self.disk = None              # (z,x,y) -> file size, least recently used first; read in the background
+        self.bytes = 0
+        self.failures = {}            # (z,x,y) -> (time to try again,seconds to wait after the next failure)
+        self.stats = {'memory':0,'disk':0,'downloaded':0,'failed':0,'skipped':0,'missing':0,'evicted':0}
+
+        # Reading a big folder takes a while, so start now rather than on the first tile the map asks for
+        Thread(target=self._index,name='tile-index',daemon=True).start()
+
+
+    def _file(self,z,x,y):
+        return os.path.join(self.path,str(z),str(x),'{}.png'.format(y))
+
+
+    def _index(self):
+        '''
+        Read which tiles are saved, oldest use first, unless they have been already; call without the lock held
+        '''
+
+        if self.disk is not None:
+            return
+        with self.index_lock:
+            if self.disk is not None:
+                return
+            found = []
+            for root,dirs,files in os.walk(self.path):
+                for name in files:
+                    if not name.endswith('.png'):
+                        continue
+                    fname = os.path.join(root,name)
+                    try:
+                        z,x = os.path.relpath(root,self.path).split(os.sep)[-2:]
+                        st = os.stat(fname)
+                        found.append((st.st_mtime,(int(z),int(x),int(name[:-4])),st.st_size))
+                    except (ValueError,OSError):
+                        continue
+            found.sort()
+            disk = OrderedDict((key,size) for _,key,size in found)
+            with self.lock:
+                self.disk = disk
+                self.bytes = sum(disk.values())
+
+
+    def cached(self,z,x,y):
+        '''
+        Whether or not a tile is saved on disk
+        '''
+
+        self._index()
+        with self.lock:
+            return (z,x,y) in self.disk
+
+
+    def get(self,z,x,y,remote=True):
+        '''
+        Get a decoded tile
+
+        Parameters:
+        self (Tile_Cache): Required for object functions
+        z           (int): Zoom level
+        x           (int): Tile column
+        y           (int): Tile row
+        remote     (bool): Whether or not to download tiles that are not cached
+
+        Returns:
+        Image: The tile; None if it is not cached and could not be downloaded
+        '''
+
+        key = (z,x,y)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory'] += 1
+                return self.memory[key]
+        self._index()
+        with self.lock:
+            on_disk = key in self.disk
+
+        data = self._read(key) if on_disk else None
+        if data is not None:
+            source = 'disk'
+        elif remote:
+            data = self.fetch(z,x,y)
+            source = 'downloaded'
+        if data is None:
+            with self.lock:
+                self.stats['missing'] += 1
+            return None
+
+        try:
+            img = Image.open(io.BytesIO(data)).convert(self.mode)
+        except:
+            with self.lock:
+                self.stats['failed'] += 1
+                self.stats['missing'] += 1
+            return None
+
+        with self.lock:
+            self.stats[source] += 1
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self.memory[key] = img
+            if len(self.memory)>self.memory_tiles:
+                self.memory.popitem(last=False)
+        return img
+
+
+    def _read(self,key):
+        '''
+        Read a saved tile's png data, marking it used; None if it cannot be read
+        '''
+
+        try:
+            with open(self._file(*key),'rb') as f:
+                data = f.read()
+            # The file times record use order across restarts
+            os.utime(self._file(*key))
+            return data
+        except OSError:
+            return None
+
+
+    def fetch(self,z,x,y):
+        '''
+        Download a tile and save it to disk
+
+        Parameters:
+        self (Tile_Cache): Required for object functions
+        z           (int): Zoom level
+        x           (int): Tile column
+        y           (int): Tile row
+
+        Returns:
+        bytes: The tile's png data; None if it could not be downloaded, or failed to recently
+        '''
+
+        key = (z,x,y)
+        with self.lock:
+            failure = self.failures.get(key)
+            if failure is not None and time.monotonic()<failure[0]:
+                # Failed not long ago; don't hold up the map waiting on it again yet
+                self.stats['skipped'] += 1
+                return None
+
+        try:
+            resp = Http.get(self.url.format(z=z,x=x,y=y),'osm',headers={'User-Agent':USER_AGENT})
+            resp.raise_for_status()
+            data = resp.content
+        except:
+            with self.lock:
+                self.stats['failed'] += 1
+                wait = RETRY_AFTER if failure is None else failure[1]
+                self.failures[key] = (time.monotonic()+wait,min(wait*2,RETRY_MAX))
+            return None
+
+        with self.lock:
+            self.failures.pop(key,None)
+
+        fname = self._file(z,x,y)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(fname),exist_ok=True)
+            # A temporary file of its own, so two threads fetching the same tile do not write over each other
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(fname),suffix='.tmp',delete=False) as f:
+                tmp = f.name
+                f.write(data)
+            os.replace(tmp,fname)
+        except OSError:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            return data
+
+        self._index()
+        with self.lock:
+            self.bytes += len(data)-self.disk.get((z,x,y),0)
+            self.disk[(z,x,y)] = len(data)
+            self.disk.move_to_end((z,x,y))
+            self._evict()
+        return data
+
+
+    def _evict(self):
+        '''
+        Delete the least recently used tiles until the cache fits its size cap; must be called with the lock held
+        '''
+
+        while self.bytes>self.max_bytes and len(self.disk)>1:
+            key,size = self.disk.popitem(last=False)
+            try:
+                os.remove(self._file(*key))
+            except OSError:
+                pass
+            self.bytes -= size
+            self.stats['evicted'] += 1
+
+
+    def hit_ratio(self):
+        '''
+        The fraction of tiles found without downloading them
+        '''
+
+        hits = self.stats['memory']+self.stats['disk']
+        total = hits+self.stats['downloaded']+self.stats['failed']
+        return hits/total if total else 0.0
+
+
+    def summary(self):
+        '''
+        One line summary of the cache statistics for the log
+        '''
+
+        return 'hit_ratio={:.2f} memory={memory} disk={disk} downloaded={downloaded} failed={failed} skipped={skipped} missing={missing} evicted={evicted} size={:.1f}MB'.format(
+            self.hit_ratio(),self.bytes/2**20,**self.stats)
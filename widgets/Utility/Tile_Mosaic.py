@@ -0,0 +1,255 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This is a lightweight map renderer that pastes tiles from a Tile_Cache together with PIL and draws tracks straight onto them.
+
+Everything is done in Web Mercator pixel space, the same space the tiles are drawn in. The stitched tiles cover a margin around
+the view, so panning within them is only a crop.
+"""
+
+import widgets.Utility.Tile_Cache as Tile_Cache
+from PIL import Image,ImageDraw
+import numpy as np
+import math
+
+# Colors for the single letter matplotlib color codes used in line decorators
+COLORS = {'r':(255,0,0),'g':(0,160,0),'b':(0,0,255),'c':(0,191,191),'m':(191,0,191),
+          'y':(191,191,0),'k':(0,0,0),'w':(255,255,255)}
+MISSING = (40,40,40)
+
+
+def parse_decorator(decorator):
+    """
+    Split a matplotlib style format string (e.g. 'ro-', 'b--', 'gx') into its parts
+
+    Parameters:
+    decorator (str): The format string
+
+    Returns:
+    tuple: The RGB color, line style ('-', '--', or None), and marker ('o', 'x', or None)
+    """
+
+    color = COLORS['r']
+    line = marker = None
+    for c in decorator:
+        if c in COLORS:
+            color = COLORS[c]
+        elif c in 'ox.':
+            marker = c
+    if '--' in decorator:
+        line = '--'
+    elif '-' in decorator:
+        line = '-'
+    elif marker is None:
+        line = '-'
+    return color,line,marker
+
+
+class Tile_Mosaic:
+    '''
+    Renders map views from cached tiles
+    '''
+
+    def __init__(self,tiles,margin=0.5,max_levels=19):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Tile_Mosaic): Required for object functions
+        tiles (Tile_Cache): Where tiles come from
+        margin     (float): How much of a view to stitch beyond each edge so pans are only crops
+        max_levels   (int): The highest tile zoom level
+
+        Returns:
+        None
+        '''
+
+        self.tiles = tiles
+        self.margin = margin
+        self.max_levels = max_levels
+
+        self.base = None        # Stitched tiles
+        self.base_z = None      # Zoom level of the stitched tiles
+        self.base_origin = None # Global pixel position of the stitched tiles' top-left corner
+        self.base_missing = []  # (x,y) of the tiles that could not be had when stitching
+        self.stats = {'renders':0,'stitches':0,'fills':0}
+
+
+    def level(self,zoom,width):
+        '''
+        Pick the tile zoom level for a view; see Tile_Cache.render_level, which the prefetcher also uses
+
+        Parameters:
+        self (Tile_Mosaic): Required for object functions
+        zoom       (float): The Map zoom (degrees of latitude from the center to the edge of the view)
+        width        (int): The width of the rendered image
+
+        Returns:
+        int: The tile zoom level
+        '''
+
+        return Tile_Cache.render_level(zoom,width,self.max_levels)
+
+
+    def view_width(self,zoom,z):
+        '''
+        Width of a view in pixels at a tile zoom level; views span 2*zoom degrees of longitude either side of the center
+        '''
+
+        return Tile_Cache.view_width(zoom,z)
+
+
+    def stitch(self,z,left,top,right,bottom):
+        '''
+        Paste together the tiles covering a rectangle of global pixels
+
+        Parameters:
+        self (Tile_Mosaic): Required for object functions
+        z            (int): Tile zoom level
+        left       (float): Left edge of the rectangle (pixels)
+        top        (float): Top edge of the rectangle (pixels)
+        right      (float): Right edge of the rectangle (pixels)
+        bottom     (float): Bottom edge of the rectangle (pixels)
+
+        Returns:
+        None
+        '''
+
+        size = Tile_Cache.TILE_SIZE
+        n = 2**z
+        x0,x1 = int(math.floor(left/size)),int(math.floor(right/size))
+        y0,y1 = max(int(math.floor(top/size)),0),min(int(math.floor(bottom/size)),n-1)
+
+        base = Image.new('RGB',((x1-x0+1)*size,(y1-y0+1)*size),MISSING)
+        missing = []
+        for ty in range(y0,y1+1):
+            for tx in range(x0,x1+1):
+                tile = self.tiles.get(z,tx%n,ty)
+                if tile is not None:
+                    base.paste(tile,((tx-x0)*size,(ty-y0)*size))
+                else:
+                    missing.append((tx,ty))
+
+        self.base = base
+        self.base_z = z
+        self.base_origin = (x0*size,y0*size)
+        self.base_missing = missing
+        self.stats['stitches'] += 1
+
+
+    def fill(self):
+        '''
+        Paste in any missing tiles of the stitched area that have since been saved (e.g. by the prefetcher)
+
+        Only the cache is checked; downloading them again on every frame would stall the map while offline.
+        '''
+
+        size = Tile_Cache.TILE_SIZE
+        n = 2**self.base_z
+        ox,oy = self.base_origin
+        missing = []
+        for tx,ty in self.base_missing:
+            tile = self.tiles.get(self.base_z,tx%n,ty,remote=False)
+            if tile is not None:
+                self.base.paste(tile,(tx*size-ox,ty*size-oy))
+            else:
+                missing.append((tx,ty))
+        self.base_missing = missing
+        self.stats['fills'] += 1
+
+
+    def render(self,layers,center_pt,zoom,size):
+        '''
+        Render a map view with tracks drawn on it
+
+        Parameters:
+        self (Tile_Mosaic): Required for object functions
+        layers      (list): (longitudes,latitudes,decorator) for each track, drawn in order
+        center_pt  (tuple): Latitude and longitude of the center of the view
+        zoom       (float): The Map zoom (degrees of latitude from the center to the edge of the view)
+        size       (tuple): Width and height of the image (pixels)
+
+        Returns:
+        Image: The rendered view
+        '''
+
+        w,h = int(size[0]),int(size[1])
+        z = self.level(zoom,w)
+        scale = Tile_Cache.TILE_SIZE
+        cx,cy = Tile_Cache.tile_xy(center_pt[0],center_pt[1],z)
+        cx,cy = cx*scale,cy*scale
+        vw = self.view_width(zoom,z)
+        vh = vw*h/w
+        left,top = cx-vw/2,cy-vh/2
+
+        # Only stitch again if the view has left the stitched area
+        inside = (self.base is not None and self.base_z==z and
+                  left>=self.base_origin[0] and top>=self.base_origin[1] and
+                  left+vw<=self.base_origin[0]+self.base.size[0] and top+vh<=self.base_origin[1]+self.base.size[1])
+        if not inside:
+            mx,my = self.margin*vw,self.margin*vh
+            self.stitch(z,left-mx,top-my,left+vw+mx,top+vh+my)
+        elif self.base_missing:
+            self.fill()
+
+        ox,oy = self.base_origin
+        box = (left-ox,top-oy,left-ox+vw,top-oy+vh)
+        img = self.base.resize((w,h),Image.BILINEAR,box=box)
+
+        draw = ImageDraw.Draw(img)
+        k = w/vw
+        for lons,lats,decorator in layers:
+            lats = np.asarray(lats,float)
+            lons = np.asarray(lons,float)
+            if len(lats)==0:
+                continue
+            px,py = Tile_Cache.tile_xy(lats,lons,z)
+            px = (px*scale-left)*k
+            py = (py*scale-top)*k
+            ok = ~(np.isnan(px)|np.isnan(py))
+            points = list(zip(px[ok].tolist(),py[ok].tolist()))
+            self.draw(draw,points,decorator)
+
+        self.stats['renders'] += 1
+        return img
+
+
+    def draw(self,draw,points,decorator):
+        '''
+        Draw one track in pixel coordinates
+        '''
+
+        color,line,marker = parse_decorator(decorator)
+        if line=='-' and len(points)>1:
+            draw.line(points,fill=color,width=2)
+        elif line=='--':
+            for a,b in zip(points[:-1:2],points[1::2]):
+                draw.line([a,b],fill=color,width=2)
+        if marker=='o':
+            for x,y in points:
+                draw.ellipse([x-3,y-3,x+3,y+3],fill=color)
+        elif marker=='x':
+            for x,y in points:
+                draw.line([x-4,y-4,x+4,y+4],fill=color,width=2)
+                draw.line([x-4,y+4,x+4,y-4],fill=color,width=2)
+        elif marker=='.':
+            for x,y in points:
+                draw.point((x,y),fill=color)
@@ -0,0 +1,212 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This downloads map tiles around the flight ahead of time so the map keeps working after leaving cell coverage.
+
+Servers that do not allow bulk downloads (see Tile_Cache.NO_BULK_HOSTS) only get the tiles of the current view and one pan
+around it, with a small budget.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import widgets.Utility.Tile_Cache as Tile_Cache
+import numpy as np
+import math
+
+
+class Tile_Prefetcher:
+    '''
+    Fills a Tile_Cache in the background with the tiles around a list of points
+    '''
+
+    def __init__(self,tiles,log=None,workers=2,max_mb=None,report_every=50):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Tile_Prefetcher): Required for object functions
+        tiles     (Tile_Cache): The cache to fill
+        log             (func): Called with a message and level to report progress
+        workers          (int): Number of download threads; kept low out of courtesy to the tile servers
+        max_mb         (float): The most to download over the life of the prefetcher (MB); None for 64, or 4 if the server does not allow bulk downloads
+        report_every     (int): Report progress after this many tiles
+
+        Returns:
+        None
+        '''
+
+        self.tiles = tiles
+        self.log = log
+        self.bulk = tiles.bulk
+        if max_mb is None:
+            max_mb = 64 if self.bulk else 4
+        self.max_bytes = int(max_mb*2**20)
+        self.report_every = report_every
+
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = Lock()
+        self.queued = set()   # Tiles waiting for or being downloaded
+        self.futures = []
+        self.stats = {'queued':0,'done':0,'bytes':0,'failed':0}
+        self.spent = False
+
+
+    def view_tiles(self,lats,lons,z,half_w,half_h):
+        '''
+        Get every tile a map view centered on any of the points would show
+
+        Parameters:
+        self (Tile_Prefetcher): Required for object functions
+        lats           (array): Latitudes of the view centers
+        lons           (array): Longitudes of the view centers
+        z                (int): Zoom level
+        half_w         (float): Half the view width (degrees of longitude)
+        half_h         (float): Half the view height (degrees of latitude)
+
+        Returns:
+        list: (z,x,y) tiles in the order of the points they were first needed by
+        '''
+
+        lats = np.asarray(lats,float)
+        lons = np.asarray(lons,float)
+        ok = ~(np.isnan(lats)|np.isnan(lons))
+        if not ok.any():
+            return []
+        x,y = Tile_Cache.tile_xy(lats[ok],lons[ok],z)
+        x,y = np.floor(x).astype(int),np.floor(y).astype(int)
+
+        # Points in the same tile need the same view, so only keep the first of each
+        _,first = np.unique(np.column_stack([x,y]),axis=0,return_index=True)
+        first.sort()
+
+        # A view's size in tiles barely changes across it, so measure it at the first point
+        x0,y0 = Tile_Cache.tile_xy(lats[ok][0]+half_h,lons[ok][0]-half_w,z)
+        x1,y1 = Tile_Cache.tile_xy(lats[ok][0]-half_h,lons[ok][0]+half_w,z)
+        rx,ry = int(math.ceil((x1-x0)/2)),int(math.ceil((y1-y0)/2))
+
+        n = 2**z
+        out = {}
+        for i in first:
+            for dy in range(-ry,ry+1):
+                for dx in range(-rx,rx+1):
+                    ty = y[i]+dy
+                    if 0<=ty<n:
+                        out[(z,(x[i]+dx)%n,ty)] = None
+        return list(out)
+
+
+    def prefetch(self,lats,lons,zoom,width=None,levels=1,label='map'):
+        '''
+        Queue the tiles for map views centered on the points at the Map's zoom and the levels around it
+
+        Parameters:
+        self (Tile_Prefetcher): Required for object functions
+        lats           (array): Latitudes of the view centers, most important first
+        lons           (array): Longitudes of the view centers
+        zoom           (float): The Map zoom (degrees of latitude from the center to the edge of the view)
+        width            (int): The width of the map image, to fetch the level the mosaic renderer draws (see
+                                Tile_Cache.render_level); None for the cartopy renderers' level
+        levels           (int): How many tile zoom levels above and below the Map's to include; none if the server does not allow bulk downloads
+        label            (str): What is being prefetched, for the log
+
+        Returns:
+        int: The number of tiles queued
+        '''
+
+        if self.spent:
+            return 0
+
+        if not self.bulk:
+            levels = 0
+
+        scale = Tile_Cache.render_level(zoom,width)
+        wanted = []
+        for z in range(max(scale-levels,0),min(scale+levels,19)+1):
+            # Each level out shows twice as much of the map
+            f = 2.0**(scale-z)
+            wanted += self.view_tiles(lats,lons,z,2*zoom*f,zoom*f)
+
+        queued = 0
+        with self.lock:
+            for tile in wanted:
+                if tile in self.queued:
+                    continue
+                if self.tiles.cached(*tile):
+                    continue
+                self.queued.add(tile)
+                self.futures.append(self.pool.submit(self._fetch,tile))
+                queued += 1
+            self.stats['queued'] += queued
+            self.futures = [f for f in self.futures if not f.done()]
+
+        if queued and self.log is not None:
+            self.log('Prefetching {} {} tiles'.format(queued,label),'DEBUG')
+        return queued
+
+
+    def _fetch(self,tile):
+        '''
+        Download one tile unless the byte budget is spent; runs in a worker thread
+        '''
+
+        with self.lock:
+            if self.spent:
+                self.queued.discard(tile)
+                return
+        data = self.tiles.fetch(*tile)
+
+        report = None
+        with self.lock:
+            self.queued.discard(tile)
+            self.stats['done'] += 1
+            if data is None:
+                self.stats['failed'] += 1
+            else:
+                self.stats['bytes'] += len(data)
+            if self.spent:
+                pass
+            elif self.stats['bytes']>=self.max_bytes:
+                self.spent = True
+                report = ('Tile prefetch budget of {:g} MB used up; {}'.format(self.max_bytes/2**20,self.summary()),'INFO')
+            elif self.stats['done']%self.report_every==0 or not self.queued:
+                report = ('Tile prefetch {}'.format(self.summary()),'INFO')
+        if report is not None and self.log is not None:
+            self.log(*report)
+
+
+    def cancel(self):
+        '''
+        Drop every queued tile that has not started downloading
+        '''
+
+        with self.lock:
+            for f in self.futures:
+                f.cancel()
+            self.futures = []
+            self.queued.clear()
+
+
+    def summary(self):
+        '''
+        One line summary of the prefetch progress for the log
+        '''
+
+        return '{done}/{queued} tiles, {:.1f} MB, {failed} failed'.format(self.stats['bytes']/2**20,**self.stats)
@@ -0,0 +1,136 @@
+"""
+----------------------------------------------------------------------------
+MIT License
+Copyright (c) 2022 Joshua H. Phillips
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to
+deal in the Software without restriction, including without limitation the
+rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+sell copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+----------------------------------------------------------------------------
+
+This simplifies flight tracks for drawing on the map, keeping only the points that are more than a pixel off the line at each zoom level.
+"""
+
+from threading import Lock
+import widgets.Utility.Tile_Cache as Tile_Cache
+import numpy as np
+
+
+def simplify(x,y,tolerance):
+    """
+    Douglas-Peucker line simplification
+
+    Parameters:
+    x         (array): x of each point
+    y         (array): y of each point
+    tolerance (float): The furthest a dropped point may be from the simplified line
+
+    Returns:
+    numpy.ndarray: Indices of the points kept, in order; always includes the first and last
+    """
+
+    n = len(x)
+    if n<3:
+        return np.arange(n)
+    keep = np.zeros(n,bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0,n-1)]
+    while stack:
+        i,j = stack.pop()
+        if j-i<2:
+            continue
+        dx,dy = x[j]-x[i],y[j]-y[i]
+        px,py = x[i+1:j]-x[i],y[i+1:j]-y[i]
+        length = np.hypot(dx,dy)
+        if length>0:
+            dist = np.abs(px*dy-py*dx)/length
+        else:
+            dist = np.hypot(px,py)
+        k = int(np.argmax(dist))
+        if dist[k]>tolerance:
+            m = i+1+k
+            keep[m] = True
+            stack.append((i,m))
+            stack.append((m,j))
+    return np.flatnonzero(keep)
+
+
+class Track_LOD:
+    '''
+    Simplified versions of a Flight_Store's track for each tile zoom level, extended as rows are added
+    '''
+
+    def __init__(self,store,pixels=1.0):
+        '''
+        The initialization function
+
+        Parameters:
+        self (Track_LOD): Required for object functions
+        store (Flight_Store): The store holding the track
+        pixels     (float): How far off the simplified line (in pixels at the zoom level) a dropped point may be
+
+        Returns:
+        None
+        '''
+
+        self.store = store
+        self.pixels = pixels
+        self.lock = Lock()
+        self.levels = {}    # zoom level -> absolute row numbers kept
+        self.versions = {}  # zoom level -> store.version() when last extended
+
+
+    def track(self,z):
+        '''
+        Get the simplified track for a tile zoom level
+
+        Parameters:
+        self (Track_LOD): Required for object functions
+        z          (int): The tile zoom level
+
+        Returns:
+        tuple: Longitudes and latitudes of the points kept
+        '''
+
+        with self.lock:
+            lats,lons = self.store['latitude'],self.store['longitude']
+            generation,count = self.store.version()
+            first = count-len(lats)   # Absolute row number of the oldest row kept in the store
+            if len(lats)<3:
+                return lons,lats
+
+            kept = self.levels.get(z)
+            if kept is None or self.versions[z][0]!=generation:
+                # Nothing yet, or the store was cleared and refilled
+                kept = np.empty(0,int)
+            elif self.versions[z][1]==count:
+                rows = kept[kept>=first]-first
+                return lons[rows],lats[rows]
+
+            # Re-simplify from the second to last kept point, since the last was only kept for being the end
+            kept = kept[kept>=first]
+            start = kept[-2] if len(kept)>=2 else first
+            kept = kept[kept<start]
+
+            x,y = Tile_Cache.tile_xy(lats[start-first:],lons[start-first:],0)
+            tolerance = self.pixels/Tile_Cache.TILE_SIZE/2**z
+            ok = ~(np.isnan(x)|np.isnan(y))
+            rows = np.flatnonzero(ok)[simplify(x[ok],y[ok],tolerance)]+start
+
+            kept = np.concatenate([kept,rows])
+            self.levels[z] = kept
+            self.versions[z] = (generation,count)
+            rows = kept-first
+            return lons[rows],lats[rows]